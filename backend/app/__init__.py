@@ -1,6 +1,8 @@
 import os
+import secrets
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+import click
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -10,6 +12,18 @@ load_dotenv(env_file, override=False)
 
 db = SQLAlchemy()
 
+# Esquema versionado em backend/migrations; aplicado por "flask db upgrade"
+# na etapa de release, nunca no boot dos workers
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+
+def iniciar_migracoes(app):
+    from flask_migrate import Migrate
+    from sqlalchemy.engine import make_url
+    from .models.models import filtros_do_esquema
+    dialeto = make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name()
+    Migrate(app, db, directory=DIRETORIO_MIGRACOES, **filtros_do_esquema(dialeto))
+
 def create_app(config_name="default") -> Flask:
     app = Flask(__name__)
 
@@ -17,6 +31,11 @@ def create_app(config_name="default") -> Flask:
     app.config["SQLALCHEMY_ECHO"] = bool(int(os.getenv("SQLALCHEMY_ECHO", "0")))
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+    app.config["SESSAO_DURACAO"] = int(os.getenv("SESSAO_DURACAO", str(8 * 60 * 60)))
+    # Enquanto os clientes não enviam o token, só valida quando ele vem
+    app.config["AUTH_OBRIGATORIA"] = os.getenv("AUTH_OBRIGATORIA", "0") == "1"
+
     frontend_origins = os.getenv(
         "FRONTEND_ORIGINS",
         "http://localhost:5173,https://projeto-aplicado-front.onrender.com,https://projeto-aplicado-frontend.web.app"
@@ -28,22 +47,68 @@ def create_app(config_name="default") -> Flask:
         app,
         resources={r"/*": {"origins": frontend_origins}},
         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        allow_headers=["Content-Type", "Authorization"],
+        allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+        expose_headers=["ETag"],
         supports_credentials=True
     )
 
-    from .config import TestingConfig
+    from .config import TestingConfig, opcoes_engine, modo_pgbouncer, statement_timeout
     if config_name == "testing":
         app.config.from_object(TestingConfig)
+
+    if not app.config["SECRET_KEY"]:
+        # Todos os workers e instâncias precisam da mesma chave, senão o token
+        # emitido por um é recusado pelos outros. Chave aleatória só em
+        # desenvolvimento (FLASK_DEBUG=1)
+        if not app.debug:
+            raise RuntimeError("SECRET_KEY não definida")
+        app.config["SECRET_KEY"] = secrets.token_hex(32)
+        app.logger.warning("SECRET_KEY não definida; tokens valem só neste processo")
+
+    # Pool e timeouts do banco (DB_POOL_SIZE, DB_STATEMENT_TIMEOUT_MS etc.)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", opcoes_engine(app.config["SQLALCHEMY_DATABASE_URI"]))
+    app.config.setdefault("DB_PGBOUNCER", modo_pgbouncer())
+    # LISTEN precisa de sessão própria: atrás do PgBouncer (pool por
+    # transação) o ouvinte de invalidação conecta direto neste endereço
+    app.config.setdefault("DATABASE_LISTEN_URL", os.getenv("DATABASE_LISTEN_URL"))
     db.init_app(app)
+    # Flask-Migrate importa o alembic (~150 ms): só carrega quando a fábrica
+    # roda pela linha de comando (flask db ...), não no gunicorn nem nos testes
+    if click.get_current_context(silent=True) is not None:
+        iniciar_migracoes(app)
 
     from .routes import routes
     app.register_blueprint(routes.bp)
 
+    from .cli import estoque_cli, ordens_cli
+    app.cli.add_command(estoque_cli)
+    app.cli.add_command(ordens_cli)
+
     from .models import models as _models
 
-    with app.app_context():
-        db.create_all()
-        print("Tabelas criadas com sucesso!")
+    if app.config["SQLALCHEMY_ENGINE_OPTIONS"]:
+        # Espera e checkouts do pool em /metricas/pool
+        from .utils.pool import instrumentar
+        with app.app_context():
+            instrumentar(db.engine)
+
+    if app.config["DB_PGBOUNCER"] and statement_timeout():
+        from .utils.pool import statement_timeout_local
+        with app.app_context():
+            statement_timeout_local(db.engine, statement_timeout())
+
+    # Com gthread, gunicorn.conf.py limita as requisições comuns às
+    # GUNICORN_THREADS do worker; as threads a mais ficam para /eventos
+    limite = int(os.getenv("REQUISICOES_SIMULTANEAS", "0"))
+    if limite > 0:
+        from .utils.limite import LimiteRequisicoes
+        app.wsgi_app = LimiteRequisicoes(
+            app.wsgi_app, limite, espera=float(os.getenv("REQUISICOES_ESPERA_SEGUNDOS", "30")))
+
+    from .services import sessao
+    sessao.iniciar(app)
+
+    from .utils import invalidacao
+    invalidacao.iniciar(app)
 
     return app
@@ -0,0 +1,30 @@
+import click
+from flask.cli import AppGroup
+from app.services.movimentacoes import gerar_snapshot
+from app.services.recorrencia import gerar_ocorrencias
+
+# Comandos de manutenção: flask --app wsgi estoque snapshot
+
+estoque_cli = AppGroup("estoque", help="Rotinas de estoque")
+ordens_cli = AppGroup("ordens", help="Rotinas de ordens de serviço")
+
+
+@estoque_cli.command("snapshot")
+def snapshot():
+    """Fotografa o saldo atual de todas as peças."""
+    erro, quantidade = gerar_snapshot()
+    if erro:
+        raise click.ClickException(erro)
+    click.echo(f"{quantidade} saldos registrados")
+
+
+@ordens_cli.command("recorrencias")
+@click.option("--horizonte", type=click.IntRange(min=0), default=None,
+              help="Dias à frente a gerar (padrão: RECORRENCIA_HORIZONTE_DIAS)")
+def recorrencias(horizonte):
+    """Gera as próximas ocorrências das ordens recorrentes."""
+    erro, resumo = gerar_ocorrencias(horizonte)
+    if erro:
+        raise click.ClickException(erro)
+    click.echo(f"{resumo['geradas']} ordens geradas de {resumo['modelos']} modelos"
+               f" ({resumo['ignoradas']} com recorrência não reconhecida)")
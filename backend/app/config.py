@@ -1,4 +1,43 @@
+import os
+
+
 class TestingConfig:
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SECRET_KEY = "chave-de-teste"
+    AUTH_OBRIGATORIA = False
+    # Hash barato e na própria thread
+    SENHA_METODO = "pbkdf2:sha256:1000"
+    SENHA_WORKERS = 0
+
+
+def opcoes_engine(uri, ambiente=os.environ):
+    # SQLALCHEMY_ENGINE_OPTIONS a partir de variáveis de ambiente. SQLite
+    # (desenvolvimento/testes) fica com o padrão.
+    if not uri or uri.startswith("sqlite"):
+        return {}
+
+    opcoes = {
+        "pool_size": int(ambiente.get("DB_POOL_SIZE", "5")),
+        "max_overflow": int(ambiente.get("DB_MAX_OVERFLOW", "5")),
+        "pool_timeout": float(ambiente.get("DB_POOL_TIMEOUT", "10")),
+        # Abaixo do idle timeout de balanceadores/PgBouncer
+        "pool_recycle": int(ambiente.get("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": ambiente.get("DB_POOL_PRE_PING", "1") == "1",
+        "connect_args": {"connect_timeout": int(ambiente.get("DB_CONNECT_TIMEOUT", "5"))},
+    }
+    # Sem PgBouncer o statement_timeout vai como parâmetro da sessão, na
+    # conexão; com ele, é aplicado por transação (ver pool.statement_timeout_local)
+    if not modo_pgbouncer(ambiente):
+        opcoes["connect_args"]["options"] = f"-c statement_timeout={statement_timeout(ambiente)}"
+    return opcoes
+
+
+def modo_pgbouncer(ambiente=os.environ):
+    return ambiente.get("DB_PGBOUNCER", "0") == "1"
+
+
+def statement_timeout(ambiente=os.environ):
+    # Milissegundos; 0 desliga
+    return int(ambiente.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
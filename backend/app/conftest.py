@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.fixture
+def app_teste():
+    """App de teste com banco em memória, dentro do contexto da aplicação.
+
+    As tabelas são criadas antes e apagadas depois de cada teste; os arquivos
+    de teste só acrescentam os próprios dados.
+    """
+    from app import create_app, db
+
+    flask_app = create_app("testing")
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def db(app_teste):
+    from app import db as banco
+    return banco
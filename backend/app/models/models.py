@@ -1,5 +1,21 @@
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import DDL, and_, or_, case, event, false, func, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
+from datetime import datetime, date
 from .. import db
+from ..utils import senhas
+
+STATUS_EM_ANDAMENTO = ["pendente", "em execução", "em andamento"]
+# Ordens com outra recorrência são modelos: geram as próximas ocorrências
+# (app/services/recorrencia.py)
+RECORRENCIA_UNICA = "Única"
+
+# Full-text dos detalhes das ordens (Postgres); ver a seção BUSCA no fim
+CONFIGURACAO_BUSCA = "busca_portugues"
+VETOR_DETALHES = f"to_tsvector('{CONFIGURACAO_BUSCA}'::regconfig, coalesce(detalhes, ''))"
+
+
+def _inicio_do_dia():
+    return datetime.combine(date.today(), datetime.min.time())
 
 class Peca(db.Model):
     __tablename__ = 'peca'
@@ -8,6 +24,11 @@ class Peca(db.Model):
     nome = db.Column(db.String(100), nullable=False)
     categoria = db.Column(db.String(100), nullable=False)
 
+    # nova_peca e a importação procuram por (nome, categoria)
+    __table_args__ = (
+        db.UniqueConstraint('nome', 'categoria', name='uq_peca_nome_categoria'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -21,6 +42,10 @@ class Estoque(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     qtd = db.Column(db.Integer, nullable=False)
     qtd_min = db.Column(db.Integer, nullable=False)
+    # Regra única de alerta de reposição (alertas, notificações, dashboard e
+    # relatório). Coluna gerada pelo banco: acompanha qualquer UPDATE/INSERT
+    # de qtd ou qtd_min na mesma instrução, inclusive os débitos em lote
+    em_alerta = db.Column(db.Boolean, db.Computed("qtd <= qtd_min", persisted=True))
     peca_id = db.Column(
         db.Integer, 
         db.ForeignKey('peca.id', ondelete='CASCADE'), 
@@ -28,6 +53,11 @@ class Estoque(db.Model):
     )
     peca = db.relationship('Peca', backref=db.backref('estoques', passive_deletes=True))
 
+    # Um estoque por peça; as ordens localizam o estoque pela peça
+    __table_args__ = (
+        db.UniqueConstraint('peca_id', name='uq_estoque_peca_id'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -37,6 +67,15 @@ class Estoque(db.Model):
             "qtd_min": self.qtd_min
         }
 
+# Estoque baixo (alertas, notificações, dashboard): índice parcial só com as
+# peças em alerta, ordenado pela falta como nas peças críticas do dashboard
+db.Index(
+    'ix_estoque_em_alerta',
+    Estoque.qtd - Estoque.qtd_min, Estoque.qtd,
+    postgresql_where=Estoque.em_alerta,
+    sqlite_where=Estoque.em_alerta,
+)
+
 class Usuario(db.Model):
     __tablename__ = 'usuario'
 
@@ -48,11 +87,16 @@ class Usuario(db.Model):
     senha_hash = db.Column(db.String(512), nullable = False)
 
 
+    # O hash roda no pool de app/utils/senhas.py; ambos podem levantar
+    # SenhasOcupadas quando a fila está cheia
     def set_senha(self, senha):
-        self.senha_hash = generate_password_hash(senha)
+        self.senha_hash = senhas.gerar_hash(senha)
 
     def verificar_senha(self, senha):
-        return check_password_hash(self.senha_hash, senha)
+        return senhas.verificar(self.senha_hash, senha)
+
+    def senha_desatualizada(self):
+        return senhas.precisa_rehash(self.senha_hash)
     
     def to_dict(self):
         return {
@@ -76,10 +120,67 @@ class OrdemServico(db.Model):
    
     equipamento_id = db.Column(db.Integer, db.ForeignKey('estoque.id'), nullable=True)
     solicitante_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+
+    # Ocorrência gerada de um modelo recorrente; a própria ocorrência é "Única"
+    origem_id = db.Column(db.Integer, db.ForeignKey('ordem_servico.id', name='fk_ordem_servico_origem_id', ondelete='SET NULL'), nullable=True)
+    # No modelo: próxima ocorrência ainda não gerada (vazio = recalcular)
+    recorrencia_proxima = db.Column(db.DateTime, nullable=True)
     
     equipamento = db.relationship('Estoque', backref='ordens_servico')
     solicitante = db.relationship('Usuario', backref='ordens_servico')
 
+    # Filtros da listagem (filtrar_ordens) e a ordenação por (data, id) da
+    # paginação por keyset
+    __table_args__ = (
+        db.Index('ix_ordem_servico_status_data', 'status', 'data'),
+        db.Index('ix_ordem_servico_setor_data', 'setor', 'data'),
+        db.Index('ix_ordem_servico_solicitante_id', 'solicitante_id'),
+        db.Index('ix_ordem_servico_data_id', 'data', 'id'),
+        # Uma ocorrência por modelo e data, mesmo com dois geradores rodando
+        db.Index('ix_ordem_servico_origem_data', 'origem_id', 'data', unique=True),
+        db.Index('ix_ordem_servico_detalhes_fts', literal_column(VETOR_DETALHES),
+                 postgresql_using='gin', info={'dialeto': 'postgresql'}).ddl_if(dialect='postgresql'),
+    )
+
+    # Status exibido: pendentes/em execução viram "Em Andamento" e qualquer
+    # ordem não concluída com data passada vira "Atrasada". Calculado na
+    # leitura, sem regravar a coluna status.
+    @hybrid_property
+    def status_efetivo(self):
+        status = self.status
+        if status.lower() in STATUS_EM_ANDAMENTO:
+            status = "Em Andamento"
+        data_ordem = self.data.date() if isinstance(self.data, datetime) else self.data
+        if status != "Concluída" and data_ordem < date.today():
+            status = "Atrasada"
+        return status
+
+    @status_efetivo.expression
+    def status_efetivo(cls):
+        return case(
+            (and_(cls.status != "Concluída", cls.data < _inicio_do_dia()), "Atrasada"),
+            (func.lower(cls.status).in_(STATUS_EM_ANDAMENTO), "Em Andamento"),
+            else_=cls.status
+        )
+
+    @classmethod
+    def filtro_status(cls, status):
+        # Equivalente a status_efetivo == status, mas escrito sobre as colunas
+        # status/data para que o índice (status, data) possa ser usado
+        hoje = _inicio_do_dia()
+        if status == "Concluída":
+            return cls.status == status
+        if status == "Atrasada":
+            return or_(
+                and_(cls.status != "Concluída", cls.data < hoje),
+                cls.status == status
+            )
+        if status == "Em Andamento":
+            return and_(cls.data >= hoje, func.lower(cls.status).in_(STATUS_EM_ANDAMENTO))
+        if status.lower() in STATUS_EM_ANDAMENTO:
+            return false()
+        return and_(cls.status == status, cls.data >= hoje)
+
     def to_dict(self):
         return{
             "id": self.id,
@@ -87,10 +188,11 @@ class OrdemServico(db.Model):
             "setor": self.setor,
             "recorrencia": self.recorrencia,
             "detalhes": self.detalhes, 
-            "status": self.status,
+            "status": self.status_efetivo,
             "equipamento": self.equipamento.to_dict() if self.equipamento else None,
             "solicitante": self.solicitante.to_dict() if self.solicitante else None,
             "data": self.data.strftime("%Y-%m-%d") if self.data else None,
+            "origem_id": self.origem_id,
             "pecas_utilizadas": [
                 {
                     "peca_id": p.peca_id,
@@ -100,6 +202,10 @@ class OrdemServico(db.Model):
             ]
         }
 
+# Modelos recorrentes, percorridos em lotes por id pelo gerador de ocorrências
+_EH_MODELO = and_(OrdemServico.origem_id.is_(None), OrdemServico.recorrencia != RECORRENCIA_UNICA)
+db.Index('ix_ordem_servico_modelos', OrdemServico.id, postgresql_where=_EH_MODELO, sqlite_where=_EH_MODELO)
+
 class Pecas_Ordem_Servico(db.Model):
     __tablename__ = 'pecas_ordems_servico'
 
@@ -110,4 +216,152 @@ class Pecas_Ordem_Servico(db.Model):
     ordem_servico = db.relationship("OrdemServico", backref="pecas_os")
     peca = db.relationship("Peca", backref="usada_em_ordens")
 
-    
\ No newline at end of file
+class MovimentacaoEstoque(db.Model):
+    __tablename__ = 'movimentacao_estoque'
+
+    # Histórico só de inserção: quantidade é o delta com sinal (entrada > 0,
+    # saída < 0). os_id não é FK para o histórico sobreviver à exclusão da OS.
+    id = db.Column(db.Integer, primary_key=True)
+    peca_id = db.Column(
+        db.Integer,
+        db.ForeignKey('peca.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    tipo = db.Column(db.String(20), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)
+    os_id = db.Column(db.Integer, nullable=True)
+    data = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_movimentacao_estoque_peca_data', 'peca_id', 'data'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "peca_id": self.peca_id,
+            "tipo": self.tipo,
+            "quantidade": self.quantidade,
+            "os_id": self.os_id,
+            "data": self.data.strftime("%Y-%m-%d %H:%M:%S") if self.data else None
+        }
+
+class SaldoEstoque(db.Model):
+    __tablename__ = 'saldo_estoque'
+
+    # Fotografia periódica de Estoque.qtd; o saldo numa data é a fotografia
+    # mais próxima mais as movimentações entre as duas
+    id = db.Column(db.Integer, primary_key=True)
+    peca_id = db.Column(
+        db.Integer,
+        db.ForeignKey('peca.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    data = db.Column(db.DateTime, nullable=False)
+    qtd = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_saldo_estoque_peca_data', 'peca_id', 'data'),
+    )
+
+class SessaoRevogada(db.Model):
+    __tablename__ = 'sessao_revogada'
+
+    # Tokens encerrados antes de expirar (logout/renovação). A verificação
+    # usa a cópia em memória; a tabela serve para processos novos carregarem.
+    jti = db.Column(db.String(32), primary_key=True)
+    expira_em = db.Column(db.DateTime, nullable=False)
+
+
+class VersaoCache(db.Model):
+    __tablename__ = 'versao_cache'
+
+    # Versão de cada tabela do cache (app/utils/cache.py), incrementada a
+    # cada escrita publicada: todos os processos montam o mesmo ETag
+    tabela = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.BigInteger, nullable=False)
+
+
+# ==================== BUSCA (/busca) ====================
+# Postgres: pg_trgm nos nomes/categorias de peças (busca aproximada, tolera
+# erro de digitação) e full-text nos detalhes das ordens. SQLite (testes e
+# desenvolvimento): tabelas FTS5 espelhadas por triggers. As mesmas
+# definições valem para o create_all e para a migração.
+
+def vetor_detalhes():
+    # Mesma expressão do índice ix_ordem_servico_detalhes_fts, senão o
+    # planejador não o usa
+    return literal_column(VETOR_DETALHES)
+
+
+db.Index(
+    'ix_peca_nome_trgm', Peca.nome,
+    postgresql_using='gin', postgresql_ops={'nome': 'gin_trgm_ops'}, info={'dialeto': 'postgresql'},
+).ddl_if(dialect='postgresql')
+db.Index(
+    'ix_peca_categoria_trgm', Peca.categoria,
+    postgresql_using='gin', postgresql_ops={'categoria': 'gin_trgm_ops'}, info={'dialeto': 'postgresql'},
+).ddl_if(dialect='postgresql')
+
+# Configuração de full-text: radicais do português sem acentos ("oleo" acha
+# "óleo", como o remove_diacritics do FTS5). Não existe CREATE TEXT SEARCH
+# CONFIGURATION IF NOT EXISTS, daí o bloco DO
+DDL_BUSCA_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    f"""DO $$ BEGIN
+        CREATE TEXT SEARCH CONFIGURATION {CONFIGURACAO_BUSCA} (COPY = portuguese);
+        ALTER TEXT SEARCH CONFIGURATION {CONFIGURACAO_BUSCA}
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+    EXCEPTION WHEN unique_violation THEN NULL;
+    END $$""",
+]
+
+for _comando in DDL_BUSCA_POSTGRES:
+    event.listen(db.metadata, "before_create", DDL(_comando).execute_if(dialect="postgresql"))
+
+TABELAS_FTS = {
+    # tabela FTS5: (tabela de origem, colunas indexadas)
+    "busca_peca": ("peca", ("nome", "categoria")),
+    "busca_ordem": ("ordem_servico", ("detalhes",)),
+}
+
+
+def filtros_do_esquema(dialeto):
+    # Filtros do autogenerate do Alembic para o banco do dialeto dado: as
+    # tabelas FTS5 (e as internas, busca_peca_data etc.) não são modelos, e
+    # índices marcados com info["dialeto"] só existem naquele banco
+    def incluir_nome(nome, tipo, pais):
+        return not (tipo == "table" and nome.split("_")[0] == "busca")
+
+    def incluir_objeto(objeto, nome, tipo, refletido, comparado):
+        return tipo != "index" or objeto.info.get("dialeto", dialeto) == dialeto
+
+    return {"include_name": incluir_nome, "include_object": incluir_objeto}
+
+
+def ddl_fts(tabela_fts):
+    # Tabela FTS5 com conteúdo externo (lê o texto da tabela de origem) e
+    # triggers que mantêm o índice; "rebuild" indexa as linhas existentes
+    origem, colunas = TABELAS_FTS[tabela_fts]
+    lista = ", ".join(colunas)
+    novos = ", ".join(f"new.{c}" for c in colunas)
+    antigos = ", ".join(f"old.{c}" for c in colunas)
+    remover = f"INSERT INTO {tabela_fts}({tabela_fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos});"
+    inserir = f"INSERT INTO {tabela_fts}(rowid, {lista}) VALUES (new.id, {novos});"
+    return [
+        f"CREATE VIRTUAL TABLE {tabela_fts} USING fts5({lista}, content='{origem}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {tabela_fts}_ai AFTER INSERT ON {origem} BEGIN {inserir} END",
+        f"CREATE TRIGGER {tabela_fts}_ad AFTER DELETE ON {origem} BEGIN {remover} END",
+        f"CREATE TRIGGER {tabela_fts}_au AFTER UPDATE ON {origem} BEGIN {remover} {inserir} END",
+        f"INSERT INTO {tabela_fts}({tabela_fts}) VALUES ('rebuild')",
+    ]
+
+
+for _tabela_fts, (_origem, _) in TABELAS_FTS.items():
+    _tabela = db.metadata.tables[_origem]
+    for _comando in ddl_fts(_tabela_fts):
+        event.listen(_tabela, "after_create", DDL(_comando).execute_if(dialect="sqlite"))
+    event.listen(_tabela, "after_drop",
+                 DDL(f"DROP TABLE IF EXISTS {_tabela_fts}").execute_if(dialect="sqlite"))
@@ -0,0 +1,107 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import text
+from app.models import Estoque, OrdemServico, Peca
+
+# Regressão de plano: as consultas quentes, montadas pelos próprios serviços,
+# não podem cair em Seq Scan na tabela principal. Roda contra um Postgres
+# local com as migrações aplicadas e volume suficiente para o planejador
+# preferir índices.
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                                reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+
+POVOAR = """
+INSERT INTO usuario (nome, email, funcao, setor, senha_hash)
+SELECT 'Usuário ' || i, 'u' || i || '@example.com', 'Técnico', 'Manutenção', 'x'
+FROM generate_series(1, 200) i;
+
+INSERT INTO peca (nome, categoria)
+SELECT 'Peça ' || i, 'Categoria ' || (i % 20) FROM generate_series(1, 5000) i;
+
+-- Uma peça em cada 50 abaixo do mínimo
+INSERT INTO estoque (peca_id, qtd, qtd_min)
+SELECT i, CASE WHEN i % 50 = 0 THEN 5 ELSE 100 END, 10 FROM generate_series(1, 5000) i;
+
+-- Dois anos de ordens, quase todas concluídas e no passado
+INSERT INTO ordem_servico (tipo, setor, data, recorrencia, status, solicitante_id)
+SELECT 'Corretiva', 'Setor ' || (i % 10), now() - (i % 730) * interval '1 day' + interval '10 days',
+       'Única', CASE WHEN i % 10 = 0 THEN 'Pendente' ELSE 'Concluída' END, 1 + i % 200
+FROM generate_series(1, 20000) i;
+
+ANALYZE;
+"""
+
+
+@pytest.fixture(scope="module")
+def banco():
+    from flask_migrate import downgrade, upgrade
+    from app import create_app, db, iniciar_migracoes
+    from app.utils import invalidacao
+
+    with pytest.MonkeyPatch.context() as ambiente:
+        ambiente.setenv("DATABASE_URL", os.environ["TEST_POSTGRES_URL"])
+        ambiente.setenv("SECRET_KEY", "chave-de-teste")
+        flask_app = create_app()
+    invalidacao.parar()
+    iniciar_migracoes(flask_app)
+
+    with flask_app.app_context():
+        db.drop_all()
+        db.session.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        db.session.commit()
+        upgrade()
+        for comando in POVOAR.split(";\n"):
+            if comando.strip():
+                db.session.execute(text(comando))
+        db.session.commit()
+        yield db
+        db.session.remove()
+        downgrade(revision="base")
+        db.session.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        db.session.commit()
+
+
+def _plano(db, query):
+    sql = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+    linhas = db.session.execute(text(f"EXPLAIN {sql}")).scalars().all()
+    return "\n".join(linhas)
+
+
+def _consultas():
+    from app.services.ordem_servico import filtrar_ordens
+    from app.services.alertas import consulta_em_alerta
+    from app.services.serializacao import consulta_ordens
+    from app.services.recorrencia import consulta_modelos
+
+    recentes = consulta_ordens().order_by(OrdemServico.data.desc(), OrdemServico.id.desc())
+    mes_passado = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+    return {
+        # movimentar_estoque / nova_ordem
+        "estoque por peça": ("estoque", Estoque.query.filter(Estoque.peca_id.in_([10, 20, 30]))),
+        # nova_peca
+        "peça por nome e categoria": ("peca", Peca.query.filter_by(nome="Peça 42", categoria="Categoria 2")),
+        # alertas e notificações; peças críticas do dashboard
+        "peças em alerta": ("estoque", consulta_em_alerta()),
+        "peças críticas": ("estoque", consulta_em_alerta().limit(5)),
+        # listagem de ordens
+        "primeira página": ("ordem_servico", recentes.limit(51)),
+        "ordens em andamento": ("ordem_servico", filtrar_ordens(consulta_ordens(), {"status": "Em Andamento"})),
+        "ordens de um setor no mês": ("ordem_servico", filtrar_ordens(
+            consulta_ordens(), {"setor": "Setor 3", "data_inicio": mes_passado})),
+        "ordens de um solicitante": ("ordem_servico", filtrar_ordens(
+            consulta_ordens(), {"solicitante_id": "7"})),
+        # gerador de ordens recorrentes
+        "modelos recorrentes": ("ordem_servico", consulta_modelos(datetime.now()).limit(1000)),
+    }
+
+
+@pytest.mark.parametrize("nome", [
+    "estoque por peça", "peça por nome e categoria", "peças em alerta", "peças críticas", "primeira página",
+    "ordens em andamento", "ordens de um setor no mês", "ordens de um solicitante", "modelos recorrentes",
+])
+def test_consulta_quente_usa_indice(banco, nome):
+    tabela, query = _consultas()[nome]
+    plano = _plano(banco, query)
+    assert f"Seq Scan on {tabela}" not in plano, plano
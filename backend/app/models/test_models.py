@@ -1,5 +1,5 @@
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
 from app import create_app, db
 from app.models import (
     Peca,
@@ -133,3 +133,91 @@ def test_delete_cascade_peca(test_client, sample_data):
     estoques = Estoque.query.all()
     assert all(e.peca_id is not None for e in estoques)
 
+
+def test_status_efetivo_sql_igual_python(test_client, sample_data):
+    ontem = datetime.now() - timedelta(days=1)
+    amanha = datetime.now() + timedelta(days=1)
+    casos = [
+        ("Pendente", amanha, "Em Andamento"),
+        ("Em Execução", amanha, "Em Andamento"),
+        ("Pendente", ontem, "Atrasada"),
+        ("Aberta", ontem, "Atrasada"),
+        ("Atrasada", amanha, "Atrasada"),
+        ("Concluída", ontem, "Concluída"),
+        ("Aberta", amanha, "Aberta"),
+    ]
+    for status, data, _ in casos:
+        db.session.add(OrdemServico(
+            tipo="Corretiva", setor="Elétrica", data=data, recorrencia="Única",
+            status=status, solicitante_id=sample_data["usuario"].id
+        ))
+    db.session.commit()
+
+    ordens = OrdemServico.query.order_by(OrdemServico.id).all()
+    assert [o.status_efetivo for o in ordens] == [esperado for _, _, esperado in casos]
+
+    em_sql = db.session.query(OrdemServico.status_efetivo).order_by(OrdemServico.id).all()
+    assert [s for (s,) in em_sql] == [esperado for _, _, esperado in casos]
+
+    # o status gravado não é alterado pela leitura
+    assert [o.status for o in ordens] == [status for status, _, _ in casos]
+    assert not db.session.dirty
+
+
+def test_filtro_status_equivale_status_efetivo(test_client, sample_data):
+    ontem = datetime.now() - timedelta(days=1)
+    amanha = datetime.now() + timedelta(days=1)
+    for status in ("Pendente", "Aberta", "Concluída", "Atrasada", "em andamento"):
+        for data in (ontem, amanha):
+            db.session.add(OrdemServico(
+                tipo="Corretiva", setor="Elétrica", data=data, recorrencia="Única",
+                status=status, solicitante_id=sample_data["usuario"].id
+            ))
+    db.session.commit()
+
+    for status in ("Atrasada", "Em Andamento", "Concluída", "Aberta", "Pendente"):
+        por_filtro = {o.id for o in OrdemServico.query.filter(OrdemServico.filtro_status(status))}
+        por_expressao = {o.id for o in OrdemServico.query.filter(OrdemServico.status_efetivo == status)}
+        assert por_filtro == por_expressao, status
+
+
+def test_create_app_nao_cria_tabelas():
+    flask_app = create_app("testing")
+    with flask_app.app_context():
+        assert not db.inspect(db.engine).get_table_names()
+
+
+def test_create_app_exige_secret_key(monkeypatch):
+    monkeypatch.delenv("SECRET_KEY", raising=False)
+    monkeypatch.delenv("FLASK_DEBUG", raising=False)
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///:memory:")
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        create_app()
+
+    # Em desenvolvimento sobe com chave temporária
+    monkeypatch.setenv("FLASK_DEBUG", "1")
+    assert create_app().config["SECRET_KEY"]
+
+
+# O SQLite não reflete índices de expressão (ix_estoque_abaixo_minimo)
+@pytest.mark.filterwarnings("ignore:.*expression-based index")
+def test_migracoes_em_dia_com_modelos(tmp_path, monkeypatch):
+    """Aplica as migrações num banco vazio e compara com os modelos."""
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+    from flask_migrate import upgrade
+    from app import iniciar_migracoes
+    from app.models.models import filtros_do_esquema
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'migracoes.db'}")
+
+    monkeypatch.setenv("SECRET_KEY", "chave-de-teste")
+    flask_app = create_app()
+    iniciar_migracoes(flask_app)
+    with flask_app.app_context():
+        upgrade()
+        with db.engine.connect() as conexao:
+            diferencas = compare_metadata(
+                MigrationContext.configure(conexao, opts=filtros_do_esquema("sqlite")), db.metadata)
+        db.engine.dispose()
+    assert diferencas == []
@@ -1,36 +1,110 @@
-from flask import Blueprint, request, jsonify
-from app.utils.json_response import json_unicode
-from app.services.peca import listar_pecas, nova_peca, atualizar_peca, excluir_peca
-from app.services.ordem_servico import listar_ordens, nova_ordem, atualizar_ordem, excluir_ordem
-from app.services.usuario import atualiza_usuario, deleta_usuario, cria_usuario, listar_usuarios
+from datetime import date
+from flask import Blueprint, Response, current_app, g, request, stream_with_context
+from app.utils.json_response import json_unicode, json_fluxo, fluxo_sse, resposta_em_cache
+from app.utils import cache, eventos, pool
+from app.services.peca import listar_pecas, nova_peca, atualizar_peca, excluir_peca, importar_pecas, decodificar_csv, ler_csv_pecas
+from app.services.ordem_servico import listar_ordens, listar_ordens_paginadas, nova_ordem, atualizar_ordem, excluir_ordem
+from app.services.usuario import atualiza_usuario, deleta_usuario, cria_usuario, listar_usuarios, ERRO_OCUPADO
 from app.services.login import autenticar_usuario
+from app.services.sessao import emitir_sessao, verificar_token, renovar_sessao, encerrar_sessao
 from app.services.alertas import listar_alertas_reposicao
 from app.services.notificacoes_estoque import listar_notificacoes
+from app.services.dashboard import resumo_dashboard
+from app.services.relatorios import exportar_relatorio
+from app.services.movimentacoes import saldos_no_dia, consumo
+from app.services.saude import verificar_banco
+from app.services.busca import buscar
+from app.services.previsao import prever_rupturas
+from app.services.projecao import projetar_estoque
 
 bp = Blueprint("main", __name__)
 
+ROTAS_PUBLICAS = {"main.home", "main.login", "main.health"}
+
+
+@bp.before_request
+def verificar_sessao():
+    # Só confere assinatura, validade e a lista de revogadas em memória: não
+    # consulta o banco nem recalcula hash de senha
+    g.sessao = None
+    if request.method == "OPTIONS" or request.endpoint in ROTAS_PUBLICAS:
+        return None
+
+    cabecalho = request.headers.get("Authorization", "")
+    if request.endpoint == "main.eventos_route" and request.args.get("token"):
+        # EventSource do navegador não envia cabeçalhos: token na query string
+        cabecalho = f"Bearer {request.args['token']}"
+    if not cabecalho.startswith("Bearer "):
+        if current_app.config.get("AUTH_OBRIGATORIA"):
+            return json_unicode({"erro": "Sessão obrigatória"}, 401)
+        return None
+
+    erro, sessao = verificar_token(cabecalho[len("Bearer "):])
+    if erro:
+        return json_unicode({"erro": erro}, 401)
+    g.sessao = sessao
+
 
 @bp.route("/")
 def home():
     return json_unicode({"message": "Aplicação Flask com PostgreSQL funcionando!"})
 
+
+@bp.route("/health")
+def health():
+    # Prontidão para o balanceador/orquestrador: o processo responde e o banco também
+    erro = verificar_banco()
+    if erro:
+        return json_unicode({"status": "indisponivel", "erro": erro}, 503)
+    return json_unicode({"status": "ok"}, 200)
+
 # =================== LOGIN ====================
 
 
+def _ocupado():
+    # Fila de hash de senha cheia: o cliente deve tentar de novo logo
+    resposta, status = json_unicode({"erro": ERRO_OCUPADO}, 503)
+    resposta.headers["Retry-After"] = "2"
+    return resposta, status
+
+
 @bp.route("/login", methods=["POST"])
 def login():
     data = request.get_json()
     erro, usuario = autenticar_usuario(data)
 
+    if erro == ERRO_OCUPADO:
+        return _ocupado()
     if erro:
         return json_unicode({"erro": erro}, 401)
 
-    return jsonify(usuario.to_dict()), 200
+    return json_unicode({**usuario.to_dict(), **emitir_sessao(usuario)}, 200)
+
+
+@bp.route("/login/renovar", methods=["POST"])
+def renovar_sessao_route():
+    if g.sessao is None:
+        return json_unicode({"erro": "Sessão obrigatória"}, 401)
+    erro, sessao = renovar_sessao(g.sessao)
+    if erro:
+        status = 401 if erro == "Usuário não encontrado" else 500
+        return json_unicode({"erro": erro}, status)
+    return json_unicode(sessao, 200)
+
+
+@bp.route("/logout", methods=["POST"])
+def logout():
+    if g.sessao is not None:
+        erro = encerrar_sessao(g.sessao)
+        if erro:
+            return json_unicode({"erro": erro}, 500)
+    return json_unicode({"mensagem": "Sessão encerrada"}, 200)
 
 # =================== USUÁRIOS ====================
 
 
 @bp.route("/usuarios", methods=["GET"])
+@resposta_em_cache("usuario")
 def listar_usuarios_route():
     erro, usuarios = listar_usuarios()
     if erro:
@@ -48,6 +122,8 @@ def criar_usuario():
 
     erro, usuario = cria_usuario(data)
 
+    if erro == ERRO_OCUPADO:
+        return _ocupado()
     if erro:
         status = 400 if erro == "Email já cadastrado." else 500
         return json_unicode({"erro": erro}, status)
@@ -60,6 +136,8 @@ def atualizar_usuario(id):
     data = request.get_json()
     erro = atualiza_usuario(id, data)
 
+    if erro == ERRO_OCUPADO:
+        return _ocupado()
     if erro:
         status = 404 if erro == "Usuário não encontrado" else 500
         return json_unicode({"erro": erro}, status)
@@ -81,11 +159,12 @@ def excluir_usuario(id):
 
 
 @bp.route("/peca", methods=["GET"])
+@resposta_em_cache("peca", "estoque")
 def listar_pecas_route():
-    erro, estoques = listar_pecas()
+    erro, estoques = listar_pecas(fluxo=True)
     if erro:
         return json_unicode({"erro": erro}, 500)
-    return json_unicode([e.to_dict() for e in estoques], 200)
+    return json_fluxo(estoques, 200)
 
 
 @bp.route("/peca", methods=["POST"])
@@ -99,6 +178,26 @@ def nova_peca_route():
     return json_unicode(estoque.to_dict(), 201)
 
 
+@bp.route("/peca/lote", methods=["POST"])
+def importar_pecas_route():
+    if "arquivo" in request.files or request.mimetype == "text/csv":
+        dados = request.files["arquivo"].read() if "arquivo" in request.files else request.get_data()
+        erro, texto = decodificar_csv(dados)
+        if erro:
+            return json_unicode({"erro": erro}, 400)
+        linhas = ler_csv_pecas(texto)
+    else:
+        linhas = request.get_json(silent=True)
+
+    if not isinstance(linhas, list):
+        return json_unicode({"erro": "Envie uma lista JSON ou um arquivo CSV"}, 400)
+
+    erro, resultado = importar_pecas(linhas)
+    if erro:
+        return json_unicode({"erro": erro}, 500)
+    return json_unicode(resultado, 200)
+
+
 @bp.route("/peca/<int:id>", methods=["PUT"])
 def atualizar_peca_route(id):
     data = request.get_json()
@@ -120,12 +219,49 @@ def excluir_peca_route(id):
 # =================== ORDENS DE SERVIÇO ====================
 
 
+FILTROS_ORDENS = ("status", "setor", "tipo", "solicitante_id", "data_inicio", "data_fim", "busca")
+
+
+def _filtros_ordens(args):
+    filtros = {campo: args.get(campo) for campo in FILTROS_ORDENS if args.get(campo)}
+    if args.get("solicitante"):
+        filtros["solicitante_id"] = args.get("solicitante")
+    return filtros
+
+
 @bp.route("/ordemservico", methods=["GET"])
+# O status "Atrasada" depende do dia, então a data entra no ETag e na chave
+@resposta_em_cache("ordem_servico", "estoque", "peca", "usuario", extra=lambda: date.today().isoformat())
 def listar_ordens_route():
-    erro, ordens = listar_ordens()
+    filtros = _filtros_ordens(request.args)
+
+    # Sem cursor/limite mantém a resposta antiga (lista completa)
+    if "cursor" not in request.args and "limite" not in request.args:
+        erro, ordens = listar_ordens(filtros, fluxo=True)
+        if erro:
+            status = 400 if erro == "Filtro inválido" else 500
+            return json_unicode({"erro": erro}, status)
+        return json_fluxo(ordens, 200)
+
+    erro, pagina = listar_ordens_paginadas(
+        filtros, request.args.get("cursor"), request.args.get("limite"))
     if erro:
-        return json_unicode({"erro": erro}, 500)
-    return json_unicode([o.to_dict() for o in ordens], 200)
+        status = 400 if erro == "Filtro inválido" else 500
+        return json_unicode({"erro": erro}, status)
+    return json_unicode({
+        "itens": pagina["ordens"],
+        "proximo_cursor": pagina["proximo_cursor"]
+    }, 200)
+
+
+def _status_erro_ordem(erro):
+    if erro == "Ordem não encontrada":
+        return 404
+    if erro.startswith(("Campo", "Quantidade", "Dados", "Recorrência")):
+        return 400
+    if erro.startswith("Estoque"):
+        return 409
+    return 500
 
 
 @bp.route("/ordemservico", methods=["POST"])
@@ -133,8 +269,7 @@ def nova_ordem_route():
     data = request.get_json()
     erro, ordem = nova_ordem(data)
     if erro:
-        status = 400 if erro.startswith("Campo") else 500
-        return json_unicode({"erro": erro}, status)
+        return json_unicode({"erro": erro}, _status_erro_ordem(erro))
     return json_unicode(ordem.to_dict(), 201)
 
 
@@ -143,8 +278,7 @@ def atualizar_ordem_route(id):
     data = request.get_json()
     erro, ordem = atualizar_ordem(id, data)
     if erro:
-        status = 404 if erro == "Ordem não encontrada" else 500
-        return json_unicode({"erro": erro}, status)
+        return json_unicode({"erro": erro}, _status_erro_ordem(erro))
     return json_unicode({"mensagem": "Atualizado com sucesso"}, 200)
 
 
@@ -156,17 +290,157 @@ def excluir_ordem_route(id):
         return json_unicode({"erro": erro}, status)
     return json_unicode({"mensagem": "Ordem excluída com sucesso"}, 200)
 
+# =================== DASHBOARD ====================
+
+@bp.route("/dashboard/resumo", methods=["GET"])
+def dashboard_resumo():
+    erro, resumo = resumo_dashboard()
+    if erro:
+        return json_unicode({"erro": erro}, 500)
+    return json_unicode(resumo, 200)
+
+# =================== RELATÓRIOS ====================
+
+@bp.route("/relatorios/export", methods=["GET"])
+def exportar_relatorio_route():
+    erro, arquivo = exportar_relatorio(
+        _filtros_ordens(request.args), request.args.get("formato", "csv"))
+    if erro:
+        return json_unicode({"erro": erro}, 400)
+
+    conteudo, mimetype, nome_arquivo = arquivo
+    return Response(
+        stream_with_context(conteudo),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'}
+    )
+
+# =================== HISTÓRICO DE ESTOQUE ====================
+
+@bp.route("/estoque/saldos", methods=["GET"])
+def saldos_estoque():
+    erro, saldos = saldos_no_dia(request.args.get("data"))
+    if erro:
+        status = 400 if erro == "Data inválida" else 500
+        return json_unicode({"erro": erro}, status)
+    return json_unicode(saldos, 200)
+
+
+@bp.route("/estoque/consumo", methods=["GET"])
+def consumo_estoque():
+    erro, itens = consumo(request.args.get("data_inicio"), request.args.get("data_fim"))
+    if erro:
+        status = 400 if erro == "Data inválida" else 500
+        return json_unicode({"erro": erro}, status)
+    return json_unicode(itens, 200)
+
+
+@bp.route("/estoque/previsao", methods=["GET"])
+@resposta_em_cache("ordem_servico", "estoque", "peca", extra=lambda: date.today().isoformat())
+def previsao_estoque():
+    erro, itens = prever_rupturas(
+        request.args.get("janela"),
+        request.args.get("suavizacao"),
+        request.args.get("prazo_reposicao"),
+        request.args.get("cobertura"),
+    )
+    if erro:
+        status = 400 if erro == "Parâmetros inválidos" else 500
+        return json_unicode({"erro": erro}, status)
+    return json_unicode(itens, 200)
+
+
+def _status_erro_projecao(erro):
+    if erro == "Parâmetros inválidos" or erro.startswith(("Dados", "Quantidade")):
+        return 400
+    return 500
+
+
+@bp.route("/estoque/projecao", methods=["GET"])
+@resposta_em_cache("ordem_servico", "estoque", "peca", extra=lambda: date.today().isoformat())
+def projecao_estoque():
+    erro, projecao = projetar_estoque(request.args.get("horizonte"), request.args.getlist("peca_id"))
+    if erro:
+        return json_unicode({"erro": erro}, _status_erro_projecao(erro))
+    return json_unicode(projecao, 200)
+
+
+@bp.route("/estoque/projecao", methods=["POST"])
+def simular_projecao_estoque():
+    # Mesma projeção com ordens hipotéticas; nada é gravado
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return json_unicode({"erro": "Dados da simulação inválidos"}, 400)
+    erro, projecao = projetar_estoque(data.get("horizonte"), data.get("peca_id"), data.get("ordens"))
+    if erro:
+        return json_unicode({"erro": erro}, _status_erro_projecao(erro))
+    return json_unicode(projecao, 200)
+
+# =================== BUSCA ====================
+
+@bp.route("/busca", methods=["GET"])
+@resposta_em_cache("ordem_servico", "estoque", "peca", "usuario", extra=lambda: date.today().isoformat())
+def busca():
+    erro, resultado = buscar(request.args.get("q"), request.args.get("pagina"), request.args.get("limite"))
+    if erro:
+        status = 400 if erro.startswith("Informe") or erro == "Paginação inválida" else 500
+        return json_unicode({"erro": erro}, status)
+    return json_unicode(resultado, 200)
+
 # =================== ALERTAS ====================
 
 @bp.route("/estoque/alertas", methods = ["GET"])
+@resposta_em_cache("peca", "estoque")
 def alertas_estoque():
     erro, dados = listar_alertas_reposicao()
     if erro:
-        return jsonify({"erro": erro}), 500
-    return jsonify([e.to_dict() for e in dados]), 200
+        return json_unicode({"erro": erro}, 500)
+    return json_unicode(dados, 200)
 
 @bp.route("/estoque/notificacoes", methods = ["GET"])
+@resposta_em_cache("peca", "estoque")
 def get_notificacoes():
-    return listar_notificacoes()
+    erro, alertas = listar_notificacoes()
+    if erro:
+        return json_unicode({"erro": erro}, 500)
+    return json_unicode(alertas, 200)
+
+# =================== EVENTOS ====================
+
+@bp.route("/eventos", methods=["GET"])
+def eventos_route():
+    # Alertas de estoque e mudanças em ordens de serviço conforme são
+    # gravados; o navegador reconecta sozinho enviando Last-Event-ID
+    ultimo_id = request.headers.get("Last-Event-ID") or request.args.get("ultimo_id")
+    fluxo = eventos.assinar(ultimo_id)
+    try:
+        primeiro = next(fluxo)
+    except eventos.LimiteAssinantes:
+        resposta, status = json_unicode({"erro": "Muitas conexões de eventos abertas"}, 503)
+        resposta.headers["Retry-After"] = "30"
+        return resposta, status
+    return fluxo_sse(_com_primeiro(primeiro, fluxo))
+
+
+def _com_primeiro(primeiro, fluxo):
+    try:
+        yield primeiro
+        yield from fluxo
+    finally:
+        fluxo.close()
+
+# =================== MÉTRICAS ====================
+
+@bp.route("/metricas/cache", methods=["GET"])
+def metricas_cache():
+    return json_unicode(cache.estatisticas(), 200)
+
+
+@bp.route("/metricas/pool", methods=["GET"])
+def metricas_pool():
+    return json_unicode(pool.estatisticas(), 200)
 
 
+@bp.route("/metricas/eventos", methods=["GET"])
+def metricas_eventos():
+    return json_unicode(eventos.estatisticas(), 200)
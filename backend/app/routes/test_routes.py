@@ -1,13 +1,17 @@
 import pytest
 from unittest.mock import patch
-from app import create_app
+from app import create_app, db
+from app.utils import cache
 
 
 @pytest.fixture
 def client():
     """Cria app Flask em modo de teste."""
+    cache.limpar()
     app = create_app("testing")
     app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
     client = app.test_client()
     return client
 
@@ -21,15 +25,43 @@ def test_home(client):
 
 
 
+def test_health(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "ok"}
+
+
+@patch("app.routes.routes.verificar_banco")
+def test_health_sem_banco(mock_verificar, client):
+    mock_verificar.return_value = "connection refused"
+    client.application.config["AUTH_OBRIGATORIA"] = True
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "indisponivel"
+
+
 # =================== LOGIN ====================
 
 @patch("app.routes.routes.autenticar_usuario")
 def test_login_sucesso(mock_autenticar, client):
-    mock_autenticar.return_value = (None, type("UsuarioMock", (), {"to_dict": lambda self: {"id": 1, "nome": "João"}})())
+    mock_autenticar.return_value = (None, type("UsuarioMock", (), {
+        "id": 1, "funcao": "Técnico", "to_dict": lambda self: {"id": 1, "nome": "João"}})())
 
     response = client.post("/login", json={"email": "teste", "senha": "123"})
     assert response.status_code == 200
     assert response.get_json()["nome"] == "João"
+    assert response.get_json()["token"]
+    assert response.get_json()["expira_em"]
+
+
+@patch("app.routes.routes.autenticar_usuario")
+def test_login_fila_de_senhas_cheia(mock_autenticar, client):
+    from app.services.usuario import ERRO_OCUPADO
+    mock_autenticar.return_value = (ERRO_OCUPADO, None)
+
+    response = client.post("/login", json={"email": "teste", "senha": "123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
 
 
 @patch("app.routes.routes.autenticar_usuario")
@@ -76,8 +108,7 @@ def test_criar_usuario_email_existente(mock_criar, client):
 
 @patch("app.routes.routes.listar_pecas")
 def test_listar_pecas(mock_listar, client):
-    estoque_mock = type("EstoqueMock", (), {"to_dict": lambda self: {"id": 1, "peca": "Parafuso"}})()
-    mock_listar.return_value = (None, [estoque_mock])
+    mock_listar.return_value = (None, [{"id": 1, "peca": "Parafuso"}])
 
     response = client.get("/peca")
     assert response.status_code == 200
@@ -94,6 +125,44 @@ def test_nova_peca_sucesso(mock_nova, client):
     assert response.get_json()["peca"] == "Motor"
 
 
+@patch("app.routes.routes.importar_pecas")
+def test_importar_pecas_csv(mock_importar, client):
+    import io
+    mock_importar.return_value = (None, {"aceitas": 1, "rejeitadas": []})
+    arquivo = (io.BytesIO("nome,categoria,qtd,qtd_min\nMotor,Elétrica,3,1\n".encode("utf-8")), "pecas.csv")
+
+    response = client.post("/peca/lote", data={"arquivo": arquivo}, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert response.get_json()["aceitas"] == 1
+    assert mock_importar.call_args.args[0] == [{"nome": "Motor", "categoria": "Elétrica", "qtd": "3", "qtd_min": "1"}]
+
+
+@patch("app.routes.routes.importar_pecas")
+def test_importar_pecas_csv_do_excel(mock_importar, client):
+    import io
+    mock_importar.return_value = (None, {"aceitas": 1, "rejeitadas": []})
+    arquivo = (io.BytesIO("nome;categoria;qtd;qtd_min\nPeça;Elétrica;3;1\n".encode("cp1252")), "pecas.csv")
+
+    response = client.post("/peca/lote", data={"arquivo": arquivo}, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert mock_importar.call_args.args[0] == [{"nome": "Peça", "categoria": "Elétrica", "qtd": "3", "qtd_min": "1"}]
+
+
+@patch("app.routes.routes.importar_pecas")
+def test_importar_pecas_csv_codificacao_invalida(mock_importar, client):
+    response = client.post("/peca/lote", data=b"nome\x81", content_type="text/csv")
+    assert response.status_code == 400
+    assert response.get_json()["erro"] == "Arquivo deve estar em UTF-8"
+    mock_importar.assert_not_called()
+
+
+@patch("app.routes.routes.importar_pecas")
+def test_importar_pecas_json_invalido(mock_importar, client):
+    response = client.post("/peca/lote", json={"nome": "Motor"})
+    assert response.status_code == 400
+    mock_importar.assert_not_called()
+
+
 @patch("app.routes.routes.excluir_peca")
 def test_excluir_peca_sucesso(mock_excluir, client):
     mock_excluir.return_value = None
@@ -106,14 +175,53 @@ def test_excluir_peca_sucesso(mock_excluir, client):
 
 @patch("app.routes.routes.listar_ordens")
 def test_listar_ordens(mock_listar, client):
-    ordem_mock = type("OrdemMock", (), {"to_dict": lambda self: {"id": 1, "tipo": "Corretiva"}})()
-    mock_listar.return_value = (None, [ordem_mock])
+    mock_listar.return_value = (None, [{"id": 1, "tipo": "Corretiva"}])
 
     response = client.get("/ordemservico")
     assert response.status_code == 200
     assert response.get_json()[0]["tipo"] == "Corretiva"
 
 
+@patch("app.routes.routes.listar_ordens_paginadas")
+def test_listar_ordens_paginadas(mock_listar, client):
+    mock_listar.return_value = (None, {"ordens": [{"id": 1, "tipo": "Corretiva"}], "proximo_cursor": "abc"})
+
+    response = client.get("/ordemservico?limite=1&status=Concluída&solicitante=3")
+    assert response.status_code == 200
+    assert response.get_json()["proximo_cursor"] == "abc"
+    assert response.get_json()["itens"][0]["tipo"] == "Corretiva"
+    filtros, cursor, limite = mock_listar.call_args.args
+    assert filtros == {"status": "Concluída", "solicitante_id": "3"}
+    assert limite == "1"
+
+
+@patch("app.routes.routes.listar_ordens")
+def test_listar_ordens_filtro_invalido(mock_listar, client):
+    mock_listar.return_value = ("Filtro inválido", None)
+    response = client.get("/ordemservico?data_inicio=ontem")
+    assert response.status_code == 400
+
+
+# =================== BUSCA ====================
+
+@patch("app.routes.routes.buscar")
+def test_busca(mock_buscar, client):
+    mock_buscar.return_value = (None, {"itens": [{"tipo": "peca", "relevancia": 0.8, "peca": {"id": 1}}],
+                                       "proxima_pagina": 2})
+
+    response = client.get("/busca?q=rolamento&pagina=1&limite=1")
+    assert response.status_code == 200
+    assert response.get_json()["proxima_pagina"] == 2
+    mock_buscar.assert_called_once_with("rolamento", "1", "1")
+
+
+@patch("app.routes.routes.buscar")
+def test_busca_termo_curto(mock_buscar, client):
+    mock_buscar.return_value = ("Informe ao menos 2 caracteres para a busca", None)
+    response = client.get("/busca?q=a")
+    assert response.status_code == 400
+
+
 @patch("app.routes.routes.nova_ordem")
 def test_nova_ordem_sucesso(mock_nova, client):
     ordem_mock = type("OrdemMock", (), {"to_dict": lambda self: {"id": 99, "tipo": "Preventiva"}})()
@@ -124,6 +232,19 @@ def test_nova_ordem_sucesso(mock_nova, client):
     assert response.get_json()["tipo"] == "Preventiva"
 
 
+@pytest.mark.parametrize("recorrencia, erro", [
+    ("toda segunda", "Recorrência 'toda segunda' não reconhecida"),
+    (7, "Recorrência inválida"),
+])
+def test_nova_ordem_recorrencia_invalida(client, recorrencia, erro):
+    response = client.post("/ordemservico", json={
+        "solicitante_id": 1, "tipo": "Preventiva", "setor": "Elétrica", "data": "2025-03-10T08:00",
+        "recorrencia": recorrencia, "detalhes": "", "status": "Pendente", "equipamento_id": None,
+    })
+    assert response.status_code == 400
+    assert response.get_json() == {"erro": erro}
+
+
 @patch("app.routes.routes.excluir_ordem")
 def test_excluir_ordem_sucesso(mock_excluir, client):
     mock_excluir.return_value = (None, None)
@@ -132,6 +253,91 @@ def test_excluir_ordem_sucesso(mock_excluir, client):
     assert "mensagem" in response.get_json()
 
 
+# =================== DASHBOARD ====================
+
+@patch("app.routes.routes.resumo_dashboard")
+def test_dashboard_resumo(mock_resumo, client):
+    mock_resumo.return_value = (None, {"ordens": {"total": 3}})
+    response = client.get("/dashboard/resumo")
+    assert response.status_code == 200
+    assert response.get_json()["ordens"]["total"] == 3
+
+
+# =================== HISTÓRICO DE ESTOQUE ====================
+
+@patch("app.routes.routes.saldos_no_dia")
+def test_saldos_estoque(mock_saldos, client):
+    mock_saldos.return_value = (None, [{"peca_id": 1, "peca": "Motor", "saldo": 4}])
+    response = client.get("/estoque/saldos?data=2025-01-31")
+    assert response.status_code == 200
+    assert response.get_json()[0]["saldo"] == 4
+    mock_saldos.assert_called_once_with("2025-01-31")
+
+
+@patch("app.routes.routes.consumo")
+def test_consumo_estoque_data_invalida(mock_consumo, client):
+    mock_consumo.return_value = ("Data inválida", None)
+    response = client.get("/estoque/consumo?data_inicio=ontem")
+    assert response.status_code == 400
+
+
+@patch("app.routes.routes.prever_rupturas")
+def test_previsao_estoque(mock_prever, client):
+    mock_prever.return_value = (None, [{"peca_id": 1, "peca": "Motor", "dias_ate_ruptura": 3}])
+    response = client.get("/estoque/previsao?janela=60&suavizacao=14")
+    assert response.status_code == 200
+    assert response.get_json()[0]["dias_ate_ruptura"] == 3
+    mock_prever.assert_called_once_with("60", "14", None, None)
+
+
+@patch("app.routes.routes.prever_rupturas")
+def test_previsao_estoque_parametros_invalidos(mock_prever, client):
+    mock_prever.return_value = ("Parâmetros inválidos", None)
+    response = client.get("/estoque/previsao?janela=0")
+    assert response.status_code == 400
+
+
+@patch("app.routes.routes.projetar_estoque")
+def test_projecao_estoque(mock_projetar, client):
+    mock_projetar.return_value = (None, {"inicio": "2025-03-10", "dias": 2, "pecas": []})
+    response = client.get("/estoque/projecao?horizonte=1&peca_id=3&peca_id=4")
+    assert response.status_code == 200
+    assert response.get_json()["dias"] == 2
+    mock_projetar.assert_called_once_with("1", ["3", "4"])
+
+
+@patch("app.routes.routes.projetar_estoque")
+def test_simular_projecao_estoque(mock_projetar, client):
+    mock_projetar.return_value = ("Dados da simulação inválidos", None)
+    ordens = [{"data": "amanhã"}]
+    response = client.post("/estoque/projecao", json={"horizonte": 10, "ordens": ordens})
+    assert response.status_code == 400
+    mock_projetar.assert_called_once_with(10, None, ordens)
+
+    response = client.post("/estoque/projecao", data="[]", content_type="application/json")
+    assert response.status_code == 400
+
+
+# =================== RELATÓRIOS ====================
+
+@patch("app.routes.routes.exportar_relatorio")
+def test_exportar_relatorio(mock_exportar, client):
+    mock_exportar.return_value = (None, (iter([b"a,b\r\n", b"1,2\r\n"]), "text/csv; charset=utf-8", "relatorio.csv"))
+    response = client.get("/relatorios/export?formato=csv&status=Atrasada")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.data == b"a,b\r\n1,2\r\n"
+    assert "relatorio.csv" in response.headers["Content-Disposition"]
+    assert mock_exportar.call_args.args == ({"status": "Atrasada"}, "csv")
+
+
+@patch("app.routes.routes.exportar_relatorio")
+def test_exportar_relatorio_formato_invalido(mock_exportar, client):
+    mock_exportar.return_value = ("Formato inválido", None)
+    response = client.get("/relatorios/export?formato=pdf")
+    assert response.status_code == 400
+
+
 # =================== ALERTAS ====================
 
 @patch("app.routes.routes.listar_alertas_reposicao")
@@ -143,6 +349,209 @@ def test_alertas_estoque(mock_alertas, client):
 
 @patch("app.routes.routes.listar_notificacoes")
 def test_listar_notificacoes(mock_notif, client):
-    mock_notif.return_value = ("ok", 200)
+    mock_notif.return_value = (None, [{"id": 1, "nome_peca": "Motor", "mensagem": "..."}])
     response = client.get("/estoque/notificacoes")
     assert response.status_code == 200
+    assert response.get_json()[0]["nome_peca"] == "Motor"
+
+
+# =================== ETAG ====================
+
+@patch("app.routes.routes.listar_pecas")
+def test_peca_etag_responde_304_sem_consultar(mock_listar, client):
+    mock_listar.return_value = (None, [])
+    primeira = client.get("/peca")
+    etag = primeira.headers["ETag"]
+
+    mock_listar.reset_mock()
+    segunda = client.get("/peca", headers={"If-None-Match": etag})
+    assert segunda.status_code == 304
+    assert segunda.headers["ETag"] == etag
+    mock_listar.assert_not_called()
+
+
+@patch("app.routes.routes.listar_notificacoes")
+def test_etag_muda_apos_escrita(mock_notif, client):
+    mock_notif.return_value = (None, [])
+    etag = client.get("/estoque/notificacoes").headers["ETag"]
+    cache.invalidar("estoque")
+
+    response = client.get("/estoque/notificacoes", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@patch("app.routes.routes.listar_ordens")
+def test_ordens_etag_ignora_escrita_em_outras_tabelas(mock_listar, client):
+    mock_listar.return_value = (None, [])
+    etag = client.get("/ordemservico").headers["ETag"]
+    cache.invalidar("movimentacao_estoque")
+
+    response = client.get("/ordemservico", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+# =================== CACHE DE RESPOSTAS ====================
+
+@patch("app.routes.routes.listar_usuarios")
+def test_usuarios_servidos_do_cache_ate_escrita(mock_listar, client):
+    usuario = type("UsuarioMock", (), {"to_dict": lambda self: {"id": 1, "nome": "Ana"}})()
+    mock_listar.return_value = (None, [usuario])
+
+    assert client.get("/usuarios").get_json() == [{"id": 1, "nome": "Ana"}]
+    assert client.get("/usuarios").get_json() == [{"id": 1, "nome": "Ana"}]
+    assert mock_listar.call_count == 1
+
+    cache.invalidar("usuario")
+    client.get("/usuarios")
+    assert mock_listar.call_count == 2
+
+
+@patch("app.routes.routes.listar_ordens_paginadas")
+def test_ordens_cache_por_query_string(mock_listar, client):
+    mock_listar.return_value = (None, {"ordens": [], "proximo_cursor": None})
+
+    client.get("/ordemservico?limite=10&setor=Elétrica")
+    client.get("/ordemservico?setor=Elétrica&limite=10")
+    client.get("/ordemservico?limite=20&setor=Elétrica")
+    assert mock_listar.call_count == 2
+
+
+@patch("app.routes.routes.listar_pecas")
+def test_erro_nao_fica_em_cache(mock_listar, client):
+    mock_listar.return_value = ("falha", None)
+    assert client.get("/peca").status_code == 500
+    assert "ETag" not in client.get("/peca").headers
+    assert mock_listar.call_count == 2
+
+
+@patch("app.routes.routes.listar_pecas")
+def test_metricas_cache(mock_listar, client):
+    mock_listar.return_value = (None, [])
+    # A resposta é em fluxo: só vai para o cache depois de lida até o fim
+    client.get("/peca").get_data()
+    client.get("/peca")
+
+    metricas = client.get("/metricas/cache").get_json()
+    assert metricas["acertos"] == 1
+    assert metricas["falhas"] == 1
+    assert metricas["taxa_acerto"] == 0.5
+
+
+@patch("app.routes.routes.pool.estatisticas")
+def test_metricas_pool(mock_estatisticas, client):
+    mock_estatisticas.return_value = {"checkouts": 3, "espera_maxima_ms": 1.5}
+    response = client.get("/metricas/pool")
+    assert response.status_code == 200
+    assert response.get_json()["checkouts"] == 3
+
+
+# =================== EVENTOS ====================
+
+def test_eventos_retoma_pelo_last_event_id(client, monkeypatch):
+    from app.utils import eventos
+
+    eventos.limpar()
+    monkeypatch.setattr(eventos, "HEARTBEAT_SEGUNDOS", 0.05)
+    visto = eventos.emitir("ordem_criada", {"id": 1})
+    eventos.emitir("alerta_estoque", {"estoques": [2], "alertas": []})
+
+    response = client.get("/eventos", headers={"Last-Event-ID": visto["id"]}, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    pedacos = response.response
+    assert next(pedacos) == b"retry: 3000\n\n"
+    assert next(pedacos) == b": ping\n\n"
+    bloco = next(pedacos).decode()
+    assert "event: alerta_estoque\n" in bloco
+    assert 'data: {"estoques":[2],"alertas":[]}\n\n' in bloco
+    assert next(pedacos) == b": ping\n\n"
+    response.close()
+    assert eventos.estatisticas()["assinantes"] == 0
+
+
+def test_eventos_limite_de_conexoes(client, monkeypatch):
+    from app.utils import eventos
+
+    monkeypatch.setattr(eventos, "MAX_ASSINANTES", 0)
+    response = client.get("/eventos")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+
+
+def test_eventos_aceita_token_na_query(client):
+    # EventSource não envia cabeçalhos: só /eventos aceita o token na URL
+    client.application.config["AUTH_OBRIGATORIA"] = True
+    token = _token(client)
+    response = client.get(f"/eventos?token={token}", buffered=False)
+    assert response.status_code == 200
+    response.close()
+    assert client.get("/eventos?token=invalido").status_code == 401
+    assert client.get(f"/metricas/cache?token={token}").status_code == 401
+
+
+# =================== RESPOSTAS EM FLUXO ====================
+
+@patch("app.routes.routes.listar_ordens")
+def test_ordens_em_fluxo(mock_listar, client):
+    ordens = [{"id": i, "detalhes": "ç" * 1000} for i in range(200)]
+    mock_listar.return_value = (None, iter(ordens))
+
+    response = client.get("/ordemservico")
+    assert response.is_streamed
+    assert response.get_json() == ordens
+    mock_listar.assert_called_once_with({}, fluxo=True)
+
+    # Lida até o fim, a próxima vem do cache sem chamar o serviço
+    assert client.get("/ordemservico").get_json() == ordens
+    assert mock_listar.call_count == 1
+
+
+@patch("app.routes.routes.listar_pecas")
+def test_fluxo_interrompido_nao_fica_em_cache(mock_listar, client):
+    mock_listar.return_value = (None, iter([{"id": i} for i in range(5000)]))
+
+    response = client.get("/peca")
+    next(response.response)
+    response.close()
+
+    mock_listar.return_value = (None, [])
+    assert client.get("/peca").get_json() == []
+
+
+# =================== SESSÃO ====================
+
+def _token(client, usuario_id=1):
+    from app.services.sessao import emitir_sessao
+    usuario = type("UsuarioMock", (), {"id": usuario_id, "funcao": "Técnico"})()
+    with client.application.app_context():
+        return emitir_sessao(usuario)["token"]
+
+
+def test_sessao_obrigatoria_sem_token(client):
+    client.application.config["AUTH_OBRIGATORIA"] = True
+    assert client.get("/metricas/cache").status_code == 401
+    assert client.get("/").status_code == 200
+
+
+def test_sessao_obrigatoria_com_token(client):
+    client.application.config["AUTH_OBRIGATORIA"] = True
+    token = _token(client)
+    response = client.get("/metricas/cache", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+
+def test_token_invalido_recusado_mesmo_sem_obrigatoriedade(client):
+    response = client.get("/metricas/cache", headers={"Authorization": "Bearer abc.def"})
+    assert response.status_code == 401
+    assert response.get_json()["erro"] == "Sessão inválida"
+
+
+def test_logout_revoga_token(client):
+    token = _token(client)
+    cabecalho = {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/logout", headers=cabecalho).status_code == 200
+    response = client.get("/metricas/cache", headers=cabecalho)
+    assert response.status_code == 401
+    assert response.get_json()["erro"] == "Sessão encerrada"
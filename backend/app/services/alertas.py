@@ -1,9 +1,20 @@
 from app.models.models import Estoque
+from app.services.serializacao import consulta_estoques, serializar_estoques
+
+# Alertas de reposição e notificações leem só as peças com Estoque.em_alerta
+# (qtd <= qtd_min, mantido pelo banco a cada movimentação), já com a peça
+# na mesma consulta, pelo índice parcial ix_estoque_em_alerta. As mais
+# distantes do mínimo vêm primeiro.
+
+
+def consulta_em_alerta():
+    return consulta_estoques().filter(Estoque.em_alerta).order_by(
+        Estoque.qtd - Estoque.qtd_min, Estoque.qtd, Estoque.id)
+
 
 def listar_alertas_reposicao():
     try:
-        alertas = Estoque.query.filter(Estoque.qtd < Estoque.qtd_min).all()
-        return None, alertas
+        return None, serializar_estoques(consulta_em_alerta())
     
     except Exception as e:
-        return str(e), None
\ No newline at end of file
+        return str(e), None
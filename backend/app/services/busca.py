@@ -0,0 +1,153 @@
+import re
+from sqlalchemy import func, literal, literal_column, or_, select, text, union_all
+from app import db
+from app.models.models import CONFIGURACAO_BUSCA, Estoque, OrdemServico, Peca, vetor_detalhes
+from app.services.serializacao import consulta_estoques, consulta_ordens, linha_estoque, serializar_ordens
+
+# Busca única em peças (nome e categoria) e ordens de serviço (detalhes).
+# Cada lado dá uma relevância entre 0 e 1 e a lista sai ordenada por ela,
+# paginada por página/limite. No Postgres peças usam similaridade de
+# trigramas (pg_trgm, tolera erros de digitação) e ordens usam full-text
+# (radicais, sem acentos); no SQLite as duas usam FTS5 (bm25), sem
+# tolerância a erros.
+#
+# Peças: a relevância é calculada sobre todas as que casam (o catálogo é
+# pequeno e o limiar de similaridade já filtra). Ordens: termos muito comuns
+# casam com boa parte da tabela, e ler todas para ranquear ou só contar leva
+# segundos; a relevância é calculada sobre no máximo CANDIDATOS ordens, as
+# primeiras que o índice devolve no Postgres e as de melhor bm25 no SQLite.
+# Quando há mais, a resposta traz "truncado": true e o termo deve ser
+# refinado.
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 100
+MINIMO_CARACTERES = 2
+CANDIDATOS = 1000
+
+
+def _palavras(termo):
+    return re.findall(r"\w+", termo.lower())
+
+
+def _postgres():
+    def pecas(termo):
+        relevancia = func.greatest(
+            func.word_similarity(termo, Peca.nome), func.word_similarity(termo, Peca.categoria))
+        # <% usa o índice de trigramas (limiar pg_trgm.word_similarity_threshold)
+        return select(
+            literal("peca").label("tipo"), Peca.id.label("id"), relevancia.label("relevancia"),
+            literal(0).label("candidatos")
+        ).where(or_(literal(termo).op("<%")(Peca.nome), literal(termo).op("<%")(Peca.categoria)))
+
+    def ordens(termo):
+        # Prefixo em cada palavra ("mot" acha "motor"), todas obrigatórias
+        consulta = func.to_tsquery(
+            literal_column(f"'{CONFIGURACAO_BUSCA}'::regconfig"),
+            " & ".join(f"{p}:*" for p in _palavras(termo)))
+        # MATERIALIZED: as ordens que casam saem do índice GIN. Sem isso o
+        # planejador tende a percorrer o índice em (data, id) filtrando linha
+        # a linha, o que lê a tabela inteira quando o termo é raro. O LIMIT
+        # para de ler a tabela na ordem CANDIDATOS + 1: a que sobra só indica
+        # que há mais ordens e a resposta sai com "truncado"
+        casadas = select(OrdemServico.id).where(
+            vetor_detalhes().op("@@")(consulta)
+        ).limit(CANDIDATOS + 1).cte("casadas").prefix_with("MATERIALIZED")
+        ranqueadas = select(casadas.c.id).limit(CANDIDATOS)
+        # Normalização 32: rank / (rank + 1), entre 0 e 1
+        relevancia = func.ts_rank(vetor_detalhes(), consulta, 32)
+        return select(
+            literal("ordem").label("tipo"), OrdemServico.id.label("id"), relevancia.label("relevancia"),
+            select(func.count()).select_from(casadas).scalar_subquery().label("candidatos")
+        ).where(OrdemServico.id.in_(ranqueadas))
+
+    return pecas, ordens
+
+
+def _sqlite():
+    def consulta_fts(tabela_fts, tipo, termo, limite=None):
+        # Cada palavra entre aspas (sem sintaxe do FTS5) e com prefixo
+        expressao = " ".join(f'"{p}"*' for p in _palavras(termo))
+        # Com limite, as de melhor bm25 e o total de casamentos em candidatos
+        corte = f" ORDER BY rank LIMIT {limite}" if limite else ""
+        candidatos = "count(*) OVER ()" if limite else "0"
+        # rank é o bm25 (a função bm25() não pode ser usada junto com a janela):
+        # negativo e menor = melhor; -b / (1 - b) fica entre 0 e 1
+        return text(
+            f"SELECT '{tipo}' AS tipo, rowid AS id, "
+            f"-rank / (1 - rank) AS relevancia, {candidatos} AS candidatos "
+            f"FROM {tabela_fts} WHERE {tabela_fts} MATCH :expressao_{tipo}{corte}"
+        ).bindparams(**{f"expressao_{tipo}": expressao}).columns(
+            literal_column("tipo"), literal_column("id"), literal_column("relevancia"),
+            literal_column("candidatos"))
+
+    def pecas(termo):
+        return select(consulta_fts("busca_peca", "peca", termo).subquery())
+
+    def ordens(termo):
+        return select(consulta_fts("busca_ordem", "ordem", termo, CANDIDATOS).subquery())
+
+    return pecas, ordens
+
+
+def _preferir_indices(ligar):
+    # O planejador estima word_similarity como barata e prefere ler todas as
+    # peças a usar o índice de trigramas (5 mil peças: ~35 ms contra ~10 ms).
+    # SET LOCAL vale só até o fim da transação; desligado logo após a busca
+    valor = "off" if ligar else "DEFAULT"
+    db.session.execute(text(f"SET LOCAL enable_seqscan TO {valor}"))
+
+
+def _detalhar(ids_pecas, ids_ordens):
+    pecas, ordens = {}, {}
+    if ids_pecas:
+        query = consulta_estoques().add_columns(Estoque.peca_id).filter(Estoque.peca_id.in_(ids_pecas))
+        pecas = {linha.peca_id: linha_estoque(linha) for linha in query}
+    if ids_ordens:
+        query = consulta_ordens().filter(OrdemServico.id.in_(ids_ordens))
+        ordens = {o["id"]: o for o in serializar_ordens(query)}
+    return pecas, ordens
+
+
+def buscar(termo, pagina=None, limite=None):
+    termo = (termo or "").strip()
+    if len(termo) < MINIMO_CARACTERES or not _palavras(termo):
+        return f"Informe ao menos {MINIMO_CARACTERES} caracteres para a busca", None
+    try:
+        pagina = int(pagina or 1)
+        limite = min(int(limite or LIMITE_PADRAO), LIMITE_MAXIMO)
+        if pagina <= 0 or limite <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return "Paginação inválida", None
+
+    try:
+        postgres = db.engine.dialect.name == "postgresql"
+        pecas, ordens = _postgres() if postgres else _sqlite()
+        resultados = union_all(pecas(termo), ordens(termo)).subquery()
+        if postgres:
+            _preferir_indices(True)
+        # Uma a mais para saber se existe a próxima página
+        linhas = db.session.execute(
+            select(resultados.c.tipo, resultados.c.id, resultados.c.relevancia,
+                   func.max(resultados.c.candidatos).over().label("candidatos")).order_by(
+                resultados.c.relevancia.desc(), resultados.c.tipo, resultados.c.id
+            ).offset((pagina - 1) * limite).limit(limite + 1)
+        ).all()
+        if postgres:
+            _preferir_indices(False)
+
+        truncado = bool(linhas) and linhas[0].candidatos > CANDIDATOS
+        proxima = pagina + 1 if len(linhas) > limite else None
+        linhas = linhas[:limite]
+        detalhes_pecas, detalhes_ordens = _detalhar(
+            [l.id for l in linhas if l.tipo == "peca"], [l.id for l in linhas if l.tipo == "ordem"])
+
+        itens = []
+        for linha in linhas:
+            dados = (detalhes_pecas if linha.tipo == "peca" else detalhes_ordens).get(linha.id)
+            if dados is not None:
+                itens.append({"tipo": linha.tipo, "relevancia": round(float(linha.relevancia), 4), linha.tipo: dados})
+        return None, {"itens": itens, "proxima_pagina": proxima, "truncado": truncado}
+    except Exception as e:
+        db.session.rollback()
+        return str(e), None
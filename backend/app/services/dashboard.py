@@ -0,0 +1,60 @@
+from app import db
+from app.models.models import OrdemServico, Estoque
+from app.services.serializacao import consulta_ordens, serializar_ordens, serializar_estoques
+from app.services.alertas import consulta_em_alerta
+from app.utils import cache
+from sqlalchemy import case, func
+from datetime import date
+
+TABELAS_RESUMO = ("ordem_servico", "estoque", "peca", "usuario")
+
+
+def resumo_dashboard():
+    try:
+        # A data entra na chave porque "Atrasada" muda na virada do dia
+        chave = f"dashboard:resumo:{date.today().isoformat()}"
+        return None, cache.obter(chave, TABELAS_RESUMO, _calcular_resumo)
+    except Exception as e:
+        return str(e), None
+
+
+def _calcular_resumo():
+    status = db.session.query(
+        OrdemServico.status_efetivo.label("status"),
+        OrdemServico.tipo.label("tipo")
+    ).subquery()
+    por_status, por_tipo = {}, {}
+    total_ordens = 0
+    for status_ordem, tipo, qtd in db.session.query(
+        status.c.status, status.c.tipo, func.count()
+    ).group_by(status.c.status, status.c.tipo):
+        por_status[status_ordem] = por_status.get(status_ordem, 0) + qtd
+        por_tipo[tipo] = por_tipo.get(tipo, 0) + qtd
+        total_ordens += qtd
+
+    total_pecas, baixo_estoque = db.session.query(
+        func.count(Estoque.id),
+        func.coalesce(func.sum(case((Estoque.em_alerta, 1), else_=0)), 0)
+    ).one()
+
+    recentes = consulta_ordens().order_by(
+        OrdemServico.data.desc(), OrdemServico.id.desc()
+    ).limit(5)
+    criticas = consulta_em_alerta().limit(5)
+
+    return {
+        "ordens": {
+            "total": total_ordens,
+            "concluidas": por_status.get("Concluída", 0),
+            "em_andamento": por_status.get("Em Andamento", 0),
+            "atrasadas": por_status.get("Atrasada", 0),
+            "por_status": por_status,
+            "por_tipo": por_tipo
+        },
+        "estoque": {
+            "total": total_pecas,
+            "baixo_estoque": int(baixo_estoque)
+        },
+        "ordens_recentes": serializar_ordens(recentes),
+        "pecas_criticas": serializar_estoques(criticas)
+    }
@@ -0,0 +1,92 @@
+from app import db
+from app.models.models import Estoque, Peca
+from app.services.movimentacoes import registrar_movimentacoes
+from sqlalchemy import case, update
+
+# Movimentação de estoque em lote. Todas as peças de uma operação são
+# debitadas/creditadas num único UPDATE condicional, então o custo não
+# depende do número de linhas e duas ordens concorrentes não conseguem
+# vender a mesma unidade: a condição qtd >= x é reavaliada pelo banco na
+# linha já travada.
+
+
+def _nomes_pecas(peca_ids):
+    return dict(db.session.query(Peca.id, Peca.nome).filter(Peca.id.in_(peca_ids)).all())
+
+
+# Valida pecas_utilizadas e soma as quantidades por peça ({peca_id: quantidade})
+def agrupar_pecas(pecas):
+    if not isinstance(pecas, list):
+        return "Dados de peças incompletos", None
+    quantidades = {}
+    invalidas = []
+    for p in pecas:
+        if not isinstance(p, dict):
+            return "Dados de peças incompletos", None
+        try:
+            peca_id = int(p.get("peca_id"))
+        except (TypeError, ValueError):
+            return "Dados de peças incompletos", None
+        if p.get("quantidade") is None:
+            return "Dados de peças incompletos", None
+        try:
+            quantidade = int(p.get("quantidade"))
+        except (TypeError, ValueError):
+            invalidas.append(peca_id)
+            continue
+        if quantidade <= 0:
+            return "Quantidade invalida para a peça selecionada!", None
+        quantidades[peca_id] = quantidades.get(peca_id, 0) + quantidade
+
+    if invalidas:
+        nomes = _nomes_pecas(invalidas)
+        return f"Quantidade inválida para a peça {nomes.get(invalidas[0], f'ID {invalidas[0]}')}", None
+    return None, quantidades
+
+
+# Aplica {peca_id: quantidade} ao estoque: positivas saem, negativas voltam.
+# Registra as movimentações no histórico. Não faz commit; em caso de erro o
+# chamador deve dar rollback.
+def movimentar_estoque(saidas, os_id=None):
+    saidas = {peca_id: qtd for peca_id, qtd in saidas.items() if qtd}
+    if not saidas:
+        return None
+
+    peca_ids = sorted(saidas)
+    if len(peca_ids) > 1:
+        # Trava as linhas sempre na mesma ordem para que ordens concorrentes
+        # com várias peças não entrem em deadlock
+        db.session.query(Estoque.id).filter(
+            Estoque.peca_id.in_(peca_ids)
+        ).order_by(Estoque.peca_id).with_for_update().all()
+
+    quantidade = case(saidas, value=Estoque.peca_id)
+    atualizados = db.session.execute(
+        update(Estoque)
+        .where(Estoque.peca_id.in_(peca_ids), Estoque.qtd >= quantidade)
+        .values(qtd=Estoque.qtd - quantidade)
+        .returning(Estoque.peca_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+    atualizados = set(atualizados)
+    faltando = [peca_id for peca_id in peca_ids if peca_id not in atualizados]
+    if not faltando:
+        # Objetos Estoque já carregados na sessão ficaram com qtd antiga
+        for obj in db.session.identity_map.values():
+            if isinstance(obj, Estoque) and obj.peca_id in saidas:
+                db.session.expire(obj, ["qtd", "em_alerta"])
+        registrar_movimentacoes({p: -qtd for p, qtd in saidas.items()}, os_id=os_id)
+        return None
+
+    existentes = set(db.session.scalars(
+        db.select(Estoque.peca_id).where(Estoque.peca_id.in_(faltando))))
+    nomes = _nomes_pecas(faltando)
+    erros = []
+    for peca_id in faltando:
+        nome = nomes.get(peca_id, f"ID {peca_id}")
+        if peca_id in existentes:
+            erros.append(f"Estoque insuficiente para a peça {nome}!")
+        else:
+            erros.append(f"Estoque da peça {nome} não encontrado!")
+    return " ".join(erros)
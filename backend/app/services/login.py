@@ -1,4 +1,6 @@
-from app.models.models import Usuario
+from app.models.models import Usuario, db
+from app.services.usuario import ERRO_OCUPADO
+from app.utils.senhas import SenhasOcupadas
 
 def autenticar_usuario(data):
     email = data.get("usuario")
@@ -8,7 +10,23 @@ def autenticar_usuario(data):
         return "Usuário ou senha não fornecidos", None
 
     usuario = Usuario.query.filter_by(email=email).first()
-    if usuario and usuario.verificar_senha(senha):
-        return None, usuario
+    try:
+        if usuario and usuario.verificar_senha(senha):
+            _atualizar_hash(usuario, senha)
+            return None, usuario
+    except SenhasOcupadas:
+        return ERRO_OCUPADO, None
 
     return "Usuário ou senha inválidos", None
+
+
+def _atualizar_hash(usuario, senha):
+    # Com a senha em mãos, refaz o hash se o método/custo configurado mudou.
+    # É melhor esforço: se falhar, o login vale e tenta de novo na próxima.
+    if not usuario.senha_desatualizada():
+        return
+    try:
+        usuario.set_senha(senha)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
@@ -0,0 +1,163 @@
+from app import db
+from app.models.models import Estoque, Peca, MovimentacaoEstoque, SaldoEstoque
+from sqlalchemy import and_, or_, case, func, insert, select, text
+from datetime import datetime, time
+
+# Histórico de movimentações de estoque. Estoque.qtd continua sendo o saldo
+# atual; o histórico responde "qual era o saldo na data X" partindo da
+# fotografia (SaldoEstoque) mais próxima e somando só as movimentações entre
+# ela e X, sem reprocessar tudo desde o início.
+#
+# Fotografia e movimentações precisam concordar: uma movimentação com data
+# anterior à da fotografia tem de estar no saldo fotografado, e uma posterior
+# não. No Postgres isso vem de travas na tabela estoque: a movimentação é
+# datada já com ROW EXCLUSIVE (a mesma do UPDATE de saldo, que não bloqueia
+# outras baixas) e a fotografia pega SHARE, que espera as transações com
+# movimentação em andamento terminarem e segura as novas até o commit dela.
+# No SQLite as escritas já são em série.
+
+
+def _travar_estoque(modo):
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(text(f"LOCK TABLE estoque IN {modo} MODE"))
+
+
+def registrar_movimentacoes(deltas, tipo=None, os_id=None):
+    # deltas: {peca_id: quantidade com sinal}. Sem tipo, usa entrada/saída
+    # conforme o sinal. Não faz commit.
+    deltas = {peca_id: quantidade for peca_id, quantidade in deltas.items() if quantidade}
+    if not deltas:
+        return
+    _travar_estoque("ROW EXCLUSIVE")
+    agora = datetime.now()
+    linhas = [
+        {
+            "peca_id": peca_id,
+            "tipo": tipo or ("entrada" if quantidade > 0 else "saida"),
+            "quantidade": quantidade,
+            "os_id": os_id,
+            "data": agora
+        }
+        for peca_id, quantidade in deltas.items()
+    ]
+    db.session.execute(insert(MovimentacaoEstoque), linhas)
+
+
+def gerar_snapshot():
+    # Fotografa o saldo atual de todas as peças num único INSERT ... SELECT,
+    # datado depois de esperar as movimentações em andamento
+    try:
+        _travar_estoque("SHARE")
+        agora = datetime.now()
+        resultado = db.session.execute(
+            insert(SaldoEstoque).from_select(
+                ["peca_id", "data", "qtd"],
+                select(Estoque.peca_id, db.literal(agora), Estoque.qtd)
+            )
+        )
+        db.session.commit()
+        return None, resultado.rowcount
+    except Exception as e:
+        db.session.rollback()
+        return str(e), None
+
+
+def _fotografias(data, anteriores):
+    # Fotografia mais recente até data (anteriores) ou a primeira depois dela
+    limite = func.max(SaldoEstoque.data) if anteriores else func.min(SaldoEstoque.data)
+    filtro = SaldoEstoque.data <= data if anteriores else SaldoEstoque.data > data
+    escolhida = select(
+        SaldoEstoque.peca_id, limite.label("data")
+    ).where(filtro).group_by(SaldoEstoque.peca_id).subquery()
+    return select(
+        SaldoEstoque.peca_id, SaldoEstoque.data, SaldoEstoque.qtd
+    ).join(escolhida, and_(
+        SaldoEstoque.peca_id == escolhida.c.peca_id,
+        SaldoEstoque.data == escolhida.c.data
+    )).subquery()
+
+
+def saldos_em(data):
+    # Saldo de todas as peças no instante data, em duas consultas:
+    # - peças com fotografia anterior: fotografia + movimentações até data
+    # - demais: fotografia seguinte (ou o saldo atual) - movimentações depois de data
+    try:
+        antes = _fotografias(data, anteriores=True)
+        saldos = dict(db.session.execute(
+            select(
+                antes.c.peca_id,
+                antes.c.qtd + func.coalesce(func.sum(MovimentacaoEstoque.quantidade), 0)
+            ).outerjoin(MovimentacaoEstoque, and_(
+                MovimentacaoEstoque.peca_id == antes.c.peca_id,
+                MovimentacaoEstoque.data > antes.c.data,
+                MovimentacaoEstoque.data <= data
+            )).group_by(antes.c.peca_id, antes.c.qtd)
+        ).all())
+
+        depois = _fotografias(data, anteriores=False)
+        saldos.update(db.session.execute(
+            select(
+                Estoque.peca_id,
+                func.coalesce(depois.c.qtd, Estoque.qtd)
+                - func.coalesce(func.sum(MovimentacaoEstoque.quantidade), 0)
+            ).outerjoin(
+                depois, depois.c.peca_id == Estoque.peca_id
+            ).outerjoin(MovimentacaoEstoque, and_(
+                MovimentacaoEstoque.peca_id == Estoque.peca_id,
+                MovimentacaoEstoque.data > data,
+                or_(depois.c.data.is_(None), MovimentacaoEstoque.data <= depois.c.data)
+            )).where(
+                Estoque.peca_id.not_in(select(antes.c.peca_id))
+            ).group_by(Estoque.peca_id, depois.c.qtd, Estoque.qtd)
+        ).all())
+        return None, saldos
+    except Exception as e:
+        return str(e), None
+
+
+def saldos_no_dia(dia):
+    # Saldo ao final do dia (YYYY-MM-DD)
+    try:
+        data = datetime.combine(datetime.strptime(dia, "%Y-%m-%d").date(), time.max)
+    except (TypeError, ValueError):
+        return "Data inválida", None
+
+    erro, saldos = saldos_em(data)
+    if erro:
+        return erro, None
+    nomes = dict(db.session.query(Peca.id, Peca.nome).filter(Peca.id.in_(list(saldos))).all())
+    return None, [
+        {"peca_id": peca_id, "peca": nomes.get(peca_id), "saldo": saldo}
+        for peca_id, saldo in sorted(saldos.items())
+    ]
+
+
+def consumo(data_inicio, data_fim):
+    # Entradas e saídas por peça num intervalo de dias (inclusivo), lidas só
+    # das movimentações do intervalo
+    try:
+        inicio = datetime.strptime(data_inicio, "%Y-%m-%d")
+        fim = datetime.combine(datetime.strptime(data_fim, "%Y-%m-%d").date(), time.max)
+    except (TypeError, ValueError):
+        return "Data inválida", None
+
+    try:
+        linhas = db.session.query(
+            MovimentacaoEstoque.peca_id,
+            Peca.nome,
+            func.coalesce(func.sum(case(
+                (MovimentacaoEstoque.quantidade > 0, MovimentacaoEstoque.quantidade), else_=0)), 0),
+            func.coalesce(func.sum(case(
+                (MovimentacaoEstoque.quantidade < 0, -MovimentacaoEstoque.quantidade), else_=0)), 0),
+        ).join(
+            Peca, Peca.id == MovimentacaoEstoque.peca_id
+        ).filter(
+            MovimentacaoEstoque.data >= inicio,
+            MovimentacaoEstoque.data <= fim
+        ).group_by(MovimentacaoEstoque.peca_id, Peca.nome).order_by(MovimentacaoEstoque.peca_id)
+        return None, [
+            {"peca_id": peca_id, "peca": nome, "entradas": int(entradas), "saidas": int(saidas)}
+            for peca_id, nome, entradas, saidas in linhas
+        ]
+    except Exception as e:
+        return str(e), None
@@ -1,14 +1,57 @@
+import logging
+from app import db
 from app.models.models import Estoque
-from app.utils.json_response import json_unicode
+from app.services.alertas import consulta_em_alerta
+from app.services.serializacao import consulta_estoques
+from app.utils import eventos, invalidacao
+
+# Evento que não cabe no aviso entre processos (NOTIFY, menos de 8000 bytes)
+# só pede para o cliente recarregar. Cada id ocupa ao menos 3 bytes ("1, "):
+# acima disso nem vale consultar as peças
+MAX_PECAS_POR_EVENTO = invalidacao.LIMITE_AVISO // 3
+
+log = logging.getLogger(__name__)
+
+
+def linha_notificacao(p):
+    return {
+        "id": p.id,
+        "nome_peca": p.nome,
+        "mensagem": f"Peça '{p.nome}' abaixo do mínimo ({p.qtd} un. restantes)"
+    }
+
 
 def listar_notificacoes():
     try:
-        pecas_alerta = Estoque.query.filter(Estoque.qtd <= Estoque.qtd_min).all()
-        alertas = [{
-            "id": p.id,
-            "nome_peca": p.peca.nome,
-            "mensagem": f"Peça '{p.peca.nome}' abaixo do mínimo ({p.qtd} un. restantes)"
-        } for p in pecas_alerta]
-        return json_unicode(alertas, 200)
+        alertas = [linha_notificacao(p) for p in consulta_em_alerta()]
+        return None, alertas
     except Exception as e:
-        return json_unicode({"erro": str(e)}, 500)
\ No newline at end of file
+        return str(e), None
+
+
+# Depois do commit de uma escrita no estoque: envia a /eventos o estado de
+# alerta das peças alteradas. "estoques" lista todas elas (entraram, seguem
+# ou saíram do alerta) e "alertas" as que estão em alerta agora.
+def publicar_alertas(peca_ids):
+    peca_ids = list(peca_ids)
+    if not peca_ids:
+        return
+    if len(peca_ids) > MAX_PECAS_POR_EVENTO:
+        eventos.emitir("alerta_estoque", {"recarregar": True})
+        return
+    try:
+        linhas = consulta_estoques().filter(Estoque.peca_id.in_(peca_ids)).all()
+        # Devolve a conexão antes do NOTIFY, que pega outra do pool: segurar
+        # as duas esgota o pool com muitas escritas simultâneas
+        db.session.commit()
+    except Exception:
+        # A escrita já foi gravada; os clientes se acertam no próximo evento
+        log.exception("Falha ao consultar alertas para /eventos")
+        return
+    dados = {
+        "estoques": [p.id for p in linhas],
+        "alertas": [linha_notificacao(p) for p in linhas if p.em_alerta],
+    }
+    if not eventos.cabe_no_aviso("alerta_estoque", dados):
+        dados = {"recarregar": True}
+    eventos.emitir("alerta_estoque", dados)
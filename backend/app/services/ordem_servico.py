@@ -1,29 +1,106 @@
 from app import db
-from app.models.models import OrdemServico, Pecas_Ordem_Servico, Estoque
-from sqlalchemy.orm import joinedload
-from datetime import datetime
+from app.models.models import OrdemServico, Pecas_Ordem_Servico, Peca, Usuario
+from app.utils import cache, eventos
+from sqlalchemy import and_, or_, func, case, delete, insert, update
+from app.services.serializacao import consulta_ordens, serializar_ordens, iterar_ordens
+from app.services.estoque import agrupar_pecas, movimentar_estoque
+from app.services.notificacoes_estoque import publicar_alertas
+from app.services.recorrencia import normalizar_recorrencia
+from datetime import datetime, timedelta
+import base64
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+
+def filtrar_ordens(query, filtros):
+    filtros = filtros or {}
+    if filtros.get("status"):
+        query = query.filter(OrdemServico.filtro_status(filtros["status"]))
+    if filtros.get("setor"):
+        query = query.filter(OrdemServico.setor == filtros["setor"])
+    if filtros.get("tipo"):
+        query = query.filter(OrdemServico.tipo == filtros["tipo"])
+    if filtros.get("solicitante_id"):
+        query = query.filter(OrdemServico.solicitante_id == int(filtros["solicitante_id"]))
+    if filtros.get("data_inicio"):
+        inicio = datetime.strptime(filtros["data_inicio"], "%Y-%m-%d")
+        query = query.filter(OrdemServico.data >= inicio)
+    if filtros.get("data_fim"):
+        # data_fim é inclusiva: tudo antes do dia seguinte
+        fim = datetime.strptime(filtros["data_fim"], "%Y-%m-%d") + timedelta(days=1)
+        query = query.filter(OrdemServico.data < fim)
+    if filtros.get("busca"):
+        # Mesma busca da tela de relatórios; exige a consulta com os joins
+        # de equipamento e solicitante (consulta_ordens)
+        termo = f"%{filtros['busca'].lower()}%"
+        query = query.filter(or_(
+            func.lower(Peca.nome).like(termo),
+            func.lower(Usuario.nome).like(termo),
+            func.lower(OrdemServico.tipo).like(termo)
+        ))
+    return query
+
+
+def codificar_cursor(ordem):
+    valor = f"{ordem.data.isoformat()}|{ordem.id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    data, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(data), int(id)
+
+
+def listar_ordens(filtros=None, fluxo=False):
+    # fluxo=True devolve um iterável para respostas em fluxo (json_fluxo)
+    try:
+        query = filtrar_ordens(consulta_ordens(), filtros)
+    except (TypeError, ValueError):
+        return "Filtro inválido", None
 
-def listar_ordens():
     try:
-        ordens = OrdemServico.query.options(
-            joinedload(OrdemServico.equipamento),
-            joinedload(OrdemServico.solicitante)
-        ).all()
-        # Atualizar status baseado na data
-        hoje = datetime.now().date()
-        for ordem in ordens:
-            if ordem.status.lower() in ["pendente", "em execução", "em andamento"]:
-                ordem.status = "Em Andamento"
-            # Verifica se está atrasada apenas se não estiver concluída
-            if ordem.status != "Concluída":
-                data_ordem = ordem.data.date() if isinstance(ordem.data, datetime) else ordem.data
-                if data_ordem < hoje:
-                    ordem.status = "Atrasada"
+        query = query.order_by(OrdemServico.data.desc(), OrdemServico.id.desc())
+        ordens = iterar_ordens(query) if fluxo else serializar_ordens(query)
         return None, ordens
     except Exception as e:
         return str(e), None
 
 
+def listar_ordens_paginadas(filtros=None, cursor=None, limite=None):
+    # Paginação por keyset em (data, id): o cursor guarda a última ordem da
+    # página anterior, então cada página custa o mesmo em qualquer profundidade
+    try:
+        limite = min(int(limite or LIMITE_PADRAO), LIMITE_MAXIMO)
+        if limite <= 0:
+            raise ValueError
+        query = filtrar_ordens(consulta_ordens(), filtros)
+        if cursor:
+            data, id = decodificar_cursor(cursor)
+            query = query.filter(or_(
+                OrdemServico.data < data,
+                and_(OrdemServico.data == data, OrdemServico.id < id)
+            ))
+    except (TypeError, ValueError):
+        return "Filtro inválido", None
+
+    try:
+        query = query.order_by(
+            OrdemServico.data.desc(), OrdemServico.id.desc()
+        ).limit(limite + 1)
+        linhas = query.all()
+
+        proximo_cursor = None
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            proximo_cursor = codificar_cursor(linhas[-1])
+
+        ordens = serializar_ordens(query, linhas)
+        return None, {"ordens": ordens, "proximo_cursor": proximo_cursor}
+    except Exception as e:
+        return str(e), None
+
+
 def nova_ordem(data):
     campos = ['solicitante_id', 'tipo', 'setor', 'data',
               'recorrencia', 'detalhes', 'status', 'equipamento_id']
@@ -31,6 +108,14 @@ def nova_ordem(data):
         if campo not in data:
             return f"Campo {campo} ausente", None
 
+    erro, recorrencia = normalizar_recorrencia(data["recorrencia"])
+    if erro:
+        return erro, None
+
+    erro, quantidades = agrupar_pecas(data.get("pecas_utilizadas", []))
+    if erro:
+        return erro, None
+
     try:
         ordem = OrdemServico(
             equipamento_id=data["equipamento_id"],
@@ -38,45 +123,29 @@ def nova_ordem(data):
             tipo=data["tipo"],
             setor=data["setor"],
             data=data["data"],
-            recorrencia=data["recorrencia"],
+            recorrencia=recorrencia,
             detalhes=data["detalhes"],
             status=data["status"]
         )
         db.session.add(ordem)
         db.session.flush()
 
-        pecas = data.get("pecas_utilizadas", [])
-        for p in pecas:
-            peca_id = p.get("peca_id")
-            estoque = Estoque.query.filter_by(peca_id=peca_id).first()
-            peca_nome = estoque.peca.nome if estoque and estoque.peca else f"ID {peca_id}"
-            try:
-                quantidade = int(p.get("quantidade"))
-            except (TypeError, ValueError):
-                raise Exception(f"Quantidade inválida para a peça {peca_nome}")
-            
-            if peca_id is None or quantidade is None:
-                raise Exception("Dados de peças incompletos")
-            if not isinstance(quantidade, int) or quantidade <= 0:
-                raise Exception("Quantidade invalida para a peça selecionada!")
-
-            estoque = Estoque.query.filter_by(peca_id=peca_id).first()
-            if not estoque:
-                raise Exception(f"Estoque da peça {peca_nome} não encontrado!")
-            if estoque.qtd < quantidade:
-                raise Exception(f"Estoque insuficiente para a peça {peca_nome}!")
-            
-            estoque.qtd -= quantidade
-
-            uso_os = Pecas_Ordem_Servico(
-                os_id = ordem.id,
-                peca_id = peca_id,
-                quantidade = quantidade
-            )
-            db.session.add(uso_os)
-        
+        erro = movimentar_estoque(quantidades, os_id=ordem.id)
+        if erro:
+            db.session.rollback()
+            return erro, None
+
+        db.session.add_all([
+            Pecas_Ordem_Servico(os_id=ordem.id, peca_id=peca_id, quantidade=quantidade)
+            for peca_id, quantidade in quantidades.items()
+        ])
+        # Lido antes do commit: depois dele o atributo expira e a leitura
+        # seguraria uma conexão enquanto o evento pega outra para o NOTIFY
+        ordem_id = ordem.id
         db.session.commit()
-        print(f"****************Peça debitada: {peca_id} e {quantidade}***************")
+        cache.invalidar("ordem_servico", "estoque")
+        eventos.emitir("ordem_criada", {"id": ordem_id})
+        publicar_alertas(quantidades)
         return None, ordem
     
     except Exception as e:
@@ -85,31 +154,74 @@ def nova_ordem(data):
         return str(e), None
 
 
+def _reconciliar_pecas(os_id, novas):
+    # Compara as peças gravadas com as novas e só mexe no que mudou: um UPDATE
+    # de estoque para todas as diferenças e no máximo um comando por tipo de
+    # alteração (remoção, mudança de quantidade, inclusão) nas peças da ordem.
+    # Devolve (erro, {peca_id: diferença})
+    atuais = dict(db.session.query(
+        Pecas_Ordem_Servico.peca_id, Pecas_Ordem_Servico.quantidade
+    ).filter(Pecas_Ordem_Servico.os_id == os_id).all())
+
+    diferencas = {}
+    for peca_id in set(atuais) | set(novas):
+        diferenca = novas.get(peca_id, 0) - atuais.get(peca_id, 0)
+        if diferenca:
+            diferencas[peca_id] = diferenca
+    if not diferencas:
+        return None, diferencas
+
+    erro = movimentar_estoque(diferencas, os_id=os_id)
+    if erro:
+        return erro, None
+
+    removidas = [p for p in diferencas if p not in novas]
+    alteradas = {p: novas[p] for p in diferencas if p in novas and p in atuais}
+    incluidas = [p for p in diferencas if p not in atuais]
+
+    if removidas:
+        db.session.execute(
+            delete(Pecas_Ordem_Servico).where(
+                Pecas_Ordem_Servico.os_id == os_id,
+                Pecas_Ordem_Servico.peca_id.in_(removidas)
+            ).execution_options(synchronize_session=False)
+        )
+    if alteradas:
+        db.session.execute(
+            update(Pecas_Ordem_Servico).where(
+                Pecas_Ordem_Servico.os_id == os_id,
+                Pecas_Ordem_Servico.peca_id.in_(alteradas)
+            ).values(
+                quantidade=case(alteradas, value=Pecas_Ordem_Servico.peca_id)
+            ).execution_options(synchronize_session=False)
+        )
+    if incluidas:
+        db.session.execute(insert(Pecas_Ordem_Servico), [
+            {"os_id": os_id, "peca_id": p, "quantidade": novas[p]} for p in incluidas
+        ])
+    return None, diferencas
+
+
 def atualizar_ordem(id, data):
     ordem = OrdemServico.query.get(id)
     if not ordem:
         return "Ordem não encontrada", None
-    pecas = data.get("pecas_utilizadas", [])
-    for p in pecas:
-        peca_id = p.get("peca_id")
-        estoque = Estoque.query.filter_by(peca_id=peca_id).first()
-        peca_nome = estoque.peca.nome if estoque and estoque.peca else f"ID {peca_id}"
-        try:
-            quantidade = int(p.get("quantidade"))
-        except (TypeError, ValueError):
-            return f"Quantidade inválida para a peça {peca_nome}", None
-
-        if peca_id is None or quantidade is None:
-            return "Dados de peças incompletos", None
-        if not isinstance(quantidade, int) or quantidade <= 0:
-            return "Quantidade invalida para a peça selecionada!", None
-
-        if not estoque:
-            return f"Estoque da peça {peca_nome} não encontrado!", None
-        if estoque.qtd < quantidade:
-            return f"Estoque insuficiente para a peça {peca_nome}!", None
-    
-        
+
+    # O formulário reenvia a recorrência em todo PUT: só é validada quando
+    # muda, para uma ordem gravada antes da validação continuar editável
+    recorrencia = ordem.recorrencia
+    if data.get("recorrencia", recorrencia) != recorrencia:
+        erro, recorrencia = normalizar_recorrencia(data["recorrencia"])
+        if erro:
+            return erro, None
+
+    # Sem pecas_utilizadas no corpo, as peças da ordem ficam como estão
+    novas = None
+    if "pecas_utilizadas" in data:
+        erro, novas = agrupar_pecas(data.get("pecas_utilizadas") or [])
+        if erro:
+            return erro, None
+
     try:
         # Atualiza os campos da ordem
         ordem.equipamento_id = data.get("equipamento", {}).get("id", ordem.equipamento_id)
@@ -117,36 +229,26 @@ def atualizar_ordem(id, data):
         ordem.tipo = data.get("tipo", ordem.tipo)
         ordem.setor = data.get("setor", ordem.setor)
         ordem.data = data.get("data", ordem.data)
-        ordem.recorrencia = data.get("recorrencia", ordem.recorrencia)
+        ordem.recorrencia = recorrencia
         ordem.detalhes = data.get("detalhes", ordem.detalhes)
         ordem.status = data.get("status", ordem.status)
+        # Modelo recorrente com outra data ou regra: o gerador recalcula a
+        # próxima ocorrência (app/services/recorrencia.py)
+        estado = db.inspect(ordem)
+        if estado.attrs.data.history.has_changes() or estado.attrs.recorrencia.history.has_changes():
+            ordem.recorrencia_proxima = None
 
-        pecas_atuais = Pecas_Ordem_Servico.query.filter_by(os_id=id).all()
-        for pu in pecas_atuais:
-            estoque_atual = Estoque.query.filter_by(peca_id=pu.peca_id).first()
-            if estoque_atual:
-                estoque_atual.qtd += pu.quantidade
-            db.session.delete(pu) 
-        
-        db.session.flush()
-
-        for p in pecas:
-            peca_id = p.get("peca_id")
-            quantidade = int(p.get("quantidade"))
-            estoque = Estoque.query.filter_by(peca_id=peca_id).first()
-            if estoque.qtd < quantidade:
+        diferencas = {}
+        if novas is not None:
+            erro, diferencas = _reconciliar_pecas(ordem.id, novas)
+            if erro:
                 db.session.rollback()
-                return f"Estoque insuficiente para a peça {estoque.peca.nome}", None
-            estoque.qtd -= quantidade
-
-            uso_os = Pecas_Ordem_Servico(
-                os_id = ordem.id,
-                peca_id = peca_id,
-                quantidade = quantidade
-            )
-            db.session.add(uso_os)
+                return erro, None
 
         db.session.commit()
+        cache.invalidar("ordem_servico", "estoque")
+        eventos.emitir("ordem_atualizada", {"id": id})
+        publicar_alertas(diferencas)
         return None, ordem
     
     except Exception as e:
@@ -160,18 +262,24 @@ def excluir_ordem(id):
         return "Ordem não encontrada", None
 
     try:
-        pecas_usadas = Pecas_Ordem_Servico.query.filter_by(os_id=id).all()
-        for pu in pecas_usadas:
-            estoque = Estoque.query.filter_by(peca_id = pu.peca_id).first()
-            if estoque:
-                estoque.qtd += pu.quantidade
-                print(f"*********Peça devolvida ao estoque!**********")
-
-        for pu in pecas_usadas:
-            db.session.delete(pu)
-            
+        # Devolve as peças ao estoque num único UPDATE e apaga as linhas da ordem
+        pecas_usadas = dict(db.session.query(
+            Pecas_Ordem_Servico.peca_id, Pecas_Ordem_Servico.quantidade
+        ).filter(Pecas_Ordem_Servico.os_id == id).all())
+        erro = movimentar_estoque({p: -qtd for p, qtd in pecas_usadas.items()}, os_id=id)
+        if erro:
+            db.session.rollback()
+            return erro, None
+
+        db.session.execute(
+            delete(Pecas_Ordem_Servico).where(Pecas_Ordem_Servico.os_id == id)
+            .execution_options(synchronize_session=False)
+        )
         db.session.delete(ordem)
         db.session.commit()
+        cache.invalidar("ordem_servico", "estoque")
+        eventos.emitir("ordem_excluida", {"id": id})
+        publicar_alertas(pecas_usadas)
 
         return None, ordem
     
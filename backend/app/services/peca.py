@@ -1,10 +1,21 @@
 from app import db
 from app.models.models import Estoque, Peca, db
+from app.utils import cache
+from app.services.serializacao import consulta_estoques, serializar_estoques, iterar_estoques
+from app.services.movimentacoes import registrar_movimentacoes
+from app.services.notificacoes_estoque import publicar_alertas
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
+import csv
+import io
 
-def listar_pecas():
+NOMES_POR_CONSULTA = 10000
+
+def listar_pecas(fluxo=False):
     try:
-        estoques = db.session.query(Estoque).options(joinedload(Estoque.peca)).all()
+        query = consulta_estoques().order_by(Estoque.id)
+        estoques = iterar_estoques(query) if fluxo else serializar_estoques(query)
         return None, estoques
     except Exception as e:
         return str(e), None
@@ -28,13 +39,114 @@ def nova_peca(data):
     try:
         nova = Peca(nome=data["nome"], categoria=data["categoria"])
         db.session.add(nova)
-        db.session.commit()
+        db.session.flush()
 
         estoque = Estoque(qtd=data["qtd"], qtd_min=data["qtd_min"], peca_id=nova.id)
         db.session.add(estoque)
+        registrar_movimentacoes({nova.id: qtd})
         db.session.commit()
+        cache.invalidar("peca", "estoque")
+        publicar_alertas([nova.id])
 
         return None, estoque
+    except IntegrityError:
+        # Outra requisição cadastrou a mesma peça entre a consulta e o INSERT
+        # (uq_peca_nome_categoria)
+        db.session.rollback()
+        return "Peça já cadastrada", None
+    except Exception as e:
+        db.session.rollback()
+        return str(e), None
+
+
+def decodificar_csv(dados):
+    # UTF-8 (com ou sem BOM) ou Windows-1252, que é como o Excel em pt-BR
+    # salva "CSV (separado por ponto e vírgula)"
+    try:
+        return None, dados.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        pass
+    try:
+        return None, dados.decode("cp1252")
+    except UnicodeDecodeError:
+        return "Arquivo deve estar em UTF-8", None
+
+
+def ler_csv_pecas(texto):
+    # Aceita separador "," ou ";" (padrão do Excel em pt-BR)
+    amostra = texto[:2048]
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=",;")
+    except csv.Error:
+        dialeto = csv.excel
+    return list(csv.DictReader(io.StringIO(texto), dialect=dialeto))
+
+
+def _validar_linha(linha):
+    if not isinstance(linha, dict) or not all(linha.get(k) not in (None, "") for k in ("nome", "categoria", "qtd", "qtd_min")):
+        return "Dados incompletos", None
+    try:
+        qtd = int(linha["qtd"])
+        qtd_min = int(linha["qtd_min"])
+    except (ValueError, TypeError):
+        return "Quantidade e quantidade mínima devem ser números inteiros", None
+    if qtd < 0 or qtd_min < 0:
+        return "Quantidade e quantidade mínima devem ser valores inteiros positivos", None
+    return None, {
+        "nome": str(linha["nome"]).strip(),
+        "categoria": str(linha["categoria"]).strip(),
+        "qtd": qtd,
+        "qtd_min": qtd_min
+    }
+
+
+def importar_pecas(linhas):
+    rejeitadas = []
+    validas = {}
+    for numero, linha in enumerate(linhas, 1):
+        erro, peca = _validar_linha(linha)
+        if erro:
+            rejeitadas.append({"linha": numero, "erro": erro})
+            continue
+        chave = (peca["nome"], peca["categoria"])
+        if chave in validas:
+            rejeitadas.append({"linha": numero, "erro": "Peça duplicada no lote"})
+            continue
+        validas[chave] = (numero, peca)
+
+    try:
+        # Peças já cadastradas: uma consulta por bloco de nomes. Filtrar só
+        # pelo nome deixa o banco usar um IN simples (hash), e a categoria é
+        # conferida aqui
+        nomes = list({nome for nome, _ in validas})
+        for i in range(0, len(nomes), NOMES_POR_CONSULTA):
+            for chave in db.session.query(Peca.nome, Peca.categoria).filter(
+                Peca.nome.in_(nomes[i:i + NOMES_POR_CONSULTA])
+            ):
+                if tuple(chave) in validas:
+                    numero, _ = validas.pop(tuple(chave))
+                    rejeitadas.append({"linha": numero, "erro": "Peça já cadastrada"})
+
+        novas = [peca for _, peca in validas.values()]
+        if novas:
+            # INSERTs em lote (executemany); o RETURNING devolve os ids na
+            # mesma ordem das linhas enviadas
+            ids = db.session.scalars(
+                insert(Peca).returning(Peca.id, sort_by_parameter_order=True),
+                [{"nome": p["nome"], "categoria": p["categoria"]} for p in novas]
+            ).all()
+            db.session.execute(insert(Estoque), [
+                {"peca_id": peca_id, "qtd": p["qtd"], "qtd_min": p["qtd_min"]}
+                for peca_id, p in zip(ids, novas)
+            ])
+            registrar_movimentacoes({peca_id: p["qtd"] for peca_id, p in zip(ids, novas)})
+        db.session.commit()
+        cache.invalidar("peca", "estoque")
+        if novas:
+            publicar_alertas(ids)
+
+        rejeitadas.sort(key=lambda r: r["linha"])
+        return None, {"aceitas": len(novas), "rejeitadas": rejeitadas}
     except Exception as e:
         db.session.rollback()
         return str(e), None
@@ -44,7 +156,8 @@ def atualizar_peca(id, data):
     estoque = Estoque.query.options(joinedload(Estoque.peca)).get(id)
     if not estoque:
         return "Peça/Estoque não encontrado", None
-    
+    qtd_anterior = estoque.qtd
+
     try:
         if "qtd" in data:
             qtd = int(data["qtd"])
@@ -67,7 +180,13 @@ def atualizar_peca(id, data):
     estoque.qtd_min = data.get("qtd_min", estoque.qtd_min)
 
     try:
+        # Correção manual de saldo entra no histórico como ajuste
+        ajuste = int(estoque.qtd) - qtd_anterior
+        if ajuste:
+            registrar_movimentacoes({estoque.peca_id: ajuste}, tipo="ajuste")
         db.session.commit()
+        cache.invalidar("peca", "estoque")
+        publicar_alertas([estoque.peca_id])
         return None
     except Exception as e:
         db.session.rollback()
@@ -82,6 +201,7 @@ def excluir_peca(id):
     try:
         db.session.delete(peca)
         db.session.commit()
+        cache.invalidar("peca", "estoque", "ordem_servico")
         return None
     except Exception as e:
         db.session.rollback()
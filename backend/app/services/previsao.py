@@ -0,0 +1,180 @@
+import io
+import math
+import os
+from datetime import date, datetime, time, timedelta
+import numpy as np
+from sqlalchemy import select
+from app import db
+from app.models.models import Estoque, OrdemServico, Pecas_Ordem_Servico, Peca
+
+# Previsão de ruptura por peça a partir do consumo registrado nas ordens de
+# serviço (Pecas_Ordem_Servico, na data da ordem). O histórico é lido como
+# colunas (peça, dia, quantidade) e as taxas de todas as peças saem de uma
+# vez com np.bincount, sem laço por peça nem matriz peça x dia:
+# - média móvel: consumo dos últimos `janela` dias / janela;
+# - exponencial (span `suavizacao`, alfa = 2 / (span + 1)): cada consumo
+#   pesa alfa * (1 - alfa) ** idade em dias, a média exponencial diária
+#   com os dias sem consumo valendo zero.
+#
+# Só é lido o trecho do histórico que ainda pesa nas contas: a média móvel
+# não vê além da janela, e na exponencial um consumo mais velho que
+# log(PESO_DESPREZIVEL) / log(1 - alfa) dias pesa menos que
+# PESO_DESPREZIVEL (~140 dias para span 30). Suavizações longas leem mais
+# histórico, até HISTORICO_MAXIMO_DIAS.
+
+JANELA_PADRAO = 90
+SUAVIZACAO_PADRAO = 30
+HISTORICO_MAXIMO_DIAS = 5 * 365
+PESO_DESPREZIVEL = 1e-4
+# Rupturas mais distantes que isso saem como "sem previsão"
+HORIZONTE_RUPTURA_DIAS = 10 * 365
+# Reposição: estoque para o prazo de entrega mais a cobertura desejada,
+# além do mínimo
+PRAZO_REPOSICAO_DIAS = int(os.getenv("PREVISAO_PRAZO_REPOSICAO_DIAS", "7"))
+COBERTURA_DIAS = int(os.getenv("PREVISAO_COBERTURA_DIAS", "30"))
+
+_MICROSSEGUNDOS_POR_DIA = 86_400_000_000
+# COPY binário do Postgres: cabeçalho de 19 bytes, cada linha com o número
+# de campos e (tamanho, valor) por campo, e 2 bytes no fim
+_LINHA_COPY = np.dtype([
+    ("campos", ">i2"),
+    ("t_peca", ">i4"), ("peca", ">i4"),
+    ("t_data", ">i4"), ("data", ">i8"),
+    ("t_quantidade", ">i4"), ("quantidade", ">i4"),
+])
+_EPOCA_POSTGRES = datetime(2000, 1, 1)
+
+
+def dias_de_historico(janela, suavizacao):
+    alfa = 2 / (suavizacao + 1)
+    relevantes = math.ceil(math.log(PESO_DESPREZIVEL) / math.log1p(-alfa)) if alfa < 1 else 1
+    return min(max(janela, relevantes), HISTORICO_MAXIMO_DIAS)
+
+
+def posicoes(ids, valores):
+    # Posição de cada valor em ids (ordenado, sem repetição), ou -1. Com ids
+    # densos usa uma tabela indexada pelo id (searchsorted custa ~20x mais)
+    valores = np.asarray(valores, np.int64)
+    if not len(ids):
+        return np.full(len(valores), -1)
+    if ids[-1] <= 4 * len(ids) + 1_000_000:
+        tabela = np.full(ids[-1] + 2, -1)
+        tabela[ids] = np.arange(len(ids))
+        return tabela[np.clip(valores, 0, ids[-1] + 1)]
+    posicao = np.minimum(np.searchsorted(ids, valores), len(ids) - 1)
+    return np.where(ids[posicao] == valores, posicao, -1)
+
+
+def _consulta_consumo(inicio, fim):
+    return select(
+        Pecas_Ordem_Servico.peca_id, OrdemServico.data, Pecas_Ordem_Servico.quantidade
+    ).join(
+        OrdemServico, OrdemServico.id == Pecas_Ordem_Servico.os_id
+    ).where(OrdemServico.data >= inicio, OrdemServico.data < fim)
+
+
+def carregar_consumo(inicio, fim):
+    # (peças, dias desde inicio, quantidades) como arrays. No Postgres vem
+    # por COPY binário direto para o numpy; nos demais, pelo cursor.
+    consulta = _consulta_consumo(inicio, fim)
+    conexao = db.session.connection()
+    if conexao.dialect.name == "postgresql":
+        sql = consulta.compile(dialect=conexao.dialect, compile_kwargs={"literal_binds": True})
+        buffer = io.BytesIO()
+        with conexao.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT (FORMAT binary)", buffer)
+        linhas = np.frombuffer(buffer.getbuffer()[19:-2], dtype=_LINHA_COPY)
+        base = int((inicio - _EPOCA_POSTGRES) / timedelta(microseconds=1))
+        dias = (linhas["data"] - base) // _MICROSSEGUNDOS_POR_DIA
+        return linhas["peca"].astype(np.int64), dias, linhas["quantidade"].astype(np.float64)
+
+    linhas = db.session.execute(consulta).all()
+    if not linhas:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float64)
+    pecas, datas, quantidades = zip(*linhas)
+    dias = (np.array(datas, dtype="datetime64[us]") - np.datetime64(inicio, "us")) // np.timedelta64(1, "D")
+    return np.array(pecas, np.int64), dias.astype(np.int64), np.array(quantidades, np.float64)
+
+
+def taxas_de_consumo(indices, idades, quantidades, n_pecas, janela, suavizacao):
+    # Consumo diário por peça: (média móvel, exponencial). indices é a linha
+    # da peça (0..n_pecas-1) e idades os dias desde o consumo (0 = hoje).
+    recentes = idades < janela
+    media_movel = np.bincount(indices[recentes], weights=quantidades[recentes], minlength=n_pecas) / janela
+    alfa = 2 / (suavizacao + 1)
+    # Peso por idade calculado uma vez por dia, não por consumo
+    peso_do_dia = alfa * np.power(1 - alfa, np.arange(idades.max() + 1 if len(idades) else 0))
+    exponencial = np.bincount(indices, weights=quantidades * peso_do_dia[idades], minlength=n_pecas)
+    return media_movel, exponencial
+
+
+def _parametro(valor, padrao, minimo, maximo):
+    valor = padrao if valor in (None, "") else int(valor)
+    if not minimo <= valor <= maximo:
+        raise ValueError
+    return valor
+
+
+def prever_rupturas(janela=None, suavizacao=None, prazo=None, cobertura=None, hoje=None):
+    try:
+        janela = _parametro(janela, JANELA_PADRAO, 1, HISTORICO_MAXIMO_DIAS)
+        suavizacao = _parametro(suavizacao, SUAVIZACAO_PADRAO, 1, HISTORICO_MAXIMO_DIAS)
+        prazo = _parametro(prazo, PRAZO_REPOSICAO_DIAS, 0, 365)
+        cobertura = _parametro(cobertura, COBERTURA_DIAS, 0, 365)
+    except (TypeError, ValueError):
+        return "Parâmetros inválidos", None
+
+    try:
+        hoje = hoje or date.today()
+        n_dias = dias_de_historico(janela, suavizacao)
+        inicio = datetime.combine(hoje - timedelta(days=n_dias - 1), time.min)
+        fim = datetime.combine(hoje + timedelta(days=1), time.min)
+
+        estoques = db.session.execute(
+            select(Estoque.id, Estoque.peca_id, Peca.nome, Estoque.qtd, Estoque.qtd_min)
+            .join(Peca, Peca.id == Estoque.peca_id).order_by(Estoque.peca_id)
+        ).all()
+        if not estoques:
+            return None, []
+        ids, peca_ids, nomes, qtd, qtd_min = zip(*estoques)
+        peca_ids = np.array(peca_ids, np.int64)
+        qtd = np.array(qtd, np.float64)
+        qtd_min = np.array(qtd_min, np.float64)
+
+        pecas, dias, quantidades = carregar_consumo(inicio, fim)
+        # Linha do estoque de cada consumo; peças sem estoque ficam de fora
+        indices = posicoes(peca_ids, pecas)
+        com_estoque = indices >= 0
+        media_movel, exponencial = taxas_de_consumo(
+            indices[com_estoque], (n_dias - 1) - dias[com_estoque], quantidades[com_estoque],
+            len(peca_ids), janela, suavizacao)
+
+        # O maior dos dois: a exponencial reage antes a um aumento e a média
+        # móvel não deixa uma queda recente esconder o consumo da janela
+        consumo = np.maximum(media_movel, exponencial)
+        dias_ate_ruptura = np.full(len(peca_ids), np.inf)
+        np.divide(np.maximum(qtd, 0), consumo, out=dias_ate_ruptura, where=consumo > 0)
+        dias_ate_ruptura[qtd <= 0] = 0
+        dias_ate_ruptura[dias_ate_ruptura > HORIZONTE_RUPTURA_DIAS] = np.inf
+        sugestao = np.maximum(np.ceil(consumo * (prazo + cobertura)) + qtd_min - qtd, 0)
+
+        # Ruptura mais próxima primeiro; sem previsão no fim
+        ordem = np.lexsort((peca_ids, dias_ate_ruptura)).tolist()
+        ruptura = np.where(np.isinf(dias_ate_ruptura), -1, np.floor(dias_ate_ruptura)).astype(np.int64).tolist()
+        media_movel = np.round(media_movel, 3).tolist()
+        exponencial = np.round(exponencial, 3).tolist()
+        sugestao = sugestao.astype(np.int64).tolist()
+        return None, [{
+            "id": ids[i],
+            "peca_id": int(peca_ids[i]),
+            "peca": nomes[i],
+            "qtd": int(qtd[i]),
+            "qtd_min": int(qtd_min[i]),
+            "consumo_medio": media_movel[i],
+            "consumo_exponencial": exponencial[i],
+            "dias_ate_ruptura": ruptura[i] if ruptura[i] >= 0 else None,
+            "data_ruptura": (hoje + timedelta(days=ruptura[i])).isoformat() if ruptura[i] >= 0 else None,
+            "sugestao_reposicao": sugestao[i],
+        } for i in ordem]
+    except Exception as e:
+        return str(e), None
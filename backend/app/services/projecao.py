@@ -0,0 +1,291 @@
+from datetime import date, datetime, time, timedelta
+import numpy as np
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import aliased
+from app import db
+from app.models.models import Estoque, OrdemServico, Pecas_Ordem_Servico, Peca, RECORRENCIA_UNICA
+from app.services.estoque import agrupar_pecas
+from app.services.previsao import posicoes
+from app.services.recorrencia import eh_unica, interpretar_regra, ocorrencias
+
+# Projeção do saldo de cada peça, dia a dia, com o uso já agendado:
+# - ordens de hoje em diante ainda não concluídas: as peças já foram
+#   baixadas de Estoque.qtd ao criar a ordem, então voltam ao saldo de
+#   partida e saem no dia da ordem;
+# - modelos recorrentes: as ocorrências não levam peças (recorrencia.py),
+#   então cada ocorrência no horizonte, gerada ou ainda por gerar, consome as
+#   peças do modelo. Ocorrência que já tem peças próprias conta como ordem;
+# - ordens hipotéticas (POST), para simular antes de agendar.
+#
+# Tudo vira (linha da peça, dia, quantidade); o uso por dia sai de um
+# np.bincount e o saldo de um np.cumsum por linha, sem consulta por dia.
+# O alerta segue a regra de Estoque.em_alerta (saldo <= qtd_min).
+
+HORIZONTE_PADRAO = 30
+HORIZONTE_MAXIMO = 365
+
+_VAZIO = np.zeros(0, np.int64)
+
+
+def _dias(datas, hoje):
+    # Dias desde hoje (0 = hoje); toordinal é ~25x mais rápido que converter
+    # a lista para datetime64. func.date() vem como texto no SQLite
+    hoje = hoje.toordinal()
+    return np.fromiter((
+        (data if isinstance(data, date) else date.fromisoformat(data)).toordinal() - hoje
+        for data in datas
+    ), np.int64, len(datas))
+
+
+def _sequencias(inicios, passos, n_dias):
+    # Para cada i: inicios[i], inicios[i] + passos[i]... até n_dias - 1.
+    # Devolve (i, dia) de todos os termos, sem laço por sequência
+    quantidades = np.maximum((n_dias - 1 - inicios) // passos + 1, 0)
+    i = np.repeat(np.arange(len(inicios)), quantidades)
+    termo = np.arange(len(i)) - np.repeat(np.cumsum(quantidades) - quantidades, quantidades)
+    return i, inicios[i] + termo * passos[i]
+
+
+def _expandir(oc_modelo, oc_dia, primeira_peca, n_pecas, peca, quantidade):
+    # Ocorrências (modelo, dia) -> uso (peça, dia, quantidade), uma linha por
+    # peça do modelo. As peças de cada modelo são contíguas a partir de
+    # primeira_peca[modelo]
+    n = n_pecas[oc_modelo]
+    total = int(n.sum())
+    posicao = np.repeat(primeira_peca[oc_modelo] - (np.cumsum(n) - n), n) + np.arange(total)
+    return peca[posicao], np.repeat(oc_dia, n), quantidade[posicao]
+
+
+def _dias_de_ocorrencia(fontes, limite, hoje):
+    # (modelo, dia) das ocorrências de cada fonte (data, regra, corte) a
+    # partir de corte até limite. A primeira sai de recorrencia.ocorrencias;
+    # nas regras em dias as demais são uma progressão aritmética
+    n_dias = (limite.date() - hoje).days + 1
+    em_dias, primeiros, passos = [], [], []
+    oc_modelo, oc_dia = [], []
+    for i, (data, regra, corte) in enumerate(fontes):
+        if regra is None:
+            continue
+        datas = ocorrencias(data, regra, corte - timedelta(microseconds=1))
+        primeira = next(datas)
+        if primeira > limite:
+            continue
+        passo, unidade = regra
+        if unidade == "dias":
+            em_dias.append(i)
+            primeiros.append((primeira.date() - hoje).days)
+            passos.append(passo)
+            continue
+        while primeira <= limite:
+            oc_modelo.append(i)
+            oc_dia.append((primeira.date() - hoje).days)
+            primeira = next(datas)
+    sequencia, dias = _sequencias(np.array(primeiros, np.int64), np.array(passos, np.int64), n_dias)
+    return (np.concatenate([np.array(em_dias, np.int64)[sequencia], np.array(oc_modelo, np.int64)]),
+            np.concatenate([dias, np.array(oc_dia, np.int64)]))
+
+
+def _ler_hipoteticas(ordens):
+    # [{"data", "recorrencia"?, "pecas_utilizadas"}] -> [(data, regra, {peca: qtd})]
+    if not isinstance(ordens, list):
+        return "Dados da simulação inválidos", None
+    lidas = []
+    for ordem in ordens:
+        try:
+            data = datetime.fromisoformat(str(ordem["data"]))
+            if data.tzinfo:
+                raise ValueError
+            pecas = ordem.get("pecas_utilizadas") or []
+            recorrencia = ordem.get("recorrencia")
+            if not isinstance(pecas, list) or not all(isinstance(p, dict) for p in pecas) \
+                    or not isinstance(recorrencia, (str, type(None))):
+                raise TypeError
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return "Dados da simulação inválidos", None
+        regra = None
+        if not eh_unica(recorrencia):
+            regra = interpretar_regra(recorrencia)
+            if regra is None:
+                return f"Dados da simulação inválidos: recorrência '{recorrencia}' não reconhecida", None
+        erro, quantidades = agrupar_pecas(pecas)
+        if erro:
+            return erro, None
+        lidas.append((data, regra, quantidades))
+    return None, lidas
+
+
+def _uso_agendado(inicio, limite):
+    return db.session.execute(
+        select(Pecas_Ordem_Servico.peca_id, OrdemServico.data, Pecas_Ordem_Servico.quantidade)
+        .join(OrdemServico, OrdemServico.id == Pecas_Ordem_Servico.os_id)
+        .where(OrdemServico.data >= inicio, OrdemServico.data <= limite,
+               OrdemServico.status != "Concluída")
+    ).all()
+
+
+def _modelos_com_pecas():
+    # Uma linha por peça de cada modelo recorrente, agrupadas por modelo
+    return db.session.execute(
+        select(OrdemServico.id, OrdemServico.data, OrdemServico.recorrencia,
+               OrdemServico.recorrencia_proxima, Pecas_Ordem_Servico.peca_id,
+               Pecas_Ordem_Servico.quantidade)
+        .join(Pecas_Ordem_Servico, Pecas_Ordem_Servico.os_id == OrdemServico.id)
+        .where(OrdemServico.origem_id.is_(None), OrdemServico.recorrencia != RECORRENCIA_UNICA)
+        .order_by(OrdemServico.id)
+    ).all()
+
+
+def _uso_gerado(inicio, limite):
+    # (peça, dia, quantidade) das ocorrências já geradas, pendentes e sem
+    # peças próprias, com as peças do modelo, somadas por dia no banco
+    propria = aliased(Pecas_Ordem_Servico)
+    proprias = select(propria.os_id).where(propria.os_id == OrdemServico.id)
+    dia = func.date(OrdemServico.data)
+    return db.session.execute(
+        select(Pecas_Ordem_Servico.peca_id, dia, func.sum(Pecas_Ordem_Servico.quantidade))
+        .select_from(OrdemServico)
+        .join(Pecas_Ordem_Servico, Pecas_Ordem_Servico.os_id == OrdemServico.origem_id)
+        .where(OrdemServico.origem_id.isnot(None),
+               OrdemServico.data >= inicio, OrdemServico.data <= limite,
+               OrdemServico.status != "Concluída", ~proprias.exists())
+        .group_by(Pecas_Ordem_Servico.peca_id, dia)
+    ).all()
+
+
+def _geradas_apos_corte(inicio, limite):
+    # (modelo, data) das ocorrências já geradas a partir de
+    # recorrencia_proxima: só existem se o modelo foi recalculado, e o
+    # cálculo não deve contá-las de novo
+    modelo = aliased(OrdemServico)
+    return db.session.execute(
+        select(OrdemServico.origem_id, OrdemServico.data)
+        .join(modelo, modelo.id == OrdemServico.origem_id)
+        .where(modelo.origem_id.is_(None), modelo.recorrencia != RECORRENCIA_UNICA,
+               OrdemServico.data >= inicio, OrdemServico.data <= limite,
+               or_(modelo.recorrencia_proxima.is_(None), OrdemServico.data >= modelo.recorrencia_proxima))
+    ).all()
+
+
+def _uso_recorrente(inicio, limite, hoje, hipoteticas):
+    # (peça, dia, quantidade) das ocorrências dos modelos reais e dos
+    # hipotéticos no horizonte
+    n_dias = (limite.date() - hoje).days + 1
+    modelo_ids, fontes, primeira_peca, pecas, quantidades = [], [], [], [], []
+    regras = {}
+    for id, data, recorrencia, proxima, peca_id, quantidade in _modelos_com_pecas():
+        if not modelo_ids or modelo_ids[-1] != id:
+            if recorrencia not in regras:
+                regras[recorrencia] = interpretar_regra(recorrencia)
+            # Antes de recorrencia_proxima as ocorrências já foram geradas
+            # (e a excluída à mão não volta); dali em diante, são as que o
+            # gerador ainda vai criar
+            modelo_ids.append(id)
+            fontes.append((data, regras[recorrencia], max(proxima or inicio, inicio)))
+            primeira_peca.append(len(pecas))
+        pecas.append(peca_id)
+        quantidades.append(quantidade)
+    for data, regra, usadas in hipoteticas:
+        if regra and usadas:
+            fontes.append((data, regra, inicio))
+            primeira_peca.append(len(pecas))
+            pecas.extend(usadas)
+            quantidades.extend(usadas.values())
+    primeira_peca.append(len(pecas))
+
+    oc_modelo, oc_dia = _dias_de_ocorrencia(fontes, limite, hoje)
+    usos = []
+    if modelo_ids:
+        geradas = _geradas_apos_corte(inicio, limite)
+        if geradas:
+            origens, datas = zip(*geradas)
+            ger_modelo = posicoes(np.array(modelo_ids, np.int64), origens)
+            ger_dia = _dias(datas, hoje)
+            novas = ~np.isin(oc_modelo * n_dias + oc_dia, ger_modelo * n_dias + ger_dia)
+            oc_modelo, oc_dia = oc_modelo[novas], oc_dia[novas]
+        uso = _uso_gerado(inicio, limite)
+        if uso:
+            peca, dia, quantidade = zip(*uso)
+            usos.append((np.array(peca, np.int64), _dias(dia, hoje), np.array(quantidade, np.int64)))
+
+    primeira_peca = np.array(primeira_peca, np.int64)
+    usos.append(_expandir(oc_modelo, oc_dia, primeira_peca[:-1], np.diff(primeira_peca),
+                          np.array(pecas, np.int64), np.array(quantidades, np.int64)))
+    return tuple(np.concatenate(coluna) for coluna in zip(*usos))
+
+
+def projetar_estoque(horizonte=None, peca_ids=None, ordens=None, hoje=None):
+    try:
+        horizonte = HORIZONTE_PADRAO if horizonte in (None, "") else int(horizonte)
+        if not 0 <= horizonte <= HORIZONTE_MAXIMO:
+            raise ValueError
+        filtro = np.array(sorted({int(p) for p in peca_ids or []}), np.int64)
+    except (TypeError, ValueError):
+        return "Parâmetros inválidos", None
+
+    try:
+        erro, hipoteticas = _ler_hipoteticas(ordens or [])
+        if erro:
+            return erro, None
+        hoje = hoje or date.today()
+        inicio = datetime.combine(hoje, time.min)
+        limite = datetime.combine(hoje + timedelta(days=horizonte), time.max)
+        n_dias = horizonte + 1
+        resultado = {"inicio": hoje.isoformat(), "dias": n_dias, "pecas": []}
+
+        estoques = db.session.execute(
+            select(Estoque.peca_id, Peca.nome, Estoque.qtd, Estoque.qtd_min)
+            .join(Peca, Peca.id == Estoque.peca_id).order_by(Estoque.peca_id)
+        ).all()
+        if not estoques:
+            return None, resultado
+        peca_ids, nomes, qtd, qtd_min = zip(*estoques)
+        peca_ids = np.array(peca_ids, np.int64)
+
+        # Ordens agendadas: o que já foi reservado volta ao saldo de partida
+        agendadas = _uso_agendado(inicio, limite)
+        ag_peca, ag_data, ag_qtd = zip(*agendadas) if agendadas else ((), (), ())
+        reservas = (np.array(ag_peca, np.int64), _dias(ag_data, hoje), np.array(ag_qtd, np.int64))
+        usos = [reservas, _uso_recorrente(inicio, limite, hoje, hipoteticas)]
+        for data, _, usadas in hipoteticas:
+            if inicio <= data <= limite:
+                usos.append((np.fromiter(usadas, np.int64), np.full(len(usadas), (data.date() - hoje).days),
+                             np.fromiter(usadas.values(), np.int64)))
+        uso_peca, uso_dia, uso_qtd = (np.concatenate(coluna) for coluna in zip(*usos))
+
+        # Só as peças com uso no horizonte (ou as pedidas), numa matriz
+        # peça x dia
+        uso_linha = posicoes(peca_ids, uso_peca)
+        selecionadas = posicoes(peca_ids, filtro) if len(filtro) else np.unique(uso_linha)
+        selecionadas = selecionadas[selecionadas >= 0]
+        n_pecas = len(selecionadas)
+        linha = np.full(len(peca_ids) + 1, -1)
+        linha[selecionadas] = np.arange(n_pecas)
+        uso_linha = linha[uso_linha]
+        contam = uso_linha >= 0
+        uso = np.bincount(uso_linha[contam] * n_dias + uso_dia[contam], weights=uso_qtd[contam],
+                          minlength=n_pecas * n_dias).reshape(n_pecas, n_dias)
+        reserva_linha = linha[posicoes(peca_ids, reservas[0])]
+        reservado = np.bincount(reserva_linha[reserva_linha >= 0], weights=reservas[2][reserva_linha >= 0],
+                                minlength=n_pecas).astype(np.int64)
+
+        qtd = np.array(qtd, np.int64)[selecionadas]
+        qtd_min = np.array(qtd_min, np.int64)[selecionadas]
+        saldos = (qtd + reservado)[:, None] - np.cumsum(uso, axis=1).astype(np.int64)
+        em_alerta = saldos <= qtd_min[:, None]
+        primeiro = np.where(em_alerta.any(axis=1), em_alerta.argmax(axis=1), -1).tolist()
+
+        # Alerta mais próximo primeiro; sem alerta no horizonte no fim
+        ordem = np.lexsort((peca_ids[selecionadas], np.where(np.array(primeiro) < 0, n_dias, primeiro)))
+        saldos, reservado = saldos.tolist(), reservado.tolist()
+        resultado["pecas"] = [{
+            "peca_id": int(peca_ids[selecionadas[i]]),
+            "peca": nomes[selecionadas[i]],
+            "qtd": int(qtd[i]),
+            "qtd_min": int(qtd_min[i]),
+            "reservado": reservado[i],
+            "saldos": saldos[i],
+            "primeiro_dia_em_alerta": (hoje + timedelta(days=primeiro[i])).isoformat() if primeiro[i] >= 0 else None,
+        } for i in ordem.tolist()]
+        return None, resultado
+    except Exception as e:
+        return str(e), None
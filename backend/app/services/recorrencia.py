@@ -0,0 +1,260 @@
+import calendar
+import logging
+import os
+import re
+import threading
+import unicodedata
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models.models import OrdemServico, RECORRENCIA_UNICA
+from app.utils import cache, eventos
+
+# Ordens recorrentes: uma ordem com recorrência diferente de "Única" é um
+# modelo, e as próximas ocorrências viram ordens "Pendente" com origem_id
+# apontando para ele. As ocorrências são geradas só até HORIZONTE_DIAS à
+# frente; cada execução avança a janela.
+#
+# Pode rodar quantas vezes quiser, inclusive em paralelo:
+# - recorrencia_proxima guarda a próxima ocorrência ainda não gerada de cada
+#   modelo, então a execução só lê os modelos com alguma ocorrência entrando
+#   na janela (um modelo mensal é lido uma vez por mês) e uma ocorrência
+#   excluída à mão não volta;
+# - o índice único (origem_id, data) com ON CONFLICT DO NOTHING descarta
+#   o que outro gerador inseriu ao mesmo tempo.
+#
+# A recorrência é validada ao gravar (normalizar_recorrencia): as variações
+# de "sem recorrência" viram "Única" e texto não reconhecido é recusado.
+# Um modelo antigo com regra não reconhecida recebe REGRA_NAO_RECONHECIDA em
+# recorrencia_proxima e deixa de ser lido até a regra ser editada.
+#
+# As peças do modelo não são copiadas: incluí-las baixaria o estoque agora
+# para um serviço futuro. Elas entram quando a ocorrência é executada.
+
+HORIZONTE_DIAS = int(os.getenv("RECORRENCIA_HORIZONTE_DIAS", "30"))
+# Geração periódica dentro de cada worker (0 desliga; use o comando
+# "flask ordens recorrencias" agendado)
+INTERVALO_MINUTOS = int(os.getenv("RECORRENCIA_INTERVALO_MINUTOS", "0"))
+MODELOS_POR_LOTE = 1000
+# recorrencia_proxima de modelo com regra não reconhecida: fica fora de
+# qualquer janela; atualizar_ordem limpa ao trocar a regra
+REGRA_NAO_RECONHECIDA = datetime(9999, 12, 31)
+
+log = logging.getLogger(__name__)
+
+# Nome -> (passo, unidade); unidade "dias" ou "meses"
+REGRAS = {
+    "diaria": (1, "dias"),
+    "diario": (1, "dias"),
+    "semanal": (7, "dias"),
+    "quinzenal": (14, "dias"),
+    "mensal": (1, "meses"),
+    "bimestral": (2, "meses"),
+    "trimestral": (3, "meses"),
+    "semestral": (6, "meses"),
+    "anual": (12, "meses"),
+}
+# Personalizada: "a cada 10 dias", "cada 2 semanas", "a cada 4 meses"...
+_PERSONALIZADA = re.compile(r"^(?:a )?cada (\d+) (dias?|semanas?|mes|meses|anos?)$")
+_UNIDADES = {"dia": (1, "dias"), "semana": (7, "dias"), "mes": (1, "meses"), "ano": (12, "meses")}
+# Textos aceitos para "sem recorrência", já normalizados
+UNICAS = {"", "unica", "nenhuma", "sem recorrencia", "nao se repete"}
+
+
+def _normalizar(texto):
+    sem_acento = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode()
+    return " ".join(sem_acento.lower().split())
+
+
+def interpretar_regra(recorrencia):
+    # (passo, unidade) ou None se a recorrência não é reconhecida
+    texto = _normalizar(recorrencia)
+    if texto in REGRAS:
+        return REGRAS[texto]
+    encontrado = _PERSONALIZADA.match(texto)
+    if not encontrado or int(encontrado.group(1)) == 0:
+        return None
+    unidade = encontrado.group(2)
+    unidade = "mes" if unidade == "meses" else unidade.rstrip("s")
+    passo, tipo = _UNIDADES[unidade]
+    return passo * int(encontrado.group(1)), tipo
+
+
+def eh_unica(recorrencia):
+    return _normalizar(recorrencia) in UNICAS
+
+
+def normalizar_recorrencia(recorrencia):
+    # (erro, texto a gravar): "Única" para as variações de sem recorrência,
+    # a regra como veio (sem espaços nas pontas) se for reconhecida
+    if recorrencia is not None and not isinstance(recorrencia, str):
+        return "Recorrência inválida", None
+    if eh_unica(recorrencia):
+        return None, RECORRENCIA_UNICA
+    if interpretar_regra(recorrencia) is None:
+        return f"Recorrência '{recorrencia}' não reconhecida", None
+    return None, recorrencia.strip()
+
+
+def _somar_meses(data, meses):
+    # Dia 31 em mês mais curto vira o último dia do mês
+    ano, mes = divmod(data.month - 1 + meses, 12)
+    ano += data.year
+    dia = min(data.day, calendar.monthrange(ano, mes + 1)[1])
+    return data.replace(year=ano, month=mes + 1, day=dia)
+
+
+def ocorrencias(inicio, regra, depois_de):
+    # Datas inicio + k * passo (k >= 1) depois de depois_de, sem fim: quem
+    # chama para no horizonte. Calculadas a partir de inicio (sem acumular o
+    # ajuste de fim de mês) e começando direto no primeiro k depois de
+    # depois_de, sem percorrer o passado do modelo.
+    passo, unidade = regra
+    if unidade == "dias":
+        intervalo = timedelta(days=passo)
+        k = max(1, (depois_de - inicio) // intervalo + 1) if depois_de >= inicio else 1
+        while True:
+            yield inicio + k * intervalo
+            k += 1
+
+    decorridos = (depois_de.year - inicio.year) * 12 + depois_de.month - inicio.month
+    k = max(1, decorridos // passo)
+    while True:
+        data = _somar_meses(inicio, k * passo)
+        if data > depois_de:
+            yield data
+        k += 1
+
+
+def consulta_modelos(limite, depois_do_id=0):
+    # Modelos recorrentes com ocorrências a gerar até limite, por id
+    return db.session.query(
+        OrdemServico.id,
+        OrdemServico.data,
+        OrdemServico.recorrencia,
+        OrdemServico.recorrencia_proxima,
+        OrdemServico.tipo,
+        OrdemServico.setor,
+        OrdemServico.detalhes,
+        OrdemServico.equipamento_id,
+        OrdemServico.solicitante_id,
+    ).filter(
+        OrdemServico.origem_id.is_(None),
+        OrdemServico.recorrencia != RECORRENCIA_UNICA,
+        or_(OrdemServico.recorrencia_proxima.is_(None), OrdemServico.recorrencia_proxima <= limite),
+        OrdemServico.id > depois_do_id,
+    ).order_by(OrdemServico.id)
+
+
+def _inserir_sem_repetir():
+    dialeto = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    return dialeto.insert(OrdemServico.__table__).on_conflict_do_nothing(
+        index_elements=["origem_id", "data"]
+    ).returning(OrdemServico.__table__.c.id)
+
+
+def gerar_ocorrencias(horizonte_dias=None, hoje=None):
+    # Materializa as ocorrências dos modelos até hoje + horizonte_dias, um
+    # INSERT por lote de modelos. Ocorrências que caíram antes de hoje (o
+    # gerador ficou parado) não são criadas atrasadas.
+    hoje = hoje or date.today()
+    horizonte_dias = HORIZONTE_DIAS if horizonte_dias is None else horizonte_dias
+    limite = datetime.combine(hoje + timedelta(days=horizonte_dias), time.max)
+    antes_de_hoje = datetime.combine(hoje, time.min) - timedelta(microseconds=1)
+    resumo = {"modelos": 0, "geradas": 0, "ignoradas": 0}
+
+    try:
+        ultimo_id = 0
+        while True:
+            modelos = consulta_modelos(limite, ultimo_id).limit(MODELOS_POR_LOTE).all()
+            if not modelos:
+                break
+            ultimo_id = modelos[-1].id
+
+            novas, marcas, ignoradas = [], [], []
+            for modelo in modelos:
+                regra = interpretar_regra(modelo.recorrencia)
+                if regra is None:
+                    # Gravado antes da validação: marcado para não ser lido de
+                    # novo a cada execução
+                    ignoradas.append({"id": modelo.id, "recorrencia_proxima": REGRA_NAO_RECONHECIDA})
+                    continue
+                ja_gerado = modelo.recorrencia_proxima - timedelta(microseconds=1) \
+                    if modelo.recorrencia_proxima else modelo.data
+                datas = ocorrencias(modelo.data, regra, max(ja_gerado, antes_de_hoje))
+                data = next(datas)
+                while data <= limite:
+                    novas.append({
+                        "tipo": modelo.tipo,
+                        "setor": modelo.setor,
+                        "data": data,
+                        "recorrencia": RECORRENCIA_UNICA,
+                        "detalhes": modelo.detalhes,
+                        "status": "Pendente",
+                        "equipamento_id": modelo.equipamento_id,
+                        "solicitante_id": modelo.solicitante_id,
+                        "origem_id": modelo.id,
+                    })
+                    data = next(datas)
+                marcas.append({"id": modelo.id, "recorrencia_proxima": data})
+
+            if novas:
+                resumo["geradas"] += len(db.session.execute(_inserir_sem_repetir(), novas).all())
+            if marcas or ignoradas:
+                db.session.execute(update(OrdemServico), marcas + ignoradas)
+            db.session.commit()
+            resumo["modelos"] += len(marcas)
+            resumo["ignoradas"] += len(ignoradas)
+    except Exception as e:
+        db.session.rollback()
+        return str(e), None
+
+    if resumo["geradas"]:
+        cache.invalidar("ordem_servico")
+        eventos.emitir("ordens_geradas", {"quantidade": resumo["geradas"]})
+    return None, resumo
+
+
+class _Agendador(threading.Thread):
+    def __init__(self, app, intervalo):
+        super().__init__(name="recorrencia", daemon=True)
+        self.app = app
+        self.intervalo = intervalo
+        self.parar = threading.Event()
+
+    def run(self):
+        while not self.parar.is_set():
+            with self.app.app_context():
+                erro, resumo = gerar_ocorrencias()
+                db.session.remove()
+            if erro:
+                log.error("Falha ao gerar ordens recorrentes: %s", erro)
+            elif resumo["geradas"]:
+                log.info("%d ordens recorrentes geradas", resumo["geradas"])
+            self.parar.wait(self.intervalo)
+
+
+_agendador = None
+
+
+def iniciar_agendador(app):
+    # Como o ouvinte de invalidação, a thread não sobrevive ao fork: o
+    # gunicorn chama no post_fork de cada worker
+    global _agendador
+    if INTERVALO_MINUTOS <= 0:
+        return None
+    if _agendador is not None and _agendador.pid == os.getpid() and _agendador.is_alive():
+        return _agendador
+    _agendador = _Agendador(app, INTERVALO_MINUTOS * 60)
+    _agendador.pid = os.getpid()
+    _agendador.start()
+    return _agendador
+
+
+def parar_agendador():
+    global _agendador
+    if _agendador is not None:
+        _agendador.parar.set()
+        _agendador.join(timeout=10)
+        _agendador = None
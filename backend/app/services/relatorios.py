@@ -0,0 +1,61 @@
+from app.models.models import OrdemServico, Estoque
+from app.services.ordem_servico import filtrar_ordens
+from app.services.serializacao import consulta_ordens, consulta_estoques
+from app.utils.exportacao import gerar_csv, gerar_xlsx
+
+LINHAS_POR_LOTE = 1000
+
+CABECALHO_ORDENS = ["Equipamento", "Responsável", "Tipo", "Status", "Data de Abertura", "Descrição"]
+CABECALHO_ESTOQUE = ["Nome", "Quantidade", "Quantidade Mínima", "Alerta"]
+
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "relatorio-manutencao.csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "relatorio_manutencao.xlsx"),
+}
+
+
+def _linhas_ordens(query):
+    # yield_per busca em lotes (cursor do lado do servidor no Postgres), então
+    # a memória não cresce com o número de ordens
+    for o in query.yield_per(LINHAS_POR_LOTE):
+        yield [
+            o.equipamento_peca or "Sem Nome",
+            o.solicitante_nome or "Sem Nome",
+            o.tipo,
+            o.status,
+            o.data.strftime("%d/%m/%Y") if o.data else "",
+            (o.detalhes or "").replace("\n", " ")
+        ]
+
+
+def _linhas_estoque(query):
+    for e in query.yield_per(LINHAS_POR_LOTE):
+        yield [
+            e.nome,
+            e.qtd,
+            e.qtd_min,
+            "⚠️ Baixo Estoque" if e.em_alerta else "OK"
+        ]
+
+
+def exportar_relatorio(filtros, formato):
+    if formato not in FORMATOS:
+        return "Formato inválido", None
+
+    try:
+        ordens = filtrar_ordens(consulta_ordens(), filtros).order_by(
+            OrdemServico.data.desc(), OrdemServico.id.desc())
+    except (TypeError, ValueError):
+        return "Filtro inválido", None
+
+    if formato == "csv":
+        conteudo = gerar_csv(CABECALHO_ORDENS, _linhas_ordens(ordens))
+    else:
+        estoque = consulta_estoques().order_by(Estoque.id)
+        conteudo = gerar_xlsx([
+            ("Ordens de Manutenção", CABECALHO_ORDENS, _linhas_ordens(ordens)),
+            ("Estoque", CABECALHO_ESTOQUE, _linhas_estoque(estoque)),
+        ])
+
+    mimetype, nome_arquivo = FORMATOS[formato]
+    return None, (conteudo, mimetype, nome_arquivo)
@@ -0,0 +1,11 @@
+from app import db
+from sqlalchemy import text
+
+
+def verificar_banco():
+    try:
+        db.session.execute(text("SELECT 1"))
+        return None
+    except Exception as e:
+        db.session.rollback()
+        return str(e)
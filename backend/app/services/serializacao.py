@@ -0,0 +1,147 @@
+from itertools import chain, islice
+from app import db
+from app.models.models import OrdemServico, Estoque, Peca, Usuario, Pecas_Ordem_Servico
+
+# Serialização por projeção: em vez de carregar objetos ORM e deixar o
+# to_dict() disparar lazy loads por linha, buscamos só as colunas que vão
+# para o JSON. Ordens custam duas consultas (ordens + peças utilizadas) e
+# estoque custa uma, independente da quantidade de linhas; em fluxo, as
+# peças custam uma consulta por lote de ordens.
+
+LINHAS_POR_LOTE = 1000
+
+
+def consulta_ordens():
+    return db.session.query(
+        OrdemServico.id,
+        OrdemServico.tipo,
+        OrdemServico.setor,
+        OrdemServico.recorrencia,
+        OrdemServico.detalhes,
+        OrdemServico.status_efetivo.label("status"),
+        OrdemServico.data,
+        OrdemServico.origem_id,
+        Estoque.id.label("equipamento_id"),
+        Peca.nome.label("equipamento_peca"),
+        Peca.categoria.label("equipamento_categoria"),
+        Estoque.qtd.label("equipamento_qtd"),
+        Estoque.qtd_min.label("equipamento_qtd_min"),
+        Usuario.id.label("solicitante_id"),
+        Usuario.nome.label("solicitante_nome"),
+        Usuario.email.label("solicitante_email"),
+        Usuario.funcao.label("solicitante_funcao"),
+        Usuario.setor.label("solicitante_setor"),
+    ).select_from(OrdemServico).outerjoin(
+        Estoque, OrdemServico.equipamento_id == Estoque.id
+    ).outerjoin(
+        Peca, Estoque.peca_id == Peca.id
+    ).outerjoin(
+        Usuario, OrdemServico.solicitante_id == Usuario.id
+    )
+
+
+def consulta_estoques():
+    return db.session.query(
+        Estoque.id,
+        Peca.nome,
+        Peca.categoria,
+        Estoque.qtd,
+        Estoque.qtd_min,
+        Estoque.em_alerta,
+    ).select_from(Estoque).outerjoin(Peca, Estoque.peca_id == Peca.id)
+
+
+def linha_ordem(linha, pecas=()):
+    return {
+        "id": linha.id,
+        "tipo": linha.tipo,
+        "setor": linha.setor,
+        "recorrencia": linha.recorrencia,
+        "detalhes": linha.detalhes,
+        "status": linha.status,
+        "equipamento": {
+            "id": linha.equipamento_id,
+            "peca": linha.equipamento_peca,
+            "categoria": linha.equipamento_categoria or None,
+            "qtd": linha.equipamento_qtd,
+            "qtd_min": linha.equipamento_qtd_min
+        } if linha.equipamento_id is not None else None,
+        "solicitante": {
+            "id": linha.solicitante_id,
+            "nome": linha.solicitante_nome,
+            "email": linha.solicitante_email,
+            "funcao": linha.solicitante_funcao,
+            "setor": linha.solicitante_setor,
+        } if linha.solicitante_id is not None else None,
+        "data": linha.data.strftime("%Y-%m-%d") if linha.data else None,
+        "origem_id": linha.origem_id,
+        "pecas_utilizadas": list(pecas)
+    }
+
+
+def linha_estoque(linha):
+    return {
+        "id": linha.id,
+        "peca": linha.nome,
+        "categoria": linha.categoria or None,
+        "qtd": linha.qtd,
+        "qtd_min": linha.qtd_min
+    }
+
+
+def _pecas_das_ordens(query):
+    # As peças de todas as ordens vêm numa única consulta, restrita pela
+    # mesma consulta (filtros, ordem e limite) que gerou as linhas
+    ids = query.with_entities(OrdemServico.id).subquery()
+    return _pecas_por_ordem(db.select(ids.c.id))
+
+
+def _pecas_por_ordem(os_ids):
+    pecas = {}
+    for os_id, peca_id, quantidade in db.session.query(
+        Pecas_Ordem_Servico.os_id,
+        Pecas_Ordem_Servico.peca_id,
+        Pecas_Ordem_Servico.quantidade
+    ).filter(
+        Pecas_Ordem_Servico.os_id.in_(os_ids)
+    ).order_by(Pecas_Ordem_Servico.os_id, Pecas_Ordem_Servico.peca_id):
+        pecas.setdefault(os_id, []).append({"peca_id": peca_id, "quantidade": quantidade})
+    return pecas
+
+
+def _lotes_de_ordens(query):
+    # (linhas, peças das linhas) a cada LINHAS_POR_LOTE ordens: as peças vêm
+    # por IN com os ids do lote, então a memória não cresce com a tabela
+    linhas = iter(query.yield_per(LINHAS_POR_LOTE))
+    while lote := list(islice(linhas, LINHAS_POR_LOTE)):
+        yield lote, _pecas_por_ordem([linha.id for linha in lote])
+
+
+def iterar_ordens(query):
+    # Versão preguiçosa para respostas em fluxo: o primeiro lote é lido já
+    # (erros de banco aparecem aqui) e os demais durante a iteração
+    lotes = _lotes_de_ordens(query)
+    primeiro = next(lotes, None)
+    return (
+        linha_ordem(linha, pecas.get(linha.id, ()))
+        for lote, pecas in (chain([primeiro], lotes) if primeiro else ())
+        for linha in lote
+    )
+
+
+def serializar_ordens(query, linhas=None):
+    if linhas is None:
+        linhas = query.all()
+    if not linhas:
+        return []
+
+    pecas = _pecas_das_ordens(query)
+    return [linha_ordem(linha, pecas.get(linha.id, ())) for linha in linhas]
+
+
+def iterar_estoques(query):
+    return (linha_estoque(linha) for linha in query.yield_per(LINHAS_POR_LOTE))
+
+
+def serializar_estoques(query):
+    return [linha_estoque(linha) for linha in query]
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models.models import SessaoRevogada, Usuario
+from app.utils import invalidacao
+
+# Sessões por token assinado (HMAC com a SECRET_KEY). O hash de senha, que é
+# lento de propósito, roda só no login; depois cada requisição é validada
+# pela assinatura, pela idade do token e pela lista de revogadas em memória,
+# sem ir ao banco. Revogações são gravadas na tabela sessao_revogada e
+# avisadas aos outros processos pelo canal de invalidação.
+
+log = logging.getLogger(__name__)
+
+DURACAO_PADRAO = 8 * 60 * 60
+
+_lock = threading.Lock()
+_revogadas = {}
+
+
+def _serializador():
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt="sessao")
+
+
+def _duracao():
+    return current_app.config.get("SESSAO_DURACAO", DURACAO_PADRAO)
+
+
+def emitir_sessao(usuario):
+    duracao = _duracao()
+    token = _serializador().dumps({
+        "id": usuario.id,
+        "funcao": usuario.funcao,
+        "jti": uuid.uuid4().hex
+    })
+    return {
+        "token": token,
+        "expira_em": datetime.fromtimestamp(time.time() + duracao).isoformat(timespec="seconds")
+    }
+
+
+def verificar_token(token):
+    try:
+        dados, emitido_em = _serializador().loads(token, max_age=_duracao(), return_timestamp=True)
+    except SignatureExpired:
+        return "Sessão expirada", None
+    except BadSignature:
+        return "Sessão inválida", None
+
+    if dados.get("jti") in _revogadas:
+        return "Sessão encerrada", None
+    dados["expira_em"] = emitido_em.timestamp() + _duracao()
+    return None, dados
+
+
+def aplicar_revogacoes(revogadas):
+    # revogadas: {jti: expira_em em segundos desde a época}
+    agora = time.time()
+    with _lock:
+        _revogadas.update(revogadas)
+        for jti in [j for j, expira_em in _revogadas.items() if expira_em < agora]:
+            del _revogadas[jti]
+
+
+def encerrar_sessao(sessao):
+    try:
+        agora = datetime.now()
+        db.session.query(SessaoRevogada).filter(SessaoRevogada.expira_em < agora).delete()
+        db.session.merge(SessaoRevogada(
+            jti=sessao["jti"], expira_em=datetime.fromtimestamp(sessao["expira_em"])))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return str(e)
+
+    aplicar_revogacoes({sessao["jti"]: sessao["expira_em"]})
+    invalidacao.publicar(revogadas={sessao["jti"]: sessao["expira_em"]})
+    return None
+
+
+def renovar_sessao(sessao):
+    # Troca um token válido por outro com validade nova; o antigo é revogado
+    usuario = db.session.get(Usuario, sessao["id"])
+    if usuario is None:
+        return "Usuário não encontrado", None
+
+    erro = encerrar_sessao(sessao)
+    if erro:
+        return erro, None
+    return None, emitir_sessao(usuario)
+
+
+def carregar_revogadas():
+    linhas = db.session.query(SessaoRevogada.jti, SessaoRevogada.expira_em).filter(
+        SessaoRevogada.expira_em >= datetime.now()).all()
+    with _lock:
+        _revogadas.clear()
+    aplicar_revogacoes({jti: expira_em.timestamp() for jti, expira_em in linhas})
+
+
+def iniciar(app):
+    with app.app_context():
+        try:
+            carregar_revogadas()
+        except SQLAlchemyError:
+            # Banco sem o esquema ainda (ex.: o próprio "flask db upgrade"
+            # carrega a aplicação antes de criar as tabelas)
+            db.session.rollback()
+            log.warning("Tabela sessao_revogada indisponível; lista de revogadas vazia")
+
+    def recarregar():
+        with app.app_context():
+            carregar_revogadas()
+
+    invalidacao.ao_receber("revogadas", aplicar_revogacoes)
+    invalidacao.ao_reconectar("sessoes", recarregar)
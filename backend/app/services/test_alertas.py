@@ -0,0 +1,129 @@
+import pytest
+from sqlalchemy import event
+from app.services import alertas, estoque as estoque_service
+from app.services.notificacoes_estoque import MAX_PECAS_POR_EVENTO, listar_notificacoes, publicar_alertas
+from app.utils import eventos
+
+
+@pytest.fixture
+def app_db(db):
+    """Uma peça abaixo, uma no mínimo e uma acima."""
+    from app.models import Peca, Estoque
+
+    pecas = {}
+    for nome, qtd, qtd_min in [("Correia", 1, 3), ("Filtro", 2, 2), ("Parafuso", 10, 2)]:
+        peca = Peca(nome=nome, categoria="Mecânica")
+        db.session.add(peca)
+        db.session.flush()
+        db.session.add(Estoque(qtd=qtd, qtd_min=qtd_min, peca_id=peca.id))
+        pecas[nome] = peca.id
+    db.session.commit()
+    return db, pecas
+
+
+def _contar_consultas(db, funcao):
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        resultado = funcao()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    return resultado, len(consultas)
+
+
+def _nomes(itens, campo="peca"):
+    return [item[campo] for item in itens]
+
+
+def test_alertas_e_notificacoes_usam_a_mesma_regra(app_db):
+    db, _ = app_db
+    (erro, itens), consultas = _contar_consultas(db, alertas.listar_alertas_reposicao)
+    assert erro is None
+    assert consultas == 1
+    # No mínimo também é alerta; a maior falta vem primeiro
+    assert _nomes(itens) == ["Correia", "Filtro"]
+    assert itens[0] == {"id": itens[0]["id"], "peca": "Correia", "categoria": "Mecânica", "qtd": 1, "qtd_min": 3}
+
+    (erro, notificacoes), consultas = _contar_consultas(db, listar_notificacoes)
+    assert erro is None
+    assert consultas == 1
+    assert _nomes(notificacoes, "nome_peca") == ["Correia", "Filtro"]
+    assert notificacoes[0]["mensagem"] == "Peça 'Correia' abaixo do mínimo (1 un. restantes)"
+
+
+def test_alerta_acompanha_debito_e_credito_na_mesma_transacao(app_db):
+    db, pecas = app_db
+    assert estoque_service.movimentar_estoque({pecas["Parafuso"]: 8, pecas["Correia"]: -5}) is None
+    # Antes do commit: a mesma transação já enxerga o novo conjunto
+    assert _nomes(alertas.listar_alertas_reposicao()[1]) == ["Filtro", "Parafuso"]
+    db.session.rollback()
+    assert _nomes(alertas.listar_alertas_reposicao()[1]) == ["Correia", "Filtro"]
+
+
+def test_alerta_acompanha_edicao_do_minimo(app_db):
+    from app.models import Estoque
+
+    db, pecas = app_db
+    estoque = Estoque.query.filter_by(peca_id=pecas["Filtro"]).first()
+    assert estoque.em_alerta is True
+    estoque.qtd_min = 1
+    db.session.commit()
+    assert estoque.em_alerta is False
+    assert _nomes(alertas.listar_alertas_reposicao()[1]) == ["Correia"]
+
+
+def test_publicar_alertas_das_pecas_alteradas(app_db):
+    db, pecas = app_db
+    eventos.limpar()
+    estoque_service.movimentar_estoque({pecas["Parafuso"]: 9, pecas["Correia"]: -5})
+    db.session.commit()
+
+    publicar_alertas([pecas["Parafuso"], pecas["Correia"]])
+    evento = eventos._historico[-1][1]
+    assert evento["tipo"] == "alerta_estoque"
+    assert len(evento["dados"]["estoques"]) == 2
+    # Correia saiu do alerta; Parafuso entrou
+    assert evento["dados"]["alertas"] == [{
+        "id": evento["dados"]["alertas"][0]["id"], "nome_peca": "Parafuso",
+        "mensagem": "Peça 'Parafuso' abaixo do mínimo (1 un. restantes)"}]
+
+
+def test_publicar_alertas_muitas_pecas_pede_recarga(app_db):
+    eventos.limpar()
+    publicar_alertas(range(1, MAX_PECAS_POR_EVENTO + 2))
+    assert eventos._historico[-1][1]["dados"] == {"recarregar": True}
+
+
+def test_publicar_alertas_acima_do_limite_do_aviso_pede_recarga(app_db):
+    from app.models import Estoque, Peca
+
+    db, _ = app_db
+    # Poucas peças, mas com nomes longos o evento passa de 8000 bytes
+    ids = []
+    for i in range(40):
+        peca = Peca(nome=f"Rolamento autocompensador de rolos {i} " + "x" * 60, categoria="Mecânica")
+        db.session.add(peca)
+        db.session.flush()
+        db.session.add(Estoque(qtd=0, qtd_min=5, peca_id=peca.id))
+        ids.append(peca.id)
+    db.session.commit()
+
+    eventos.limpar()
+    publicar_alertas(ids[:10])
+    assert len(eventos._historico[-1][1]["dados"]["alertas"]) == 10
+    publicar_alertas(ids)
+    assert eventos._historico[-1][1]["dados"] == {"recarregar": True}
+
+
+def test_alertas_erro(monkeypatch):
+    def falhar():
+        raise Exception("DB error")
+
+    monkeypatch.setattr(alertas, "consulta_em_alerta", falhar)
+    erro, itens = alertas.listar_alertas_reposicao()
+    assert "DB error" in erro
+    assert itens is None
@@ -0,0 +1,202 @@
+import os
+import pytest
+from datetime import datetime
+from sqlalchemy import text
+from app.services import busca
+
+
+def _popular(db):
+    from app.models import Estoque, OrdemServico, Peca, Usuario
+
+    usuario = Usuario(nome="Técnico", email="tecnico@example.com", funcao="Técnico", setor="Manutenção")
+    usuario.set_senha("123")
+    db.session.add(usuario)
+    for nome, categoria in [("Rolamento 6204", "Mecânica"), ("Motor elétrico", "Elétrica"),
+                            ("Correia dentada", "Mecânica"), ("Parafuso sextavado", "Fixação")]:
+        peca = Peca(nome=nome, categoria=categoria)
+        db.session.add(peca)
+        db.session.flush()
+        db.session.add(Estoque(qtd=10, qtd_min=2, peca_id=peca.id))
+    for detalhes in ["Troca do rolamento do motor da esteira", "Motor queimado, trocar motor e revisar motor",
+                     "Lubrificação geral", None] + [f"Inspeção de rotina {i}" for i in range(10)]:
+        db.session.add(OrdemServico(tipo="Corretiva", setor="Produção", data=datetime(2026, 1, 5),
+                                    recorrencia="Única", detalhes=detalhes, status="Pendente",
+                                    solicitante_id=usuario.id))
+    db.session.commit()
+
+
+def _tipos(resultado):
+    return [(item["tipo"], item["peca"]["peca"] if item["tipo"] == "peca" else item["ordem"]["detalhes"])
+            for item in resultado["itens"]]
+
+
+# =================== validação ===================
+
+@pytest.mark.parametrize("termo", [None, "", " a ", "--"])
+def test_buscar_termo_curto(termo):
+    erro, resultado = busca.buscar(termo)
+    assert "Informe ao menos" in erro
+    assert resultado is None
+
+
+@pytest.mark.parametrize("pagina, limite", [("0", None), ("x", None), (None, "-1")])
+def test_buscar_paginacao_invalida(pagina, limite):
+    erro, resultado = busca.buscar("motor", pagina, limite)
+    assert erro == "Paginação inválida"
+    assert resultado is None
+
+
+# =================== SQLite (FTS5) ===================
+
+def test_buscar_pecas_e_ordens_por_relevancia(db):
+    _popular(db)
+    erro, resultado = busca.buscar("motor")
+    assert erro is None
+    tipos = _tipos(resultado)
+    assert ("peca", "Motor elétrico") in tipos
+    ordens = [detalhes for tipo, detalhes in tipos if tipo == "ordem"]
+    # A ordem que repete "motor" vem antes
+    assert ordens == ["Motor queimado, trocar motor e revisar motor", "Troca do rolamento do motor da esteira"]
+    relevancias = [item["relevancia"] for item in resultado["itens"]]
+    assert relevancias == sorted(relevancias, reverse=True)
+    assert all(0 < r < 1 for r in relevancias)
+    assert resultado["proxima_pagina"] is None
+
+
+def test_buscar_prefixo_sem_acento_e_todas_as_palavras(db):
+    _popular(db)
+    _, resultado = busca.buscar("rol")
+    assert {t for t, _ in _tipos(resultado)} == {"peca", "ordem"}
+    _, resultado = busca.buscar("eletrica")
+    assert _tipos(resultado) == [("peca", "Motor elétrico")]
+    _, resultado = busca.buscar("motor esteira")
+    assert _tipos(resultado) == [("ordem", "Troca do rolamento do motor da esteira")]
+
+
+def test_buscar_pagina(db):
+    _popular(db)
+    _, primeira = busca.buscar("motor", 1, 2)
+    _, segunda = busca.buscar("motor", 2, 2)
+    assert len(primeira["itens"]) == 2 and primeira["proxima_pagina"] == 2
+    assert len(segunda["itens"]) == 1 and segunda["proxima_pagina"] is None
+    assert _tipos(primeira) + _tipos(segunda) == _tipos(busca.buscar("motor")[1])
+
+
+def test_buscar_acompanha_edicao_e_exclusao(db):
+    from app.models import OrdemServico, Peca
+
+    _popular(db)
+    peca = Peca.query.filter_by(nome="Correia dentada").first()
+    peca.nome = "Polia dentada"
+    ordem = OrdemServico.query.filter_by(detalhes="Lubrificação geral").first()
+    db.session.delete(ordem)
+    db.session.commit()
+
+    assert busca.buscar("correia")[1]["itens"] == []
+    assert _tipos(busca.buscar("polia")[1]) == [("peca", "Polia dentada")]
+    assert busca.buscar("lubrificacao")[1]["itens"] == []
+
+
+def test_buscar_sinaliza_ordens_cortadas(db, monkeypatch):
+    _popular(db)
+    monkeypatch.setattr(busca, "CANDIDATOS", 4)
+    _, resultado = busca.buscar("rotina")
+    assert len(resultado["itens"]) == 4
+    assert resultado["truncado"] is True
+    assert busca.buscar("motor")[1]["truncado"] is False
+
+
+def test_buscar_caracteres_especiais_do_fts(db):
+    _popular(db)
+    erro, resultado = busca.buscar('"motor* NEAR(')
+    assert erro is None
+    assert resultado["itens"] == []
+    erro, resultado = busca.buscar('"motor*')
+    assert erro is None
+    assert len(resultado["itens"]) == 3
+
+
+# =================== Postgres (pg_trgm e full-text) ===================
+
+postgres = pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                              reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+
+
+@pytest.fixture(scope="module")
+def banco_postgres():
+    from flask_migrate import downgrade, upgrade
+    from app import create_app, db, iniciar_migracoes
+    from app.utils import invalidacao
+
+    with pytest.MonkeyPatch.context() as ambiente:
+        ambiente.setenv("DATABASE_URL", os.environ["TEST_POSTGRES_URL"])
+        ambiente.setenv("SECRET_KEY", "chave-de-teste")
+        flask_app = create_app()
+    invalidacao.parar()
+    iniciar_migracoes(flask_app)
+
+    with flask_app.app_context():
+        db.drop_all()
+        db.session.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        db.session.commit()
+        upgrade()
+        _popular(db)
+        # Volume para o planejador preferir os índices
+        db.session.execute(text(
+            "INSERT INTO peca (nome, categoria) "
+            "SELECT 'Peça ' || i, 'Categoria ' || (i % 20) FROM generate_series(1, 5000) i"))
+        db.session.execute(text(
+            "INSERT INTO ordem_servico (tipo, setor, data, recorrencia, detalhes, status, solicitante_id) "
+            "SELECT 'Corretiva', 'Setor', now(), 'Única', 'Inspeção de rotina ' || i, 'Concluída', 1 "
+            "FROM generate_series(1, 20000) i"))
+        db.session.commit()
+        db.session.execute(text("ANALYZE"))
+        yield db
+        db.session.remove()
+        downgrade(revision="base")
+        db.session.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        db.session.commit()
+
+
+@postgres
+def test_buscar_postgres_tolera_erro_de_digitacao(banco_postgres):
+    erro, resultado = busca.buscar("rolameto")
+    assert erro is None
+    assert ("peca", "Rolamento 6204") in _tipos(resultado)
+
+
+@postgres
+def test_buscar_postgres_ordens_por_radical_sem_acento(banco_postgres):
+    _, resultado = busca.buscar("trocas motores")
+    ordens = [detalhes for tipo, detalhes in _tipos(resultado) if tipo == "ordem"]
+    assert ordens == ["Motor queimado, trocar motor e revisar motor", "Troca do rolamento do motor da esteira"]
+    _, resultado = busca.buscar("lubrificacao")
+    assert _tipos(resultado) == [("ordem", "Lubrificação geral")]
+    assert resultado["truncado"] is False
+
+
+@postgres
+def test_buscar_postgres_termo_comum_sinaliza_truncado(banco_postgres, monkeypatch):
+    # "rotina" está em mais de 20 mil ordens: só CANDIDATOS + 1 são lidas
+    monkeypatch.setattr(busca, "CANDIDATOS", 150)
+    _, resultado = busca.buscar("rotina", 2, busca.LIMITE_MAXIMO)
+    assert resultado["truncado"] is True
+    assert len(resultado["itens"]) == 50
+    assert resultado["proxima_pagina"] is None
+    assert all("rotina" in item["ordem"]["detalhes"] for item in resultado["itens"])
+
+
+@postgres
+@pytest.mark.parametrize("termo, indice", [
+    ("rolamento", "ix_peca_nome_trgm"),
+    ("motor", "ix_ordem_servico_detalhes_fts"),
+])
+def test_buscar_postgres_usa_indices(banco_postgres, termo, indice):
+    pecas, ordens = busca._postgres()
+    query = pecas(termo) if indice.startswith("ix_peca") else ordens(termo)
+    sql = str(query.compile(dialect=banco_postgres.engine.dialect, compile_kwargs={"literal_binds": True}))
+    # O compilador já escapou o % do operador <% para o psycopg2; text() escaparia de novo
+    busca._preferir_indices(True)
+    plano = "\n".join(banco_postgres.session.execute(text(f"EXPLAIN {sql.replace('%%', '%')}")).scalars().all())
+    banco_postgres.session.rollback()
+    assert indice in plano, plano
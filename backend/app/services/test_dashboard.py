@@ -0,0 +1,63 @@
+import pytest
+from datetime import datetime, timedelta
+from app.services import dashboard
+from app.utils import cache
+
+
+@pytest.fixture
+def app_db(db):
+    """Duas peças e três ordens."""
+    from app.models import Peca, Estoque, Usuario, OrdemServico
+
+    cache.limpar()
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    parafuso = Peca(nome="Parafuso", categoria="Fixação")
+    motor = Peca(nome="Motor", categoria="Elétrica")
+    db.session.add_all([usuario, parafuso, motor])
+    db.session.flush()
+    db.session.add_all([
+        Estoque(qtd=2, qtd_min=5, peca_id=parafuso.id),
+        Estoque(qtd=10, qtd_min=1, peca_id=motor.id),
+    ])
+    ontem = datetime.now() - timedelta(days=1)
+    amanha = datetime.now() + timedelta(days=1)
+    for tipo, status, data in [
+        ("Corretiva", "Concluída", ontem),
+        ("Corretiva", "Pendente", ontem),
+        ("Preventiva", "Pendente", amanha),
+    ]:
+        db.session.add(OrdemServico(
+            tipo=tipo, setor="Elétrica", data=data, recorrencia="Única",
+            status=status, solicitante_id=usuario.id
+        ))
+    db.session.commit()
+    yield db
+    cache.limpar()
+
+
+def test_resumo_dashboard(app_db):
+    erro, resumo = dashboard.resumo_dashboard()
+
+    assert erro is None
+    assert resumo["ordens"]["total"] == 3
+    assert resumo["ordens"]["concluidas"] == 1
+    assert resumo["ordens"]["atrasadas"] == 1
+    assert resumo["ordens"]["em_andamento"] == 1
+    assert resumo["ordens"]["por_tipo"] == {"Corretiva": 2, "Preventiva": 1}
+    assert resumo["estoque"] == {"total": 2, "baixo_estoque": 1}
+    assert [p["peca"] for p in resumo["pecas_criticas"]] == ["Parafuso"]
+    assert len(resumo["ordens_recentes"]) == 3
+
+
+def test_resumo_dashboard_invalidado_na_escrita(app_db):
+    from app.services.peca import nova_peca
+
+    _, antes = dashboard.resumo_dashboard()
+    _, em_cache = dashboard.resumo_dashboard()
+    assert em_cache is antes
+
+    nova_peca({"nome": "Correia", "categoria": "Mecânica", "qtd": 0, "qtd_min": 3})
+
+    _, depois = dashboard.resumo_dashboard()
+    assert depois["estoque"] == {"total": 3, "baixo_estoque": 2}
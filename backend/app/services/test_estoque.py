@@ -0,0 +1,148 @@
+import os
+import threading
+import pytest
+from datetime import datetime
+from sqlalchemy import event
+from app.services import estoque as estoque_service
+
+
+@pytest.fixture
+def app_db(db):
+    """Duas peças em estoque."""
+    from app.models import Peca, Estoque
+
+    parafuso = Peca(nome="Parafuso", categoria="Fixação")
+    motor = Peca(nome="Motor", categoria="Elétrica")
+    db.session.add_all([parafuso, motor])
+    db.session.flush()
+    db.session.add_all([
+        Estoque(qtd=10, qtd_min=1, peca_id=parafuso.id),
+        Estoque(qtd=1, qtd_min=1, peca_id=motor.id),
+    ])
+    db.session.commit()
+    return db, parafuso.id, motor.id
+
+
+def _qtd(db, peca_id):
+    from app.models import Estoque
+    return db.session.scalar(db.select(Estoque.qtd).where(Estoque.peca_id == peca_id))
+
+
+def test_agrupar_pecas_soma_repetidas():
+    erro, quantidades = estoque_service.agrupar_pecas([
+        {"peca_id": 1, "quantidade": 2},
+        {"peca_id": "1", "quantidade": "3"},
+        {"peca_id": 2, "quantidade": 1},
+    ])
+    assert erro is None
+    assert quantidades == {1: 5, 2: 1}
+
+
+def test_agrupar_pecas_incompletas():
+    erro, quantidades = estoque_service.agrupar_pecas([{"quantidade": 2}])
+    assert erro == "Dados de peças incompletos"
+    assert quantidades is None
+
+
+@pytest.mark.parametrize("pecas", [[1], ["x"], [None], "x", {"peca_id": 1}])
+def test_agrupar_pecas_formato_invalido(pecas):
+    assert estoque_service.agrupar_pecas(pecas) == ("Dados de peças incompletos", None)
+
+
+def test_movimentar_estoque_um_update_para_todas_as_pecas(app_db):
+    db, parafuso, motor = app_db
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            consultas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        erro = estoque_service.movimentar_estoque({parafuso: 4, motor: 1})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+
+    assert erro is None
+    assert len(consultas) == 1
+    assert _qtd(db, parafuso) == 6
+    assert _qtd(db, motor) == 0
+
+
+def test_movimentar_estoque_credito(app_db):
+    db, parafuso, _ = app_db
+    assert estoque_service.movimentar_estoque({parafuso: -5}) is None
+    assert _qtd(db, parafuso) == 15
+
+
+def test_movimentar_estoque_insuficiente_por_peca(app_db):
+    db, parafuso, motor = app_db
+    erro = estoque_service.movimentar_estoque({parafuso: 1, motor: 2, 999: 1})
+    db.session.rollback()
+
+    assert "Estoque insuficiente para a peça Motor!" in erro
+    assert "Estoque da peça ID 999 não encontrado!" in erro
+    assert "Parafuso" not in erro
+    assert _qtd(db, parafuso) == 10
+    assert _qtd(db, motor) == 1
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                    reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+def test_ordens_concorrentes_nao_deixam_estoque_negativo(monkeypatch):
+    """Dispara ordens em paralelo contra o Postgres e confere o saldo final."""
+    from app import create_app, db
+    from app.models import Peca, Estoque, Usuario
+    from app.services.ordem_servico import nova_ordem
+    from app.utils import invalidacao
+
+    monkeypatch.setenv("DATABASE_URL", os.environ["TEST_POSTGRES_URL"])
+
+    monkeypatch.setenv("SECRET_KEY", "chave-de-teste")
+    flask_app = create_app()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+        usuario.set_senha("123")
+        pecas = [Peca(nome=f"Peça {i}", categoria="Teste") for i in range(3)]
+        db.session.add_all([usuario, *pecas])
+        db.session.flush()
+        db.session.add_all([Estoque(qtd=20, qtd_min=0, peca_id=p.id) for p in pecas])
+        db.session.commit()
+        usuario_id = usuario.id
+        peca_ids = [p.id for p in pecas]
+
+    resultados = []
+    inicio = threading.Barrier(30)
+
+    def criar(i):
+        # Ordens com várias peças em ordens diferentes para exercitar o travamento
+        ids = peca_ids if i % 2 else list(reversed(peca_ids))
+        with flask_app.app_context():
+            inicio.wait()
+            erro, _ = nova_ordem({
+                "solicitante_id": usuario_id, "tipo": "Corretiva", "setor": "Elétrica",
+                "data": datetime.now(), "recorrencia": "Única", "detalhes": "", "status": "Pendente",
+                "equipamento_id": None,
+                "pecas_utilizadas": [{"peca_id": p, "quantidade": 1 + i % 3} for p in ids]
+            })
+            resultados.append((erro, 1 + i % 3))
+            db.session.remove()
+
+    threads = [threading.Thread(target=criar, args=(i,)) for i in range(30)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with flask_app.app_context():
+        debitado = sum(qtd for erro, qtd in resultados if erro is None)
+        for peca_id in peca_ids:
+            qtd = _qtd(db, peca_id)
+            assert qtd >= 0
+            assert qtd == 20 - debitado
+        assert all(erro is None or "insuficiente" in erro for erro, _ in resultados)
+        db.session.remove()
+        db.drop_all()
+    invalidacao.parar()
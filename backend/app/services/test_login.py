@@ -0,0 +1,50 @@
+import pytest
+from app.services.login import autenticar_usuario
+
+
+@pytest.fixture
+def app_db(app_teste, db):
+    """Um usuário com hash de custo baixo."""
+    from app.models import Usuario
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    db.session.add(usuario)
+    db.session.commit()
+    return app_teste, db
+
+
+def _hash(db):
+    from app.models import Usuario
+    return db.session.scalar(db.select(Usuario.senha_hash))
+
+
+def test_login_mantem_hash_com_custo_atual(app_db):
+    _, db = app_db
+    antes = _hash(db)
+    erro, _ = autenticar_usuario({"usuario": "ana@example.com", "senha": "123"})
+    assert erro is None
+    assert _hash(db) == antes
+
+
+def test_login_refaz_hash_quando_custo_muda(app_db):
+    flask_app, db = app_db
+    flask_app.config["SENHA_METODO"] = "pbkdf2:sha256:2000"
+
+    erro, _ = autenticar_usuario({"usuario": "ana@example.com", "senha": "123"})
+    assert erro is None
+    assert _hash(db).startswith("pbkdf2:sha256:2000$")
+
+    # O hash novo continua válido
+    erro, _ = autenticar_usuario({"usuario": "ana@example.com", "senha": "123"})
+    assert erro is None
+
+
+def test_login_senha_errada_nao_refaz_hash(app_db):
+    flask_app, db = app_db
+    antes = _hash(db)
+    flask_app.config["SENHA_METODO"] = "pbkdf2:sha256:2000"
+
+    erro, _ = autenticar_usuario({"usuario": "ana@example.com", "senha": "errada"})
+    assert erro == "Usuário ou senha inválidos"
+    assert _hash(db) == antes
@@ -0,0 +1,214 @@
+import os
+import threading
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.services import movimentacoes
+
+
+@pytest.fixture
+def app_db(db):
+    """Um usuário e duas peças sem movimentação."""
+    from app.models import Peca, Estoque, Usuario
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    parafuso = Peca(nome="Parafuso", categoria="Fixação")
+    motor = Peca(nome="Motor", categoria="Elétrica")
+    db.session.add_all([usuario, parafuso, motor])
+    db.session.flush()
+    db.session.add_all([
+        Estoque(qtd=10, qtd_min=1, peca_id=parafuso.id),
+        Estoque(qtd=5, qtd_min=1, peca_id=motor.id),
+    ])
+    db.session.commit()
+    return db, usuario.id, parafuso.id, motor.id
+
+
+def _movimentacoes(db):
+    from app.models import MovimentacaoEstoque
+    return [
+        (m.peca_id, m.tipo, m.quantidade, m.os_id)
+        for m in MovimentacaoEstoque.query.order_by(MovimentacaoEstoque.id)
+    ]
+
+
+def _historico(db, parafuso, motor):
+    # Dez dias de movimentações com fotografias nos dias 3 e 7; o saldo atual
+    # em Estoque bate com a soma de tudo
+    from app.models import Estoque, MovimentacaoEstoque, SaldoEstoque
+
+    inicio = datetime(2025, 1, 1, 12)
+    deltas = {parafuso: [10, -2, -1, 4, -3, 0, -1, 2, -5, 1], motor: [5, 0, -1, -1, 3, -2, 0, 0, -1, 2]}
+    saldo = {parafuso: 0, motor: 0}
+    esperado = {}
+    for dia in range(10):
+        data = inicio + timedelta(days=dia)
+        for peca_id, lista in deltas.items():
+            if lista[dia]:
+                db.session.add(MovimentacaoEstoque(
+                    peca_id=peca_id, tipo="ajuste", quantidade=lista[dia], data=data))
+            saldo[peca_id] += lista[dia]
+        esperado[data.date()] = dict(saldo)
+        if dia in (2, 6):
+            db.session.add_all([
+                SaldoEstoque(peca_id=p, data=data + timedelta(hours=6), qtd=q) for p, q in saldo.items()
+            ])
+    for peca_id, qtd in saldo.items():
+        Estoque.query.filter_by(peca_id=peca_id).update({"qtd": qtd})
+    db.session.commit()
+    return esperado
+
+
+def test_ordem_registra_saidas_e_estornos(app_db):
+    from app.services.ordem_servico import nova_ordem, atualizar_ordem, excluir_ordem
+
+    db, usuario, parafuso, motor = app_db
+    erro, ordem = nova_ordem({
+        "solicitante_id": usuario, "tipo": "Corretiva", "setor": "Elétrica",
+        "data": datetime(2025, 1, 1), "recorrencia": "Única", "detalhes": "", "status": "Pendente",
+        "equipamento_id": None,
+        "pecas_utilizadas": [{"peca_id": parafuso, "quantidade": 3}, {"peca_id": motor, "quantidade": 1}]
+    })
+    assert erro is None
+    os_id = ordem.id
+
+    erro, _ = atualizar_ordem(os_id, {"pecas_utilizadas": [{"peca_id": parafuso, "quantidade": 1}]})
+    assert erro is None
+    erro, _ = excluir_ordem(os_id)
+    assert erro is None
+
+    assert sorted(_movimentacoes(db)) == sorted([
+        (parafuso, "saida", -3, os_id), (motor, "saida", -1, os_id),
+        (parafuso, "entrada", 2, os_id), (motor, "entrada", 1, os_id),
+        (parafuso, "entrada", 1, os_id),
+    ])
+
+
+def test_atualizar_peca_registra_ajuste(app_db):
+    from app.models import Estoque
+    from app.services.peca import atualizar_peca
+
+    db, _, parafuso, _ = app_db
+    estoque_id = Estoque.query.filter_by(peca_id=parafuso).first().id
+    assert atualizar_peca(estoque_id, {"qtd": 7}) is None
+    assert _movimentacoes(db) == [(parafuso, "ajuste", -3, None)]
+
+
+def test_saldos_em_confere_com_historico(app_db):
+    db, _, parafuso, motor = app_db
+    esperado = _historico(db, parafuso, motor)
+
+    for dia, saldos in esperado.items():
+        erro, calculado = movimentacoes.saldos_no_dia(dia.isoformat())
+        assert erro is None
+        assert {s["peca_id"]: s["saldo"] for s in calculado} == saldos
+
+    # Antes de qualquer movimentação
+    erro, calculado = movimentacoes.saldos_no_dia("2024-12-31")
+    assert {s["peca_id"]: s["saldo"] for s in calculado} == {parafuso: 0, motor: 0}
+
+
+def test_saldos_em_consultas_nao_crescem_com_historico(app_db):
+    db, _, parafuso, motor = app_db
+    _historico(db, parafuso, motor)
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        erro, _ = movimentacoes.saldos_em(datetime(2025, 1, 5))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+
+    assert erro is None
+    assert len(consultas) == 2
+
+
+def test_gerar_snapshot(app_db):
+    from app.models import SaldoEstoque
+
+    db, _, parafuso, motor = app_db
+    erro, quantidade = movimentacoes.gerar_snapshot()
+    assert erro is None
+    assert quantidade == 2
+    assert {s.peca_id: s.qtd for s in SaldoEstoque.query} == {parafuso: 10, motor: 5}
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                    reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+def test_snapshot_espera_baixa_em_andamento(monkeypatch):
+    """A fotografia espera a baixa já datada e não commitada e a inclui."""
+    from app import create_app, db
+    from app.models import Peca, Estoque, MovimentacaoEstoque, SaldoEstoque
+    from app.services.estoque import movimentar_estoque
+    from app.utils import invalidacao
+
+    monkeypatch.setenv("DATABASE_URL", os.environ["TEST_POSTGRES_URL"])
+    monkeypatch.setenv("SECRET_KEY", "chave-de-teste")
+    flask_app = create_app()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        peca = Peca(nome="Parafuso", categoria="Fixação")
+        db.session.add(peca)
+        db.session.flush()
+        db.session.add(Estoque(qtd=10, qtd_min=1, peca_id=peca.id))
+        db.session.commit()
+        peca_id = peca.id
+
+        resultados = []
+
+        def fotografar():
+            with flask_app.app_context():
+                resultados.append(movimentacoes.gerar_snapshot())
+                db.session.remove()
+
+        try:
+            assert movimentar_estoque({peca_id: 3}) is None
+            fotografia = threading.Thread(target=fotografar)
+            fotografia.start()
+            fotografia.join(0.5)
+            assert fotografia.is_alive()
+            db.session.commit()
+            fotografia.join(10)
+
+            assert resultados == [(None, 1)]
+            saldo = SaldoEstoque.query.one()
+            assert saldo.qtd == 7
+            assert MovimentacaoEstoque.query.one().data < saldo.data
+            assert movimentacoes.saldos_em(saldo.data) == (None, {peca_id: 7})
+            assert movimentacoes.saldos_em(datetime.now()) == (None, {peca_id: 7})
+        finally:
+            db.session.remove()
+            db.drop_all()
+    invalidacao.parar()
+
+
+def test_comando_snapshot(app_db):
+    from flask import current_app
+    from app.models import SaldoEstoque
+
+    resultado = current_app.test_cli_runner().invoke(args=["estoque", "snapshot"])
+    assert resultado.exit_code == 0
+    assert "2 saldos registrados" in resultado.output
+    assert SaldoEstoque.query.count() == 2
+
+
+def test_consumo_por_periodo(app_db):
+    db, _, parafuso, motor = app_db
+    _historico(db, parafuso, motor)
+
+    erro, itens = movimentacoes.consumo("2025-01-02", "2025-01-05")
+    assert erro is None
+    assert itens == [
+        {"peca_id": parafuso, "peca": "Parafuso", "entradas": 4, "saidas": 6},
+        {"peca_id": motor, "peca": "Motor", "entradas": 3, "saidas": 2},
+    ]
+
+
+def test_datas_invalidas():
+    assert movimentacoes.saldos_no_dia("31/01/2025") == ("Data inválida", None)
+    assert movimentacoes.consumo("2025-01-01", None) == ("Data inválida", None)
@@ -6,43 +6,94 @@ from app.services import ordem_servico
 
 # =================== listar_ordens ===================
 
-@patch("app.services.ordem_servico.joinedload")
-@patch("app.services.ordem_servico.OrdemServico")
-def test_listar_ordens_sucesso(mock_model, mock_joinedload):
-    mock_joinedload.return_value = None
-    mock_ordem = MagicMock()
-    mock_ordem.status = "pendente"
-    mock_ordem.data = datetime.now()
-    mock_model.query.options.return_value.all.return_value = [mock_ordem]
+@patch("app.services.ordem_servico.serializar_ordens")
+@patch("app.services.ordem_servico.consulta_ordens")
+def test_listar_ordens_sucesso(mock_consulta, mock_serializar):
+    mock_serializar.return_value = [{"id": 1, "status": "Em Andamento"}]
 
     erro, ordens = ordem_servico.listar_ordens()
 
     assert erro is None
     assert len(ordens) == 1
-    assert ordens[0].status in ["Em Andamento", "Atrasada"]
+    mock_consulta.return_value.order_by.assert_called_once()
 
 
-@patch("app.services.ordem_servico.joinedload")
-@patch("app.services.ordem_servico.OrdemServico")
-def test_listar_ordens_erro(mock_model, mock_joinedload):
-    mock_joinedload.return_value = None
-    mock_model.query.options.side_effect = Exception("DB error")
+@patch("app.services.ordem_servico.serializar_ordens")
+@patch("app.services.ordem_servico.consulta_ordens")
+def test_listar_ordens_erro(mock_consulta, mock_serializar):
+    mock_serializar.side_effect = Exception("DB error")
     erro, ordens = ordem_servico.listar_ordens()
     assert "DB error" in erro
     assert ordens is None
 
 
+# =================== listar_ordens_paginadas ===================
+
+@pytest.fixture
+def ordens_db(db):
+    """5 ordens em dias diferentes."""
+    from app.models import Usuario, OrdemServico
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    db.session.add(usuario)
+    db.session.flush()
+    for i in range(5):
+        db.session.add(OrdemServico(
+            tipo="Corretiva" if i % 2 else "Preventiva",
+            setor="Elétrica",
+            data=datetime(2025, 1, 1 + i),
+            recorrencia="Única",
+            detalhes=f"Ordem {i}",
+            status="Concluída",
+            solicitante_id=usuario.id
+        ))
+    db.session.commit()
+    return db
+
+
+def test_listar_ordens_paginadas_percorre_todas(ordens_db):
+    vistos = []
+    cursor = None
+    while True:
+        erro, pagina = ordem_servico.listar_ordens_paginadas({}, cursor, 2)
+        assert erro is None
+        vistos += [o["detalhes"] for o in pagina["ordens"]]
+        cursor = pagina["proximo_cursor"]
+        if not cursor:
+            break
+
+    assert vistos == ["Ordem 4", "Ordem 3", "Ordem 2", "Ordem 1", "Ordem 0"]
+
+
+def test_listar_ordens_paginadas_com_filtros(ordens_db):
+    filtros = {"tipo": "Corretiva", "data_inicio": "2025-01-02", "data_fim": "2025-01-02"}
+    erro, pagina = ordem_servico.listar_ordens_paginadas(filtros, None, 10)
+    assert erro is None
+    assert [o["detalhes"] for o in pagina["ordens"]] == ["Ordem 1"]
+    assert pagina["proximo_cursor"] is None
+
+
+def test_listar_ordens_filtro_invalido(ordens_db):
+    erro, ordens = ordem_servico.listar_ordens({"data_inicio": "31/12/2025"})
+    assert erro == "Filtro inválido"
+    assert ordens is None
+
+
+def test_listar_ordens_paginadas_cursor_invalido(ordens_db):
+    erro, pagina = ordem_servico.listar_ordens_paginadas({}, "nao-e-cursor", 10)
+    assert erro == "Filtro inválido"
+    assert pagina is None
+
+
 # =================== nova_ordem ===================
 
 @patch("app.services.ordem_servico.db")
-@patch("app.services.ordem_servico.Estoque")
+@patch("app.services.ordem_servico.movimentar_estoque")
 @patch("app.services.ordem_servico.OrdemServico")
 @patch("app.services.ordem_servico.Pecas_Ordem_Servico")
-def test_nova_ordem_sucesso(mock_pos, mock_ordem, mock_estoque, mock_db):
-    estoque_obj = MagicMock()
-    estoque_obj.qtd = 10
-    estoque_obj.peca.nome = "Parafuso"
-    mock_estoque.query.filter_by.return_value.first.return_value = estoque_obj
+def test_nova_ordem_sucesso(mock_pos, mock_ordem, mock_movimentar, mock_db):
+    mock_movimentar.return_value = None
 
     mock_ordem_instance = MagicMock()
     mock_ordem_instance.id = 1
@@ -63,11 +114,68 @@ def test_nova_ordem_sucesso(mock_pos, mock_ordem, mock_estoque, mock_db):
     erro, ordem = ordem_servico.nova_ordem(data)
 
     assert erro is None
+    mock_movimentar.assert_called_once_with({1: 2}, os_id=1)
     mock_db.session.add.assert_called()
     mock_db.session.commit.assert_called()
     assert ordem == mock_ordem_instance
 
 
+@patch("app.services.ordem_servico.db")
+@patch("app.services.ordem_servico.movimentar_estoque")
+@patch("app.services.ordem_servico.OrdemServico")
+def test_nova_ordem_estoque_insuficiente(mock_ordem, mock_movimentar, mock_db):
+    mock_movimentar.return_value = "Estoque insuficiente para a peça Parafuso!"
+    data = {
+        "solicitante_id": 1, "tipo": "Corretiva", "setor": "Elétrica", "data": datetime.now(),
+        "recorrencia": "Única", "detalhes": "", "status": "Pendente", "equipamento_id": 1,
+        "pecas_utilizadas": [{"peca_id": 1, "quantidade": 1}, {"peca_id": 1, "quantidade": 2}]
+    }
+
+    erro, ordem = ordem_servico.nova_ordem(data)
+
+    assert erro == "Estoque insuficiente para a peça Parafuso!"
+    assert ordem is None
+    mock_movimentar.assert_called_once_with({1: 3}, os_id=mock_ordem.return_value.id)
+    mock_db.session.rollback.assert_called_once()
+    mock_db.session.commit.assert_not_called()
+
+
+def test_nova_ordem_quantidade_invalida():
+    data = {
+        "solicitante_id": 1, "tipo": "Corretiva", "setor": "Elétrica", "data": datetime.now(),
+        "recorrencia": "Única", "detalhes": "", "status": "Pendente", "equipamento_id": 1,
+        "pecas_utilizadas": [{"peca_id": 1, "quantidade": 0}]
+    }
+    erro, ordem = ordem_servico.nova_ordem(data)
+    assert erro == "Quantidade invalida para a peça selecionada!"
+    assert ordem is None
+
+
+def test_nova_ordem_recorrencia_nao_reconhecida():
+    data = {
+        "solicitante_id": 1, "tipo": "Corretiva", "setor": "Elétrica", "data": datetime.now(),
+        "recorrencia": "Quando der", "detalhes": "", "status": "Pendente", "equipamento_id": 1,
+    }
+    erro, ordem = ordem_servico.nova_ordem(data)
+    assert erro == "Recorrência 'Quando der' não reconhecida"
+    assert ordem is None
+
+
+@patch("app.services.ordem_servico.db")
+@patch("app.services.ordem_servico.movimentar_estoque")
+@patch("app.services.ordem_servico.OrdemServico")
+@patch("app.services.ordem_servico.Pecas_Ordem_Servico")
+def test_nova_ordem_grava_unica_normalizada(mock_pos, mock_ordem, mock_movimentar, mock_db):
+    mock_movimentar.return_value = None
+    mock_ordem.return_value.id = 1
+    data = {
+        "solicitante_id": 1, "tipo": "Corretiva", "setor": "Elétrica", "data": datetime.now(),
+        "recorrencia": "nenhuma", "detalhes": "", "status": "Pendente", "equipamento_id": 1,
+    }
+    assert ordem_servico.nova_ordem(data)[0] is None
+    assert mock_ordem.call_args.kwargs["recorrencia"] == "Única"
+
+
 def test_nova_ordem_campo_ausente():
     data = {"tipo": "Preventiva"}
     erro, ordem = ordem_servico.nova_ordem(data)
@@ -83,25 +191,147 @@ def test_atualizar_ordem_nao_encontrada(mock_ordem):
     assert ordem is None
 
 
+# =================== atualizar_ordem ===================
+
+@pytest.fixture
+def ordem_com_pecas(db):
+    """Ordem com 50 linhas de peças, cada uma com 2 unidades debitadas."""
+    from app.models import Peca, Estoque, Usuario, OrdemServico, Pecas_Ordem_Servico
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    pecas = [Peca(nome=f"Peça {i}", categoria="Teste") for i in range(51)]
+    db.session.add_all([usuario, *pecas])
+    db.session.flush()
+    db.session.add_all([Estoque(qtd=10, qtd_min=0, peca_id=p.id) for p in pecas])
+    ordem = OrdemServico(tipo="Corretiva", setor="Elétrica", data=datetime(2025, 1, 1),
+                         recorrencia="Única", detalhes="Inicial", status="Pendente",
+                         solicitante_id=usuario.id)
+    db.session.add(ordem)
+    db.session.flush()
+    db.session.add_all([
+        Pecas_Ordem_Servico(os_id=ordem.id, peca_id=p.id, quantidade=2) for p in pecas[:50]
+    ])
+    db.session.commit()
+    return db, ordem.id, [p.id for p in pecas]
+
+
+def _comandos(db, funcao):
+    from sqlalchemy import event
+    comandos = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement.lstrip().split()[0].upper())
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        resultado = funcao()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    return resultado, comandos
+
+
+def _saldos(db, peca_ids):
+    from app.models import Estoque
+    return dict(db.session.query(Estoque.peca_id, Estoque.qtd).filter(Estoque.peca_id.in_(peca_ids)))
+
+
+def _linhas(db, os_id):
+    from app.models import Pecas_Ordem_Servico
+    return dict(db.session.query(Pecas_Ordem_Servico.peca_id, Pecas_Ordem_Servico.quantidade)
+                .filter(Pecas_Ordem_Servico.os_id == os_id))
+
+
+def test_atualizar_ordem_so_detalhes_nao_toca_pecas(ordem_com_pecas):
+    db, os_id, peca_ids = ordem_com_pecas
+    pecas = [{"peca_id": p, "quantidade": 2} for p in peca_ids[:50]]
+
+    (erro, _), comandos = _comandos(
+        db, lambda: ordem_servico.atualizar_ordem(os_id, {"detalhes": "Novo", "pecas_utilizadas": pecas}))
+
+    assert erro is None
+    assert comandos.count("UPDATE") == 1  # só a própria ordem
+    assert "DELETE" not in comandos and "INSERT" not in comandos
+    assert set(_saldos(db, peca_ids[:50]).values()) == {10}
+
+
+def test_atualizar_ordem_aplica_apenas_diferencas(ordem_com_pecas):
+    db, os_id, peca_ids = ordem_com_pecas
+    # peça 0 sai, peça 1 passa de 2 para 5, peça 50 entra; as outras 47 não mudam
+    pecas = [{"peca_id": p, "quantidade": 2} for p in peca_ids[2:50]]
+    pecas += [{"peca_id": peca_ids[1], "quantidade": 5}, {"peca_id": peca_ids[50], "quantidade": 4}]
+
+    # O aviso de alertas para /eventos consulta depois do commit; aqui conta
+    # só a gravação
+    with patch("app.services.ordem_servico.publicar_alertas") as mock_publicar:
+        (erro, _), comandos = _comandos(
+            db, lambda: ordem_servico.atualizar_ordem(os_id, {"pecas_utilizadas": pecas}))
+
+    assert erro is None
+    assert len(comandos) <= 8
+    assert set(mock_publicar.call_args.args[0]) == {peca_ids[0], peca_ids[1], peca_ids[50]}
+    saldos = _saldos(db, peca_ids)
+    assert saldos[peca_ids[0]] == 12
+    assert saldos[peca_ids[1]] == 7
+    assert saldos[peca_ids[50]] == 6
+    assert saldos[peca_ids[2]] == 10
+    linhas = _linhas(db, os_id)
+    assert peca_ids[0] not in linhas
+    assert linhas[peca_ids[1]] == 5
+    assert linhas[peca_ids[50]] == 4
+    assert len(linhas) == 50
+
+
+def test_atualizar_ordem_estoque_insuficiente_desfaz_tudo(ordem_com_pecas):
+    db, os_id, peca_ids = ordem_com_pecas
+    pecas = [{"peca_id": peca_ids[0], "quantidade": 20}]
+
+    erro, ordem = ordem_servico.atualizar_ordem(os_id, {"detalhes": "Novo", "pecas_utilizadas": pecas})
+
+    assert erro == "Estoque insuficiente para a peça Peça 0!"
+    assert ordem is None
+    assert len(_linhas(db, os_id)) == 50
+    assert set(_saldos(db, peca_ids[:50]).values()) == {10}
+
+
+def test_atualizar_ordem_recorrencia_nao_reconhecida(ordem_com_pecas):
+    from app.models import OrdemServico
+
+    db, os_id, _ = ordem_com_pecas
+    erro, ordem = ordem_servico.atualizar_ordem(os_id, {"recorrencia": "Às vezes", "detalhes": "Novo"})
+    assert erro == "Recorrência 'Às vezes' não reconhecida"
+    assert ordem is None
+    assert db.session.get(OrdemServico, os_id).detalhes == "Inicial"
+
+
+def test_atualizar_ordem_mantem_recorrencia_antiga(ordem_com_pecas):
+    from app.models import OrdemServico
+
+    db, os_id, _ = ordem_com_pecas
+    db.session.get(OrdemServico, os_id).recorrencia = "toda segunda"
+    db.session.commit()
+
+    erro, _ = ordem_servico.atualizar_ordem(os_id, {"recorrencia": "toda segunda", "status": "Concluída"})
+    assert erro is None
+    ordem = db.session.get(OrdemServico, os_id)
+    assert (ordem.recorrencia, ordem.status) == ("toda segunda", "Concluída")
+
+
 @patch("app.services.ordem_servico.db")
-@patch("app.services.ordem_servico.Estoque")
-@patch("app.services.ordem_servico.Pecas_Ordem_Servico")
+@patch("app.services.ordem_servico.movimentar_estoque")
+@patch("app.services.ordem_servico.delete")
 @patch("app.services.ordem_servico.OrdemServico")
-def test_excluir_ordem_sucesso(mock_ordem, mock_pos, mock_estoque, mock_db):
+def test_excluir_ordem_sucesso(mock_ordem, mock_delete, mock_movimentar, mock_db):
     mock_ordem_inst = MagicMock()
     mock_ordem.query.get.return_value = mock_ordem_inst
-
-    mock_pos.query.filter_by.return_value.all.return_value = [
-        MagicMock(peca_id=1, quantidade=3)
-    ]
-
-    estoque_obj = MagicMock()
-    estoque_obj.qtd = 5
-    mock_estoque.query.filter_by.return_value.first.return_value = estoque_obj
+    mock_db.session.query.return_value.filter.return_value.all.return_value = [(1, 3)]
+    mock_movimentar.return_value = None
 
     erro, ordem = ordem_servico.excluir_ordem(1)
     assert erro is None
     assert ordem == mock_ordem_inst
+    mock_movimentar.assert_called_once_with({1: -3}, os_id=1)
+    mock_db.session.delete.assert_called_once_with(mock_ordem_inst)
     mock_db.session.commit.assert_called_once()
 
 
@@ -114,12 +344,13 @@ def test_excluir_ordem_nao_encontrada(mock_ordem):
 
 
 @patch("app.services.ordem_servico.db")
-@patch("app.services.ordem_servico.Estoque")
-@patch("app.services.ordem_servico.Pecas_Ordem_Servico")
+@patch("app.services.ordem_servico.movimentar_estoque")
+@patch("app.services.ordem_servico.delete")
 @patch("app.services.ordem_servico.OrdemServico")
-def test_excluir_ordem_excecao(mock_ordem, mock_pos, mock_estoque, mock_db):
+def test_excluir_ordem_excecao(mock_ordem, mock_delete, mock_movimentar, mock_db):
     mock_ordem_inst = MagicMock()
     mock_ordem.query.get.return_value = mock_ordem_inst
+    mock_movimentar.return_value = None
 
     mock_db.session.commit.side_effect = Exception("erro no commit")
 
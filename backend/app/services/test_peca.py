@@ -6,23 +6,20 @@ from app.services import peca
 
 # =================== listar_pecas ===================
 
-@patch("app.services.peca.db")
-@patch("app.services.peca.joinedload")
-def test_listar_pecas_sucesso(mock_joined, mock_db):
-    estoque_mock = MagicMock()
-    mock_db.session.query.return_value.options.return_value.all.return_value = [
-        estoque_mock]
+@patch("app.services.peca.serializar_estoques")
+@patch("app.services.peca.consulta_estoques")
+def test_listar_pecas_sucesso(mock_consulta, mock_serializar):
+    mock_serializar.return_value = [{"id": 1, "peca": "Parafuso"}]
 
     erro, estoques = peca.listar_pecas()
     assert erro is None
     assert len(estoques) == 1
-    mock_db.session.query.assert_called_once()
+    mock_consulta.assert_called_once()
 
 
-@patch("app.services.peca.db")
-@patch("app.services.peca.joinedload")
-def test_listar_pecas_erro(mock_joined, mock_db):
-    mock_db.session.query.side_effect = Exception("DB error")
+@patch("app.services.peca.consulta_estoques")
+def test_listar_pecas_erro(mock_consulta):
+    mock_consulta.side_effect = Exception("DB error")
     erro, estoques = peca.listar_pecas()
     assert "DB error" in erro
     assert estoques is None
@@ -30,10 +27,11 @@ def test_listar_pecas_erro(mock_joined, mock_db):
 
 # =================== nova_peca ===================
 
+@patch("app.services.peca.registrar_movimentacoes")
 @patch("app.services.peca.db")
 @patch("app.services.peca.Peca")
 @patch("app.services.peca.Estoque")
-def test_nova_peca_sucesso(mock_estoque, mock_peca, mock_db):
+def test_nova_peca_sucesso(mock_estoque, mock_peca, mock_db, mock_registrar):
     mock_peca.query.filter_by.return_value.first.return_value = None
     nova_peca = MagicMock(id=1)
     mock_peca.return_value = nova_peca
@@ -87,9 +85,10 @@ def test_nova_peca_qtd_negativa(mock_db, mock_peca):
     assert estoque is None
 
 
+@patch("app.services.peca.registrar_movimentacoes")
 @patch("app.services.peca.db")
 @patch("app.services.peca.Peca")
-def test_nova_peca_excecao_commit(mock_peca, mock_db):
+def test_nova_peca_excecao_commit(mock_peca, mock_db, mock_registrar):
     mock_peca.query.filter_by.return_value.first.return_value = None
     mock_db.session.commit.side_effect = Exception("Falha commit")
     data = {"nome": "X", "categoria": "Y", "qtd": 1, "qtd_min": 1}
@@ -98,12 +97,95 @@ def test_nova_peca_excecao_commit(mock_peca, mock_db):
     mock_db.session.rollback.assert_called_once()
 
 
+# =================== importar_pecas ===================
+
+@pytest.fixture
+def app_db(db):
+    """Uma peça já cadastrada."""
+    from app.models import Peca, Estoque
+
+    existente = Peca(nome="Parafuso", categoria="Fixação")
+    db.session.add(existente)
+    db.session.flush()
+    db.session.add(Estoque(qtd=1, qtd_min=1, peca_id=existente.id))
+    db.session.commit()
+    return db
+
+
+def test_importar_pecas(app_db):
+    from app.models import Peca, Estoque
+
+    linhas = [
+        {"nome": "Motor", "categoria": "Elétrica", "qtd": 3, "qtd_min": 1},
+        {"nome": "Parafuso", "categoria": "Fixação", "qtd": 10, "qtd_min": 2},
+        {"nome": "Motor", "categoria": "Elétrica", "qtd": 5, "qtd_min": 1},
+        {"nome": "Correia", "categoria": "Mecânica", "qtd": "x", "qtd_min": 1},
+        {"nome": "Correia", "categoria": "Mecânica", "qtd": "4", "qtd_min": "2"},
+        {"nome": "Filtro"},
+    ]
+    erro, resultado = peca.importar_pecas(linhas)
+
+    assert erro is None
+    assert resultado["aceitas"] == 2
+    assert resultado["rejeitadas"] == [
+        {"linha": 2, "erro": "Peça já cadastrada"},
+        {"linha": 3, "erro": "Peça duplicada no lote"},
+        {"linha": 4, "erro": "Quantidade e quantidade mínima devem ser números inteiros"},
+        {"linha": 6, "erro": "Dados incompletos"},
+    ]
+    estoques = {e.peca.nome: (e.qtd, e.qtd_min) for e in Estoque.query.all()}
+    assert estoques == {"Parafuso": (1, 1), "Motor": (3, 1), "Correia": (4, 2)}
+    assert Peca.query.count() == 3
+
+
+def test_importar_pecas_muitas_linhas(app_db):
+    from app.models import Estoque
+
+    linhas = [{"nome": f"Peça {i}", "categoria": "Lote", "qtd": i, "qtd_min": 1} for i in range(12000)]
+    erro, resultado = peca.importar_pecas(linhas)
+
+    assert erro is None
+    assert resultado == {"aceitas": 12000, "rejeitadas": []}
+    assert Estoque.query.count() == 12001
+
+
+def test_nova_peca_corrida_com_outro_cadastro(app_db):
+    from app.models import Peca
+
+    # A consulta prévia não vê a peça (outra requisição a gravou depois);
+    # quem barra é a restrição única
+    with patch("app.services.peca.Peca.query") as mock_query:
+        mock_query.filter_by.return_value.first.return_value = None
+        erro, resultado = peca.nova_peca({"nome": "Parafuso", "categoria": "Fixação", "qtd": 1, "qtd_min": 1})
+
+    assert erro == "Peça já cadastrada"
+    assert resultado is None
+    assert Peca.query.count() == 1
+
+
+def test_ler_csv_pecas_ponto_e_virgula():
+    linhas = peca.ler_csv_pecas("nome;categoria;qtd;qtd_min\nMotor;Elétrica;3;1\n")
+    assert linhas == [{"nome": "Motor", "categoria": "Elétrica", "qtd": "3", "qtd_min": "1"}]
+
+
+@pytest.mark.parametrize("codificacao", ["utf-8", "utf-8-sig", "cp1252"])
+def test_decodificar_csv(codificacao):
+    texto = "nome;categoria;qtd;qtd_min\nPeça;Elétrica;3;1\n"
+    assert peca.decodificar_csv(texto.encode(codificacao)) == (None, texto)
+
+
+def test_decodificar_csv_invalido():
+    # 0x81 não existe nem em UTF-8 nem em Windows-1252
+    assert peca.decodificar_csv(b"nome\x81") == ("Arquivo deve estar em UTF-8", None)
+
+
 # =================== atualizar_peca ===================
 
+@patch("app.services.peca.registrar_movimentacoes")
 @patch("app.services.peca.db")
 @patch("app.services.peca.joinedload")
 @patch("app.services.peca.Estoque")
-def test_atualizar_peca_sucesso(mock_estoque, mock_joined, mock_db):
+def test_atualizar_peca_sucesso(mock_estoque, mock_joined, mock_db, mock_registrar):
     peca_obj = MagicMock(nome="Velha", categoria="Antiga")
     estoque_mock = MagicMock(peca=peca_obj, qtd=5, qtd_min=1)
     mock_estoque.query.options.return_value.get.return_value = estoque_mock
@@ -122,10 +204,11 @@ def test_atualizar_peca_nao_encontrada(mock_estoque, mock_joined):
     assert "não encontrado" in erro
 
 
+@patch("app.services.peca.registrar_movimentacoes")
 @patch("app.services.peca.db")
 @patch("app.services.peca.joinedload")
 @patch("app.services.peca.Estoque")
-def test_atualizar_peca_excecao_commit(mock_estoque, mock_joined, mock_db):
+def test_atualizar_peca_excecao_commit(mock_estoque, mock_joined, mock_db, mock_registrar):
     estoque_mock = MagicMock(peca=MagicMock())
     mock_estoque.query.options.return_value.get.return_value = estoque_mock
     mock_db.session.commit.side_effect = Exception("Erro commit")
@@ -0,0 +1,167 @@
+import os
+import numpy as np
+import pytest
+from datetime import date, datetime, timedelta
+from app.services import previsao
+
+HOJE = date(2025, 3, 10)
+
+
+def _consumir(db, usuario_id, data, pecas):
+    from app.models import OrdemServico, Pecas_Ordem_Servico
+
+    ordem = OrdemServico(tipo="Corretiva", setor="Elétrica", data=data, recorrencia="Única",
+                         status="Concluída", solicitante_id=usuario_id)
+    db.session.add(ordem)
+    db.session.flush()
+    db.session.add_all([
+        Pecas_Ordem_Servico(os_id=ordem.id, peca_id=peca_id, quantidade=quantidade)
+        for peca_id, quantidade in pecas.items()
+    ])
+
+
+def _popular(db):
+    # Correia: consumo hoje e há 60 dias; Filtro: zerado; Parafuso: parado
+    from app.models import Peca, Estoque, Usuario
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    db.session.add(usuario)
+    pecas = {}
+    for nome, qtd, qtd_min in [("Parafuso", 50, 5), ("Correia", 5, 2), ("Filtro", 0, 1)]:
+        peca = Peca(nome=nome, categoria="Mecânica")
+        db.session.add(peca)
+        db.session.flush()
+        db.session.add(Estoque(qtd=qtd, qtd_min=qtd_min, peca_id=peca.id))
+        pecas[nome] = peca.id
+    db.session.flush()
+
+    hoje = datetime.combine(HOJE, datetime.min.time())
+    _consumir(db, usuario.id, hoje + timedelta(hours=9), {pecas["Correia"]: 3})
+    _consumir(db, usuario.id, hoje - timedelta(days=60, hours=-15), {pecas["Correia"]: 9, pecas["Filtro"]: 2})
+    # Fora do período: amanhã e antes do histórico lido
+    _consumir(db, usuario.id, hoje + timedelta(days=1, hours=8), {pecas["Correia"]: 100})
+    _consumir(db, usuario.id, hoje - timedelta(days=400), {pecas["Parafuso"]: 100})
+    db.session.commit()
+    return pecas
+
+
+@pytest.fixture
+def app_db(db):
+    """Três peças e o consumo de algumas ordens."""
+
+    return db, _popular(db)
+
+
+def test_exponencial_igual_a_media_dia_a_dia():
+    # A soma ponderada por idade é a média exponencial diária de sempre
+    rng = np.random.default_rng(1)
+    n_dias, suavizacao = 200, 30
+    serie = rng.integers(0, 4, size=(3, n_dias)).astype(float)
+    indices, idades = np.nonzero(serie)
+    quantidades = serie[indices, idades]
+
+    media_movel, exponencial = previsao.taxas_de_consumo(
+        indices, (n_dias - 1) - idades, quantidades, 3, janela=30, suavizacao=suavizacao)
+
+    alfa = 2 / (suavizacao + 1)
+    esperado = np.zeros(3)
+    for dia in range(n_dias):
+        esperado = alfa * serie[:, dia] + (1 - alfa) * esperado
+    np.testing.assert_allclose(exponencial, esperado)
+    np.testing.assert_allclose(media_movel, serie[:, -30:].sum(axis=1) / 30)
+
+
+@pytest.mark.parametrize("janela, suavizacao, dias", [
+    (90, 30, 139),
+    (200, 30, 200),
+    (7, 1, 7),
+    (30, 2000, previsao.HISTORICO_MAXIMO_DIAS),
+])
+def test_dias_de_historico(janela, suavizacao, dias):
+    assert previsao.dias_de_historico(janela, suavizacao) == dias
+
+
+def test_prever_rupturas(app_db):
+    db, pecas = app_db
+    erro, itens = previsao.prever_rupturas(prazo=7, cobertura=30, hoje=HOJE)
+    assert erro is None
+    # Ruptura mais próxima primeiro; peça parada no fim
+    assert [item["peca"] for item in itens] == ["Filtro", "Correia", "Parafuso"]
+
+    alfa = 2 / 31
+    correia = itens[1]
+    media, exponencial = 12 / 90, 3 * alfa + 9 * alfa * (1 - alfa) ** 60
+    assert correia["consumo_medio"] == round(media, 3)
+    assert correia["consumo_exponencial"] == round(exponencial, 3)
+    dias = int(5 / max(media, exponencial))
+    assert correia["dias_ate_ruptura"] == dias
+    assert correia["data_ruptura"] == (HOJE + timedelta(days=dias)).isoformat()
+    assert correia["sugestao_reposicao"] == int(np.ceil(max(media, exponencial) * 37)) + 2 - 5
+
+    filtro = itens[0]
+    assert (filtro["dias_ate_ruptura"], filtro["data_ruptura"]) == (0, HOJE.isoformat())
+    assert filtro["sugestao_reposicao"] == int(np.ceil(2 / 90 * 37)) + 1
+
+    parafuso = itens[2]
+    assert parafuso == {
+        "id": parafuso["id"], "peca_id": pecas["Parafuso"], "peca": "Parafuso", "qtd": 50, "qtd_min": 5,
+        "consumo_medio": 0.0, "consumo_exponencial": 0.0, "dias_ate_ruptura": None,
+        "data_ruptura": None, "sugestao_reposicao": 0,
+    }
+
+
+def test_janela_longa_le_mais_historico(app_db):
+    erro, itens = previsao.prever_rupturas(janela=500, hoje=HOJE)
+    assert erro is None
+    parafuso = next(item for item in itens if item["peca"] == "Parafuso")
+    assert parafuso["consumo_medio"] == round(100 / 500, 3)
+
+
+@pytest.mark.parametrize("parametros", [
+    {"janela": "0"},
+    {"janela": "abc"},
+    {"suavizacao": "-3"},
+    {"prazo": "400"},
+    {"cobertura": "1.5"},
+])
+def test_parametros_invalidos(parametros):
+    assert previsao.prever_rupturas(**parametros) == ("Parâmetros inválidos", None)
+
+
+def test_prever_rupturas_erro(monkeypatch):
+    def falhar(*args):
+        raise Exception("DB error")
+
+    monkeypatch.setattr(previsao, "dias_de_historico", falhar)
+    erro, itens = previsao.prever_rupturas()
+    assert "DB error" in erro
+    assert itens is None
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                    reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+def test_copy_binario_igual_ao_cursor(monkeypatch):
+    """No Postgres o consumo vem por COPY binário; o resultado é o mesmo."""
+    from app import create_app, db
+
+    monkeypatch.setenv("DATABASE_URL", os.environ["TEST_POSTGRES_URL"])
+
+    monkeypatch.setenv("SECRET_KEY", "chave-de-teste")
+    flask_app = create_app()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        try:
+            _popular(db)
+            inicio = datetime(2024, 1, 1, 6)
+            fim = datetime(2025, 3, 12)
+            pecas, dias, quantidades = previsao.carregar_consumo(inicio, fim)
+            linhas = db.session.execute(previsao._consulta_consumo(inicio, fim)).all()
+            esperado = sorted(
+                (peca, (data - inicio) // timedelta(days=1), quantidade) for peca, data, quantidade in linhas)
+            assert sorted(zip(pecas.tolist(), dias.tolist(), quantidades.tolist())) == esperado
+            assert previsao.prever_rupturas(hoje=HOJE)[1][0]["peca"] == "Filtro"
+        finally:
+            db.session.remove()
+            db.drop_all()
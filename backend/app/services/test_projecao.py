@@ -0,0 +1,173 @@
+import pytest
+from datetime import date, datetime
+from sqlalchemy import event
+from app.services import projecao
+
+HOJE = date(2025, 3, 10)
+
+
+def _ordem(db, usuario_id, data, pecas=None, status="Pendente", recorrencia="Única", **campos):
+    from app.models import OrdemServico, Pecas_Ordem_Servico
+
+    ordem = OrdemServico(tipo="Preventiva", setor="Elétrica", data=data, recorrencia=recorrencia,
+                         status=status, solicitante_id=usuario_id, **campos)
+    db.session.add(ordem)
+    db.session.flush()
+    db.session.add_all([
+        Pecas_Ordem_Servico(os_id=ordem.id, peca_id=peca_id, quantidade=quantidade)
+        for peca_id, quantidade in (pecas or {}).items()
+    ])
+    return ordem.id
+
+
+def _popular(db):
+    # Correia: 10 em mãos, 5 já reservadas por ordens futuras; Filtro: usado
+    # por um modelo semanal; Parafuso: sem uso previsto
+    from app.models import Peca, Estoque, Usuario
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    db.session.add(usuario)
+    pecas = {}
+    for nome, qtd, qtd_min in [("Parafuso", 100, 10), ("Correia", 5, 5), ("Filtro", 3, 1)]:
+        peca = Peca(nome=nome, categoria="Mecânica")
+        db.session.add(peca)
+        db.session.flush()
+        db.session.add(Estoque(qtd=qtd, qtd_min=qtd_min, peca_id=peca.id))
+        pecas[nome] = peca.id
+    db.session.flush()
+
+    correia, filtro = pecas["Correia"], pecas["Filtro"]
+    _ordem(db, usuario.id, datetime(2025, 3, 12, 9), {correia: 4})
+    # Concluída, passada e além do horizonte: fora da projeção
+    _ordem(db, usuario.id, datetime(2025, 3, 13, 9), {correia: 2}, status="Concluída")
+    _ordem(db, usuario.id, datetime(2025, 3, 1, 9), {correia: 1})
+    _ordem(db, usuario.id, datetime(2025, 4, 30, 9), {correia: 7})
+
+    # Semanal com ocorrências geradas até 10/03: a de hoje conta, a partir
+    # de 17/03 contam as que o gerador ainda vai criar
+    semanal = _ordem(db, usuario.id, datetime(2025, 3, 3, 8), {filtro: 1}, status="Concluída",
+                     recorrencia="Semanal", recorrencia_proxima=datetime(2025, 3, 17, 8))
+    _ordem(db, usuario.id, datetime(2025, 3, 10, 8), origem_id=semanal)
+    # Mensal recalculada (sem próxima): a ocorrência de 15/03 já existe com
+    # peças próprias e conta como ordem, não com as peças do modelo
+    mensal = _ordem(db, usuario.id, datetime(2025, 1, 15, 10), {correia: 2}, status="Concluída",
+                    recorrencia="Mensal")
+    _ordem(db, usuario.id, datetime(2025, 3, 15, 10), {correia: 1}, origem_id=mensal)
+    db.session.commit()
+    return pecas
+
+
+@pytest.fixture
+def app_db(db):
+    """Três peças, ordens agendadas e modelos."""
+
+    return db, _popular(db)
+
+
+def _por_nome(projecao):
+    return {item["peca"]: item for item in projecao["pecas"]}
+
+
+def test_projetar_estoque(app_db):
+    db, pecas = app_db
+    erro, resultado = projecao.projetar_estoque(horizonte=14, hoje=HOJE)
+    assert erro is None
+    assert (resultado["inicio"], resultado["dias"]) == ("2025-03-10", 15)
+    # Alerta mais próximo primeiro; peça sem uso previsto fica de fora
+    assert [item["peca"] for item in resultado["pecas"]] == ["Correia", "Filtro"]
+
+    correia, filtro = resultado["pecas"]
+    # 4 saem em 12/03 e 1 em 15/03 (ocorrência com peças próprias); 15/04 da
+    # mensal fica além do horizonte
+    assert (correia["qtd"], correia["reservado"]) == (5, 5)
+    assert correia["saldos"] == [10, 10, 6, 6, 6, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5]
+    assert correia["primeiro_dia_em_alerta"] == "2025-03-15"
+
+    assert filtro["reservado"] == 0
+    assert filtro["saldos"] == [2, 2, 2, 2, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1, 0]
+    assert filtro["primeiro_dia_em_alerta"] == "2025-03-17"
+
+
+def test_horizonte_maior_inclui_proximas_ocorrencias(app_db):
+    erro, resultado = projecao.projetar_estoque(horizonte=60, hoje=HOJE)
+    assert erro is None
+    correia = _por_nome(resultado)["Correia"]
+    # 15/04 pelo modelo mensal (2) e 30/04 pela ordem agendada (7)
+    assert correia["reservado"] == 12
+    assert correia["saldos"][35:37] == [12, 10]
+    assert correia["saldos"][50:52] == [10, 3]
+
+
+def test_filtrar_pecas(app_db):
+    db, pecas = app_db
+    erro, resultado = projecao.projetar_estoque(horizonte=3, peca_ids=[str(pecas["Parafuso"])], hoje=HOJE)
+    assert erro is None
+    assert resultado["pecas"] == [{
+        "peca_id": pecas["Parafuso"], "peca": "Parafuso", "qtd": 100, "qtd_min": 10,
+        "reservado": 0, "saldos": [100, 100, 100, 100], "primeiro_dia_em_alerta": None,
+    }]
+
+
+def test_simular_ordens_hipoteticas(app_db):
+    from app.models import OrdemServico
+
+    db, pecas = app_db
+    total = OrdemServico.query.count()
+    ordens = [{"data": "2025-03-11T14:00", "recorrencia": "a cada 5 dias",
+               "pecas_utilizadas": [{"peca_id": pecas["Parafuso"], "quantidade": 30}]}]
+    erro, resultado = projecao.projetar_estoque(horizonte=14, ordens=ordens, hoje=HOJE)
+    assert erro is None
+    parafuso = _por_nome(resultado)["Parafuso"]
+    # 11/03 pela própria ordem, 16/03 e 21/03 pelas ocorrências
+    assert parafuso["saldos"][:2] + parafuso["saldos"][5:7] + parafuso["saldos"][10:12] == [100, 70, 70, 40, 40, 10]
+    assert parafuso["primeiro_dia_em_alerta"] == "2025-03-21"
+    assert OrdemServico.query.count() == total
+
+
+def test_consultas_nao_crescem_com_horizonte(app_db):
+    db, _ = app_db
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        for horizonte in (7, 365):
+            consultas.clear()
+            assert projecao.projetar_estoque(horizonte=horizonte, hoje=HOJE)[0] is None
+            assert len(consultas) == 5
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+
+
+@pytest.mark.parametrize("parametros, erro", [
+    ({"horizonte": "400"}, "Parâmetros inválidos"),
+    ({"horizonte": "-1"}, "Parâmetros inválidos"),
+    ({"peca_ids": ["abc"]}, "Parâmetros inválidos"),
+    ({"ordens": [{"pecas_utilizadas": []}]}, "Dados da simulação inválidos"),
+    ({"ordens": [{"data": "amanhã"}]}, "Dados da simulação inválidos"),
+    ({"ordens": {"data": "2025-03-11"}}, "Dados da simulação inválidos"),
+    ({"ordens": ["2025-03-11"]}, "Dados da simulação inválidos"),
+    ({"ordens": [{"data": "2025-03-11", "pecas_utilizadas": "x"}]}, "Dados da simulação inválidos"),
+    ({"ordens": [{"data": "2025-03-11", "pecas_utilizadas": [1]}]}, "Dados da simulação inválidos"),
+    ({"ordens": [{"data": "2025-03-11", "pecas_utilizadas": {"peca_id": 1}}]}, "Dados da simulação inválidos"),
+    ({"ordens": [{"data": "2025-03-11", "recorrencia": 7}]}, "Dados da simulação inválidos"),
+    ({"ordens": [{"data": "2025-03-11", "recorrencia": "Às vezes"}]},
+     "Dados da simulação inválidos: recorrência 'Às vezes' não reconhecida"),
+    ({"ordens": [{"data": "2025-03-11", "pecas_utilizadas": [{"peca_id": 1, "quantidade": 0}]}]},
+     "Quantidade invalida para a peça selecionada!"),
+])
+def test_parametros_invalidos(parametros, erro):
+    assert projecao.projetar_estoque(**parametros) == (erro, None)
+
+
+def test_projetar_estoque_erro(app_db, monkeypatch):
+    def falhar(*args):
+        raise Exception("DB error")
+
+    monkeypatch.setattr(projecao, "_uso_agendado", falhar)
+    erro, resultado = projecao.projetar_estoque()
+    assert "DB error" in erro
+    assert resultado is None
@@ -0,0 +1,253 @@
+import os
+import threading
+from itertools import islice
+import pytest
+from datetime import date, datetime
+from sqlalchemy import event
+from app.services import recorrencia
+
+HOJE = date(2025, 3, 10)
+
+
+def _modelos(db, usuario_id):
+    from app.models import OrdemServico
+
+    dados = [
+        ("Mensal", datetime(2025, 1, 31, 8)),
+        ("Semanal", datetime(2024, 6, 3, 14)),
+        ("a cada 10 dias", datetime(2025, 3, 1, 9)),
+        ("Única", datetime(2025, 3, 1, 9)),
+        ("Quando der", datetime(2025, 3, 1, 9)),
+    ]
+    ids = {}
+    for regra, data in dados:
+        ordem = OrdemServico(tipo="Preventiva", setor="Elétrica", data=data, recorrencia=regra,
+                             detalhes=f"Revisão {regra}", status="Concluída", solicitante_id=usuario_id)
+        db.session.add(ordem)
+        db.session.flush()
+        ids[regra] = ordem.id
+    db.session.commit()
+    return ids
+
+
+@pytest.fixture
+def app_db(db):
+    """Um usuário e as ordens modelo."""
+    from app.models import Usuario
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    db.session.add(usuario)
+    db.session.commit()
+    return db, _modelos(db, usuario.id)
+
+
+def _geradas(origem_id):
+    from app.models import OrdemServico
+    return [o.data for o in OrdemServico.query.filter_by(origem_id=origem_id).order_by(OrdemServico.data)]
+
+
+@pytest.mark.parametrize("texto, regra", [
+    ("Diária", (1, "dias")),
+    ("  SEMANAL ", (7, "dias")),
+    ("Mensal", (1, "meses")),
+    ("Anual", (12, "meses")),
+    ("A cada 10 dias", (10, "dias")),
+    ("cada 2 semanas", (14, "dias")),
+    ("a cada 3 meses", (3, "meses")),
+    ("a cada 1 ano", (12, "meses")),
+    ("Única", None),
+    ("a cada 0 dias", None),
+    ("", None),
+])
+def test_interpretar_regra(texto, regra):
+    assert recorrencia.interpretar_regra(texto) == regra
+
+
+@pytest.mark.parametrize("texto, resultado", [
+    ("Única", (None, "Única")),
+    ("única", (None, "Única")),
+    (" UNICA ", (None, "Única")),
+    ("Nenhuma", (None, "Única")),
+    ("", (None, "Única")),
+    (None, (None, "Única")),
+    (" Mensal ", (None, "Mensal")),
+    ("a cada 10 dias", (None, "a cada 10 dias")),
+    ("Quando der", ("Recorrência 'Quando der' não reconhecida", None)),
+    (3, ("Recorrência inválida", None)),
+])
+def test_normalizar_recorrencia(texto, resultado):
+    assert recorrencia.normalizar_recorrencia(texto) == resultado
+
+
+def test_mensal_no_fim_do_mes_nao_escorrega():
+    datas = recorrencia.ocorrencias(datetime(2024, 1, 31), (1, "meses"), datetime(2024, 1, 31))
+    assert [d.day for d in islice(datas, 4)] == [29, 31, 30, 31]
+
+
+def test_ocorrencias_comecam_na_janela():
+    # Modelo de 10 anos atrás: nada antes da janela é gerado nem percorrido
+    inicio = datetime(2015, 3, 10, 8)
+    datas = recorrencia.ocorrencias(inicio, (1, "dias"), datetime(2025, 3, 9, 23, 59))
+    assert list(islice(datas, 3)) == [datetime(2025, 3, 10, 8), datetime(2025, 3, 11, 8), datetime(2025, 3, 12, 8)]
+
+
+def test_gerar_ocorrencias_na_janela(app_db):
+    from app.models import OrdemServico
+
+    db, ids = app_db
+    erro, resumo = recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)
+    assert erro is None
+    assert resumo == {"modelos": 3, "geradas": 9, "ignoradas": 1}
+
+    assert _geradas(ids["Mensal"]) == [datetime(2025, 3, 31, 8)]
+    assert _geradas(ids["Semanal"]) == [
+        datetime(2025, 3, 10, 14), datetime(2025, 3, 17, 14), datetime(2025, 3, 24, 14),
+        datetime(2025, 3, 31, 14), datetime(2025, 4, 7, 14)]
+    assert _geradas(ids["a cada 10 dias"]) == [
+        datetime(2025, 3, 11, 9), datetime(2025, 3, 21, 9), datetime(2025, 3, 31, 9)]
+
+    ocorrencia = OrdemServico.query.filter_by(origem_id=ids["Mensal"]).one()
+    assert (ocorrencia.recorrencia, ocorrencia.status, ocorrencia.detalhes) == ("Única", "Pendente", "Revisão Mensal")
+    assert ocorrencia.to_dict()["origem_id"] == ids["Mensal"]
+
+
+def test_gerar_de_novo_nao_repete(app_db):
+    from app.models import OrdemServico
+
+    db, ids = app_db
+    recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)
+    total = OrdemServico.query.count()
+
+    # Mesma janela: nada a gerar
+    assert recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)[1]["geradas"] == 0
+    # Ocorrência excluída à mão não volta
+    db.session.delete(OrdemServico.query.filter_by(origem_id=ids["Mensal"]).one())
+    db.session.commit()
+    assert recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)[1]["geradas"] == 0
+    assert OrdemServico.query.count() == total - 1
+
+    # Outro gerador já inseriu (marca perdida): o índice único descarta
+    OrdemServico.query.filter_by(id=ids["Semanal"]).update({"recorrencia_proxima": None})
+    db.session.commit()
+    assert recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)[1]["geradas"] == 0
+    assert len(_geradas(ids["Semanal"])) == 5
+
+    # No dia seguinte a janela anda um dia e só o modelo com ocorrência
+    # nova é lido; o de regra não reconhecida ficou marcado na primeira vez
+    erro, resumo = recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=date(2025, 3, 11))
+    assert resumo == {"modelos": 1, "geradas": 1, "ignoradas": 0}
+    assert _geradas(ids["a cada 10 dias"])[-1] == datetime(2025, 4, 10, 9)
+
+
+def test_editar_regra_do_modelo_recalcula(app_db):
+    from app.models import OrdemServico
+    from app.services.ordem_servico import atualizar_ordem
+
+    db, ids = app_db
+    recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)
+    assert atualizar_ordem(ids["Mensal"], {"recorrencia": "Mensal"})[0] is None
+    assert db.session.get(OrdemServico, ids["Mensal"]).recorrencia_proxima == datetime(2025, 4, 30, 8)
+
+    assert atualizar_ordem(ids["Mensal"], {"recorrencia": "Semanal"})[0] is None
+    assert db.session.get(OrdemServico, ids["Mensal"]).recorrencia_proxima is None
+    recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)
+    # Semanal a partir de 31/01 (sexta); a ocorrência de 31/03 já existia
+    assert _geradas(ids["Mensal"]) == [
+        datetime(2025, 3, 14, 8), datetime(2025, 3, 21, 8), datetime(2025, 3, 28, 8),
+        datetime(2025, 3, 31, 8), datetime(2025, 4, 4, 8)]
+
+
+def test_regra_nao_reconhecida_nao_e_lida_de_novo(app_db):
+    from app.models import OrdemServico
+    from app.services.ordem_servico import atualizar_ordem
+
+    db, ids = app_db
+    assert recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)[1]["ignoradas"] == 1
+    modelo = db.session.get(OrdemServico, ids["Quando der"])
+    assert modelo.recorrencia_proxima == recorrencia.REGRA_NAO_RECONHECIDA
+    limite = datetime(2025, 4, 9)
+    assert ids["Quando der"] not in [m.id for m in recorrencia.consulta_modelos(limite)]
+
+    # Corrigida a regra, o modelo volta a ser lido
+    assert atualizar_ordem(ids["Quando der"], {"recorrencia": "Semanal"})[0] is None
+    assert recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)[1]["ignoradas"] == 0
+    assert _geradas(ids["Quando der"])[0] == datetime(2025, 3, 15, 9)
+
+
+def test_gerar_em_lotes(app_db, monkeypatch):
+    db, _ = app_db
+    monkeypatch.setattr(recorrencia, "MODELOS_POR_LOTE", 2)
+    inserts = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT"):
+            inserts.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        erro, resumo = recorrencia.gerar_ocorrencias(horizonte_dias=30, hoje=HOJE)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    assert erro is None
+    assert resumo["geradas"] == 9
+    # Um INSERT por lote com ocorrências, não um por ordem
+    assert len(inserts) == 2
+
+
+def test_comando_recorrencias(app_db):
+    from flask import current_app
+
+    resultado = current_app.test_cli_runner().invoke(args=["ordens", "recorrencias", "--horizonte", "0"])
+    assert resultado.exit_code == 0
+    assert "ordens geradas de 3 modelos (1 com recorrência não reconhecida)" in resultado.output
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                    reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+def test_geradores_simultaneos_nao_duplicam(monkeypatch):
+    """Geradores em paralelo contra o Postgres geram cada ocorrência uma vez."""
+    from app import create_app, db
+    from app.models import OrdemServico, Usuario
+    from app.utils import invalidacao
+
+    monkeypatch.setenv("DATABASE_URL", os.environ["TEST_POSTGRES_URL"])
+
+    monkeypatch.setenv("SECRET_KEY", "chave-de-teste")
+    flask_app = create_app()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+        usuario.set_senha("123")
+        db.session.add(usuario)
+        db.session.commit()
+        db.session.add_all([
+            OrdemServico(tipo="Preventiva", setor=f"Setor {i}", data=datetime(2025, 1, 1, i % 24),
+                         recorrencia="Diária", status="Concluída", solicitante_id=usuario.id)
+            for i in range(300)
+        ])
+        db.session.commit()
+
+    resumos = []
+    inicio = threading.Barrier(4)
+
+    def gerar():
+        with flask_app.app_context():
+            inicio.wait()
+            resumos.append(recorrencia.gerar_ocorrencias(horizonte_dias=9, hoje=HOJE))
+            db.session.remove()
+
+    threads = [threading.Thread(target=gerar) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with flask_app.app_context():
+        assert all(erro is None for erro, _ in resumos)
+        assert sum(resumo["geradas"] for _, resumo in resumos) == 300 * 10
+        assert OrdemServico.query.filter(OrdemServico.origem_id.isnot(None)).count() == 300 * 10
+        db.session.remove()
+        db.drop_all()
+    invalidacao.parar()
@@ -0,0 +1,69 @@
+import io
+import zipfile
+import pytest
+from datetime import datetime
+from app.services import relatorios
+
+
+@pytest.fixture
+def app_db(db):
+    """Uma peça e duas ordens."""
+    from app.models import Peca, Estoque, Usuario, OrdemServico
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    peca = Peca(nome="Motor", categoria="Elétrica")
+    db.session.add_all([usuario, peca])
+    db.session.flush()
+    estoque = Estoque(qtd=1, qtd_min=3, peca_id=peca.id)
+    db.session.add(estoque)
+    db.session.flush()
+    db.session.add_all([
+        OrdemServico(tipo="Corretiva", setor="Elétrica", data=datetime(2025, 3, 2),
+                     recorrencia="Única", detalhes='Troca "urgente"\ndo motor', status="Concluída",
+                     equipamento_id=estoque.id, solicitante_id=usuario.id),
+        OrdemServico(tipo="Preventiva", setor="Elétrica", data=datetime(2025, 3, 1),
+                     recorrencia="Mensal", detalhes="Revisão", status="Concluída",
+                     solicitante_id=usuario.id),
+    ])
+    db.session.commit()
+    return db
+
+
+def test_exportar_csv(app_db):
+    erro, (conteudo, mimetype, nome) = relatorios.exportar_relatorio({"tipo": "Corretiva"}, "csv")
+    assert erro is None
+    assert mimetype.startswith("text/csv")
+
+    texto = b"".join(conteudo).decode("utf-8-sig")
+    linhas = texto.splitlines()
+    assert linhas[0] == "Equipamento,Responsável,Tipo,Status,Data de Abertura,Descrição"
+    assert linhas[1] == 'Motor,Ana,Corretiva,Concluída,02/03/2025,"Troca ""urgente"" do motor"'
+    assert len(linhas) == 2
+
+
+def test_exportar_xlsx(app_db):
+    erro, (conteudo, _, nome) = relatorios.exportar_relatorio({}, "xlsx")
+    assert erro is None
+    assert nome.endswith(".xlsx")
+
+    arquivo = zipfile.ZipFile(io.BytesIO(b"".join(conteudo)))
+    assert arquivo.testzip() is None
+    ordens = arquivo.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    estoque = arquivo.read("xl/worksheets/sheet2.xml").decode("utf-8")
+    assert ordens.count("<row ") == 3
+    assert 'Troca "urgente" do motor' in ordens
+    assert "Sem Nome" in ordens
+    assert '<c r="B2"><v>1</v></c>' in estoque
+    assert "Baixo Estoque" in estoque
+
+
+def test_exportar_formato_invalido():
+    erro, arquivo = relatorios.exportar_relatorio({}, "pdf")
+    assert erro == "Formato inválido"
+    assert arquivo is None
+
+
+def test_exportar_filtro_invalido(app_db):
+    erro, arquivo = relatorios.exportar_relatorio({"data_fim": "amanhã"}, "csv")
+    assert erro == "Filtro inválido"
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.services import serializacao
+
+
+def _popular(db, n):
+    from app.models import Peca, Estoque, Usuario, OrdemServico, Pecas_Ordem_Servico
+
+    usuario = Usuario(nome=f"Técnico {n}", email=f"tecnico{n}@example.com", funcao="Técnico", setor="Manutenção")
+    usuario.set_senha("123")
+    db.session.add(usuario)
+    db.session.flush()
+    for i in range(n):
+        peca = Peca(nome=f"Peça {n}-{i}", categoria="Mecânica")
+        db.session.add(peca)
+        db.session.flush()
+        estoque = Estoque(qtd=10, qtd_min=2, peca_id=peca.id)
+        db.session.add(estoque)
+        db.session.flush()
+        ordem = OrdemServico(
+            tipo="Corretiva",
+            setor="Elétrica",
+            data=datetime.now() + timedelta(days=1),
+            recorrencia="Única",
+            detalhes=f"Ordem {i}",
+            status="Pendente",
+            equipamento_id=estoque.id,
+            solicitante_id=usuario.id
+        )
+        db.session.add(ordem)
+        db.session.flush()
+        db.session.add(Pecas_Ordem_Servico(os_id=ordem.id, peca_id=peca.id, quantidade=1))
+    db.session.commit()
+    db.session.expire_all()
+
+
+def _contar_consultas(db, funcao):
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        resultado = funcao()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    return resultado, len(consultas)
+
+
+def test_serializar_ordens_numero_fixo_de_consultas(db):
+    _popular(db, 3)
+    poucas, consultas_poucas = _contar_consultas(
+        db, lambda: serializacao.serializar_ordens(serializacao.consulta_ordens()))
+
+    _popular(db, 30)
+    muitas, consultas_muitas = _contar_consultas(
+        db, lambda: serializacao.serializar_ordens(serializacao.consulta_ordens()))
+
+    assert len(poucas) == 3
+    assert len(muitas) == 33
+    assert consultas_poucas == consultas_muitas == 2
+
+
+def test_serializar_ordens_igual_to_dict(db):
+    from app.models import OrdemServico
+
+    _popular(db, 2)
+    esperado = {o.id: o.to_dict() for o in OrdemServico.query.all()}
+    for ordem in serializacao.serializar_ordens(serializacao.consulta_ordens()):
+        assert ordem == esperado[ordem["id"]]
+
+
+def test_iterar_ordens_busca_pecas_por_lote(db, monkeypatch):
+    from app.models import OrdemServico
+
+    monkeypatch.setattr(serializacao, "LINHAS_POR_LOTE", 4)
+    _popular(db, 10)
+    query = serializacao.consulta_ordens().order_by(OrdemServico.id)
+
+    ordens, consultas = _contar_consultas(db, lambda: list(serializacao.iterar_ordens(query)))
+    # Ordens + peças de cada um dos 3 lotes
+    assert consultas == 4
+    assert ordens == serializacao.serializar_ordens(query)
+
+
+def test_iterar_ordens_sem_linhas(db):
+    assert list(serializacao.iterar_ordens(serializacao.consulta_ordens())) == []
+
+
+def test_serializar_estoques_uma_consulta(db):
+    from app.models import Estoque
+
+    _popular(db, 5)
+    estoques, consultas = _contar_consultas(
+        db, lambda: serializacao.serializar_estoques(serializacao.consulta_estoques()))
+
+    assert consultas == 1
+    assert estoques == [e.to_dict() for e in Estoque.query.order_by(Estoque.id)]
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import event
+from app.services import sessao as sessao_service
+
+
+@pytest.fixture
+def app_db(app_teste, db):
+    """Um usuário cadastrado."""
+    from app.models import Usuario
+
+    usuario = Usuario(nome="Ana", email="ana@example.com", funcao="Técnica", setor="Manutenção")
+    usuario.set_senha("123")
+    db.session.add(usuario)
+    db.session.commit()
+    yield app_teste, db, usuario
+    sessao_service._revogadas.clear()
+
+
+def test_token_emitido_e_verificado(app_db):
+    _, _, usuario = app_db
+    token = sessao_service.emitir_sessao(usuario)["token"]
+
+    erro, dados = sessao_service.verificar_token(token)
+    assert erro is None
+    assert dados["id"] == usuario.id
+    assert dados["funcao"] == "Técnica"
+
+
+def test_verificacao_nao_consulta_o_banco(app_db):
+    _, db, usuario = app_db
+    token = sessao_service.emitir_sessao(usuario)["token"]
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        for _ in range(100):
+            assert sessao_service.verificar_token(token)[0] is None
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    assert consultas == []
+
+
+def test_token_adulterado(app_db):
+    _, _, usuario = app_db
+    token = sessao_service.emitir_sessao(usuario)["token"]
+    assert sessao_service.verificar_token(token[:-2] + "xx") == ("Sessão inválida", None)
+
+
+def test_token_expirado(app_db):
+    flask_app, _, usuario = app_db
+    token = sessao_service.emitir_sessao(usuario)["token"]
+    flask_app.config["SESSAO_DURACAO"] = -1
+    assert sessao_service.verificar_token(token) == ("Sessão expirada", None)
+
+
+def test_renovar_revoga_o_token_antigo(app_db):
+    _, _, usuario = app_db
+    antigo = sessao_service.emitir_sessao(usuario)["token"]
+    _, dados = sessao_service.verificar_token(antigo)
+
+    erro, nova = sessao_service.renovar_sessao(dados)
+    assert erro is None
+    assert sessao_service.verificar_token(nova["token"])[0] is None
+    assert sessao_service.verificar_token(antigo) == ("Sessão encerrada", None)
+
+
+def test_revogacao_sobrevive_a_novo_processo(app_db):
+    _, _, usuario = app_db
+    token = sessao_service.emitir_sessao(usuario)["token"]
+    _, dados = sessao_service.verificar_token(token)
+    assert sessao_service.encerrar_sessao(dados) is None
+
+    # Processo novo: memória vazia, lista recarregada da tabela
+    sessao_service._revogadas.clear()
+    assert sessao_service.verificar_token(token)[0] is None
+    sessao_service.carregar_revogadas()
+    assert sessao_service.verificar_token(token) == ("Sessão encerrada", None)
+
+
+def test_revogacao_recebida_de_outro_processo(app_db):
+    import json
+    import time
+    from app.utils import invalidacao
+
+    _, _, usuario = app_db
+    token = sessao_service.emitir_sessao(usuario)["token"]
+    _, dados = sessao_service.verificar_token(token)
+
+    invalidacao.tratar_aviso(json.dumps({
+        "origem": "outro", "revogadas": {dados["jti"]: time.time() + 60}}))
+    assert sessao_service.verificar_token(token) == ("Sessão encerrada", None)
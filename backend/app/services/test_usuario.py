@@ -50,6 +50,23 @@ def test_cria_usuario_sucesso(mock_usuario, mock_db):
     assert user == novo_user
 
 
+@patch("app.services.usuario.db")
+@patch("app.services.usuario.Usuario")
+def test_cria_usuario_fila_de_senhas_cheia(mock_usuario, mock_db):
+    from app.utils.senhas import SenhasOcupadas
+
+    mock_usuario.query.filter_by.return_value.first.return_value = None
+    mock_usuario.return_value.set_senha.side_effect = SenhasOcupadas()
+
+    erro, user = usuario.cria_usuario({
+        "nome": "João", "email": "joao@test.com", "funcao": "Técnico", "setor": "Manutenção", "senha": "1234"
+    })
+
+    assert erro == usuario.ERRO_OCUPADO
+    assert user is None
+    mock_db.session.commit.assert_not_called()
+
+
 @patch("app.services.usuario.Usuario")
 def test_cria_usuario_email_existente(mock_usuario):
     mock_usuario.query.filter_by.return_value.first.return_value = True
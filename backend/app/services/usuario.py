@@ -1,4 +1,8 @@
 from app.models.models import Usuario, db
+from app.utils import cache
+from app.utils.senhas import SenhasOcupadas
+
+ERRO_OCUPADO = "Servidor ocupado, tente novamente em instantes"
 
 
 def listar_usuarios():
@@ -19,11 +23,15 @@ def cria_usuario(data):
         funcao=data["funcao"],
         setor=data["setor"]
     )
-    novo.set_senha(data["senha"])
+    try:
+        novo.set_senha(data["senha"])
+    except SenhasOcupadas:
+        return ERRO_OCUPADO, None
 
     try:
         db.session.add(novo)
         db.session.commit()
+        cache.invalidar("usuario")
         return None, novo
     except Exception as e:
         db.session.rollback()
@@ -41,10 +49,15 @@ def atualiza_usuario(usuario_id, data):
     usuario.setor = data.get("setor", usuario.setor)
 
     if "senha" in data:
-        usuario.set_senha(data["senha"])
+        try:
+            usuario.set_senha(data["senha"])
+        except SenhasOcupadas:
+            db.session.rollback()
+            return ERRO_OCUPADO
 
     try:
         db.session.commit()
+        cache.invalidar("usuario")
         return None
     except Exception as e:
         db.session.rollback()
@@ -59,6 +72,7 @@ def deleta_usuario(usuario_id):
     try:
         db.session.delete(usuario)
         db.session.commit()
+        cache.invalidar("usuario")
         return None
     except Exception as e:
         db.session.rollback()
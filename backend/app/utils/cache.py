@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Cache em memória do processo para resultados derivados do banco. Cada
+# entrada declara as tabelas de que depende; os serviços de escrita chamam
+# invalidar() depois do commit e as entradas dependentes são descartadas.
+# O tamanho é limitado (descarta a menos usada) e cada entrada expira após
+# TTL_SEGUNDOS, o que cobre escritas feitas por outros processos.
+
+MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "256"))
+TTL_SEGUNDOS = float(os.getenv("CACHE_TTL_SEGUNDOS", "300"))
+
+_lock = threading.Lock()
+_entradas = OrderedDict()
+# Contadores locais de escritas por tabela: só detectam escrita durante a
+# carga de uma entrada (guardar)
+_versoes = {}
+_estatisticas = {"acertos": 0, "falhas": 0, "descartes": 0}
+
+# Versões das tabelas compartilhadas entre processos (tabela versao_cache no
+# Postgres, ver app/utils/invalidacao.py). Com elas o ETag é o mesmo em todos
+# os workers e instâncias. None enquanto não foram carregadas (ou sem
+# Postgres): o ETag usa os contadores locais e o identificador abaixo, que
+# evita coincidir por acaso com o de outro processo
+_compartilhadas = None
+_instancia = uuid.uuid4().hex[:8]
+
+# Avisa outros processos das invalidações e devolve as versões
+# compartilhadas, ou None se não conseguiu (ver app/utils/invalidacao.py)
+_publicar = None
+
+
+def _versao(tabelas):
+    return tuple(_versoes.get(t, 0) for t in tabelas)
+
+
+def buscar(chave, tabelas):
+    # Devolve (valor, versao); valor é None se não há entrada válida. A
+    # versão deve ser repassada a guardar() depois de carregar o valor.
+    tabelas = tuple(tabelas)
+    with _lock:
+        entrada = _entradas.get(chave)
+        if entrada is not None:
+            _, expira_em, valor = entrada
+            if expira_em > time.monotonic():
+                _entradas.move_to_end(chave)
+                _estatisticas["acertos"] += 1
+                return valor, None
+            del _entradas[chave]
+        _estatisticas["falhas"] += 1
+        return None, _versao(tabelas)
+
+
+def guardar(chave, tabelas, versao, valor):
+    tabelas = tuple(tabelas)
+    with _lock:
+        # Se alguma escrita aconteceu enquanto carregávamos, o valor pode já
+        # estar velho: não guarda
+        if _versao(tabelas) != versao:
+            return
+        _entradas[chave] = (frozenset(tabelas), time.monotonic() + TTL_SEGUNDOS, valor)
+        _entradas.move_to_end(chave)
+        while len(_entradas) > MAX_ENTRADAS:
+            _entradas.popitem(last=False)
+            _estatisticas["descartes"] += 1
+
+
+def obter(chave, tabelas, carregar):
+    valor, versao = buscar(chave, tabelas)
+    if versao is None:
+        return valor
+    valor = carregar()
+    guardar(chave, tabelas, versao, valor)
+    return valor
+
+
+def _descartar(tabelas):
+    # Chamar com _lock
+    for tabela in tabelas:
+        _versoes[tabela] = _versoes.get(tabela, 0) + 1
+    alteradas = set(tabelas)
+    for chave in [c for c, (deps, _, _) in _entradas.items() if deps & alteradas]:
+        del _entradas[chave]
+
+
+def invalidar(*tabelas, propagar=True):
+    global _compartilhadas
+    with _lock:
+        _descartar(tabelas)
+    if propagar and _publicar is not None:
+        versoes = _publicar(tabelas)
+        if versoes is None:
+            # A versão compartilhada não avançou: até a próxima publicação
+            # que der certo, ETags só deste processo (nunca um 304 errado)
+            with _lock:
+                _compartilhadas = None
+                _instancia_nova()
+        else:
+            aplicar_versoes(versoes, completas=True)
+
+
+def aplicar_versoes(versoes, completas=False):
+    # versoes: {tabela: versão compartilhada}. As versões só crescem, então
+    # vale sempre a maior. completas=True quando são todas as tabelas (ex.:
+    # lidas do banco), o que permite passar a usá-las no ETag
+    global _compartilhadas
+    with _lock:
+        if _compartilhadas is None and not completas:
+            _descartar(versoes)
+            return
+        atuais = _compartilhadas or {}
+        novas = {t: v for t, v in versoes.items() if v > atuais.get(t, 0)}
+        _descartar(novas)
+        _compartilhadas = {**atuais, **novas}
+
+
+def publicar_com(funcao):
+    global _publicar
+    _publicar = funcao
+
+
+def _instancia_nova():
+    global _instancia
+    _instancia = uuid.uuid4().hex[:8]
+
+
+def reiniciar(versoes=None):
+    # Esquece tudo, para quando avisos de outros processos podem ter sido
+    # perdidos. versoes: as compartilhadas relidas do banco; sem elas o ETag
+    # volta a ser só deste processo
+    global _compartilhadas
+    with _lock:
+        _entradas.clear()
+        _instancia_nova()
+        if versoes is None:
+            _compartilhadas = None
+        else:
+            atuais = _compartilhadas or {}
+            _compartilhadas = {t: max(v, atuais.get(t, 0)) for t, v in {**atuais, **versoes}.items()}
+
+
+def etag(*tabelas, extra=None):
+    # Muda sempre que alguma das tabelas é escrita. Deve ser calculado antes
+    # de consultar o banco: se uma escrita acontecer no meio, o cliente recebe
+    # dados novos com ETag velho e só perde um 304, nunca o contrário.
+    with _lock:
+        if _compartilhadas is not None:
+            partes = ["v", *(str(_compartilhadas.get(t, 0)) for t in tabelas)]
+        else:
+            partes = [_instancia, *map(str, _versao(tabelas))]
+    if extra:
+        partes.append(str(extra))
+    return "-".join(partes)
+
+
+def estatisticas():
+    with _lock:
+        consultas = _estatisticas["acertos"] + _estatisticas["falhas"]
+        return {
+            **_estatisticas,
+            "entradas": len(_entradas),
+            "max_entradas": MAX_ENTRADAS,
+            "ttl_segundos": TTL_SEGUNDOS,
+            "taxa_acerto": round(_estatisticas["acertos"] / consultas, 4) if consultas else None,
+        }
+
+
+def limpar():
+    global _compartilhadas
+    with _lock:
+        _entradas.clear()
+        _compartilhadas = None
+        for contador in _estatisticas:
+            _estatisticas[contador] = 0
@@ -0,0 +1,142 @@
+import itertools
+import os
+import threading
+import uuid
+from collections import deque
+from app.utils import invalidacao
+
+# Eventos para os clientes conectados em /eventos (Server-Sent Events). Os
+# serviços chamam emitir() depois do commit; cada processo guarda os últimos
+# eventos num histórico circular e acorda todos os fluxos abertos nele. Os
+# eventos emitidos em outros workers chegam pelo mesmo LISTEN/NOTIFY da
+# invalidação de cache.
+#
+# O id de cada evento é o mesmo em todos os processos, então um cliente que
+# reconecta (Last-Event-ID) em outro worker continua de onde parou. Se o id
+# já saiu do histórico, o cliente recebe "reset" e deve recarregar a tela.
+
+TAMANHO_HISTORICO = int(os.getenv("EVENTOS_HISTORICO", "500"))
+HEARTBEAT_SEGUNDOS = float(os.getenv("EVENTOS_HEARTBEAT_SEGUNDOS", "15"))
+# Cada fluxo aberto ocupa uma thread do worker (gthread); acima do limite o
+# cliente recebe 503 e volta a consultar periodicamente
+MAX_ASSINANTES = int(os.getenv("EVENTOS_MAX_ASSINANTES", "100"))
+
+# Enviado no lugar dos eventos perdidos: o cliente recarrega o estado
+RESET = {"id": None, "tipo": "reset", "dados": {}}
+
+
+class LimiteAssinantes(Exception):
+    pass
+
+
+_condicao = threading.Condition()
+# (posição local, evento); a posição só cresce e ordena o histórico deste processo
+_historico = deque(maxlen=TAMANHO_HISTORICO)
+_posicoes = itertools.count(1)
+_ultima_posicao = 0
+_assinantes = 0
+
+
+def _guardar(evento):
+    global _ultima_posicao
+    with _condicao:
+        _ultima_posicao = next(_posicoes)
+        _historico.append((_ultima_posicao, evento))
+        _condicao.notify_all()
+
+
+def _novo_id():
+    # Aleatório: workers criados por fork não podem repetir ids
+    return uuid.uuid4().hex[:16]
+
+
+def cabe_no_aviso(tipo, dados):
+    # Se o evento chega inteiro aos outros processos (limite do NOTIFY)
+    return invalidacao.cabe(evento={"id": _novo_id(), "tipo": tipo, "dados": dados})
+
+
+def emitir(tipo, dados):
+    evento = {"id": _novo_id(), "tipo": tipo, "dados": dados}
+    _guardar(evento)
+    if invalidacao.cabe(evento=evento):
+        invalidacao.publicar(evento=evento)
+    else:
+        # Não passa pelo NOTIFY: nos outros processos, com o mesmo id, vira
+        # "reset" e os clientes recarregam
+        invalidacao.publicar(evento={**RESET, "id": evento["id"]})
+    return evento
+
+
+def receber(evento):
+    # Evento emitido por outro processo
+    if isinstance(evento, dict) and {"id", "tipo", "dados"} <= evento.keys():
+        _guardar(evento)
+
+
+def reiniciar():
+    # Avisos de outros processos podem ter se perdido (ouvinte reconectou):
+    # os clientes deste processo recarregam o estado
+    _guardar({**RESET, "id": _novo_id()})
+
+
+def _posicao_apos(ultimo_id):
+    # Posição de onde o fluxo começa; None se o id não está no histórico
+    if not ultimo_id:
+        return _ultima_posicao
+    for posicao, evento in _historico:
+        if evento["id"] == ultimo_id:
+            return posicao
+    return None
+
+
+def assinar(ultimo_id=None, parar=None):
+    # Gerador de eventos para um cliente: cada item é um evento ou None
+    # (heartbeat, nada aconteceu em HEARTBEAT_SEGUNDOS). O primeiro item sai
+    # na hora (None, ou "reset" se o Last-Event-ID não está no histórico);
+    # nele o gerador levanta LimiteAssinantes se o processo já tem
+    # MAX_ASSINANTES fluxos abertos.
+    global _assinantes
+    with _condicao:
+        if _assinantes >= MAX_ASSINANTES:
+            raise LimiteAssinantes()
+        _assinantes += 1
+        posicao = _posicao_apos(ultimo_id)
+        perdido = posicao is None
+        if perdido:
+            posicao = _ultima_posicao
+    try:
+        yield RESET if perdido else None
+        while parar is None or not parar.is_set():
+            with _condicao:
+                _condicao.wait_for(lambda: _ultima_posicao > posicao, timeout=HEARTBEAT_SEGUNDOS)
+                novos = [(p, e) for p, e in _historico if p > posicao]
+                atrasado = bool(novos) and novos[0][0] > posicao + 1
+                posicao = _ultima_posicao
+            if atrasado:
+                # Cliente lento: eventos saíram do histórico antes de serem lidos
+                yield RESET
+            elif not novos:
+                yield None
+            else:
+                for _, evento in novos:
+                    yield evento
+    finally:
+        with _condicao:
+            _assinantes -= 1
+
+
+def estatisticas():
+    with _condicao:
+        return {"assinantes": _assinantes, "max_assinantes": MAX_ASSINANTES,
+                "historico": len(_historico), "ultimo_id": _historico[-1][1]["id"] if _historico else None}
+
+
+def limpar():
+    global _ultima_posicao
+    with _condicao:
+        _historico.clear()
+        _ultima_posicao = next(_posicoes)
+
+
+invalidacao.ao_receber("evento", receber)
+invalidacao.ao_reconectar("eventos", reiniciar)
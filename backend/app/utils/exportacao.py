@@ -0,0 +1,148 @@
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# Geradores de arquivos de exportação. Recebem iteráveis de linhas e devolvem
+# os bytes em pedaços, sem montar o arquivo inteiro em memória.
+
+LINHAS_POR_PEDACO = 500
+
+_CARACTERES_INVALIDOS_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class _Saida(io.RawIOBase):
+    # Destino de escrita que acumula os bytes até serem retirados pelo gerador
+
+    def __init__(self):
+        self.partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def retirar(self):
+        dados = b"".join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+def gerar_csv(cabecalho, linhas):
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+
+    # BOM para o Excel reconhecer UTF-8
+    saida.write("\ufeff")
+    escritor.writerow(cabecalho)
+    for i, linha in enumerate(linhas, 1):
+        escritor.writerow(linha)
+        if i % LINHAS_POR_PEDACO == 0:
+            yield saida.getvalue().encode("utf-8")
+            saida.seek(0)
+            saida.truncate()
+    yield saida.getvalue().encode("utf-8")
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{planilhas}'
+    '</Types>'
+)
+_PLANILHA_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{planilhas}</sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{planilhas}'
+    '</Relationships>'
+)
+_PLANILHA_REL = (
+    '<Relationship Id="rId{n}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{n}.xml"/>'
+)
+_PLANILHA_INICIO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_PLANILHA_FIM = '</sheetData></worksheet>'
+
+
+def _coluna(indice):
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celula(ref, valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c r="{ref}"><v>{valor}</v></c>'
+    texto = escape(_CARACTERES_INVALIDOS_XML.sub("", str(valor)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xml(numero, valores):
+    celulas = "".join(_celula(f"{_coluna(i)}{numero}", v) for i, v in enumerate(valores))
+    return f'<row r="{numero}">{celulas}</row>'
+
+
+def gerar_xlsx(planilhas):
+    # planilhas: lista de (nome, cabecalho, linhas). Gera um .xlsx mínimo
+    # (strings inline, sem estilos). Como o zip é escrito num destino não
+    # pesquisável, cada arquivo interno usa data descriptor e os bytes
+    # comprimidos podem ser enviados assim que ficam prontos.
+    saida = _Saida()
+    with zipfile.ZipFile(saida, "w", zipfile.ZIP_DEFLATED) as arquivo:
+        numeros = range(1, len(planilhas) + 1)
+        arquivo.writestr("[Content_Types].xml", _CONTENT_TYPES.format(
+            planilhas="".join(_PLANILHA_CONTENT_TYPE.format(n=n) for n in numeros)))
+        arquivo.writestr("_rels/.rels", _RELS)
+        arquivo.writestr("xl/workbook.xml", _WORKBOOK.format(planilhas="".join(
+            f'<sheet name="{escape(nome[:31], {chr(34): "&quot;"})}" sheetId="{n}" r:id="rId{n}"/>'
+            for n, (nome, _, _) in zip(numeros, planilhas))))
+        arquivo.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS.format(
+            planilhas="".join(_PLANILHA_REL.format(n=n) for n in numeros)))
+        yield saida.retirar()
+
+        for n, (_, cabecalho, linhas) in zip(numeros, planilhas):
+            with arquivo.open(f"xl/worksheets/sheet{n}.xml", "w") as planilha:
+                planilha.write(_PLANILHA_INICIO.encode("utf-8"))
+                planilha.write(_linha_xml(1, cabecalho).encode("utf-8"))
+                for i, linha in enumerate(linhas, 2):
+                    planilha.write(_linha_xml(i, linha).encode("utf-8"))
+                    if i % LINHAS_POR_PEDACO == 0:
+                        yield saida.retirar()
+                planilha.write(_PLANILHA_FIM.encode("utf-8"))
+            yield saida.retirar()
+    yield saida.retirar()
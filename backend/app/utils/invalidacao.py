@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from sqlalchemy import func, select as sql_select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import make_url
+from app.models.models import VersaoCache
+from app.utils import cache
+
+# Propaga invalidações do cache entre processos (workers do gunicorn,
+# instâncias no Render) pelo LISTEN/NOTIFY do Postgres. Cada escrita que
+# chama cache.invalidar() publica as tabelas no canal; uma thread em cada
+# processo escuta o canal e invalida o próprio cache. Não há servidor de
+# cache separado: o banco que já recebeu a escrita avisa os demais.
+#
+# Os ETags saem das versões em versao_cache, incrementadas na mesma
+# transação do NOTIFY e levadas no aviso: um If-None-Match recebe 304 em
+# qualquer worker, não só no que gerou o ETag.
+#
+# O mesmo canal leva outros avisos entre processos: cada campo do aviso tem
+# um tratador registrado com ao_receber() (ex.: sessões revogadas).
+
+CANAL = "cache_invalidacao"
+ESPERA_MAXIMA = 30
+# O payload do NOTIFY precisa ter menos de 8000 bytes
+LIMITE_AVISO = 8000
+
+log = logging.getLogger(__name__)
+
+# Identifica este processo para ignorar os próprios avisos
+_origem = uuid.uuid4().hex
+_ouvinte = None
+_engine = None
+
+_tratadores = {
+    "versoes": cache.aplicar_versoes,
+}
+# Chamados quando o ouvinte reconecta, já que avisos podem ter se perdido.
+# O cache é ressincronizado pelo próprio ouvinte, com as versões do banco
+_ao_reconectar = {}
+
+
+def ao_receber(campo, funcao):
+    _tratadores[campo] = funcao
+
+
+def ao_reconectar(nome, funcao):
+    _ao_reconectar[nome] = funcao
+
+
+def _payload(dados):
+    return json.dumps({"origem": _origem, **dados})
+
+
+def cabe(**dados):
+    # Se o aviso com esses dados passa pelo NOTIFY
+    return len(_payload(dados).encode()) < LIMITE_AVISO
+
+
+def publicar(**dados):
+    # Sem Postgres (ou antes de iniciar) só existe este processo: nada a avisar
+    if _engine is None:
+        return
+    payload = _payload(dados)
+    if len(payload.encode()) >= LIMITE_AVISO:
+        log.error("Aviso entre processos com %d bytes não cabe no NOTIFY", len(payload.encode()))
+        return
+    try:
+        # Conexão própria e curta: o commit da escrita já aconteceu, então o
+        # aviso não pode depender (nem atrapalhar) a sessão do request
+        with _engine.begin() as conn:
+            conn.execute(sql_select(func.pg_notify(CANAL, payload)))
+    except Exception:
+        # Os outros processos ficam velhos até o TTL, mas a escrita vale
+        log.exception("Falha ao publicar aviso entre processos")
+
+
+def _ler_versoes(conn):
+    return dict(conn.execute(sql_select(VersaoCache.tabela, VersaoCache.versao)).all())
+
+
+def publicar_tabelas(tabelas):
+    # Incrementa as versões das tabelas e avisa os outros processos numa só
+    # transação: quem recebe o aviso já encontra a versão nova no banco.
+    # Devolve todas as versões, ou None se falhou
+    if _engine is None:
+        return None
+    try:
+        with _engine.begin() as conn:
+            novas = dict(conn.execute(
+                insert(VersaoCache)
+                .values([{"tabela": tabela, "versao": 1} for tabela in sorted(set(tabelas))])
+                .on_conflict_do_update(index_elements=[VersaoCache.tabela],
+                                       set_={"versao": VersaoCache.versao + 1})
+                .returning(VersaoCache.tabela, VersaoCache.versao)
+            ).all())
+            payload = json.dumps({"origem": _origem, "versoes": novas})
+            conn.execute(sql_select(func.pg_notify(CANAL, payload)))
+            return _ler_versoes(conn)
+    except Exception:
+        log.exception("Falha ao publicar invalidação entre processos")
+        return None
+
+
+def tratar_aviso(payload):
+    try:
+        aviso = json.loads(payload)
+    except ValueError:
+        return
+    if aviso.get("origem") == _origem:
+        return
+    for campo, valor in aviso.items():
+        if campo in _tratadores:
+            _tratadores[campo](valor)
+
+
+class _Ouvinte(threading.Thread):
+    def __init__(self, engine, url):
+        super().__init__(name="cache-invalidacao", daemon=True)
+        self.engine = engine
+        self.url = url
+        self.parar = threading.Event()
+        self.pronto = threading.Event()
+
+    def _conectar(self):
+        # Fora do pool: a conexão fica presa ao LISTEN enquanto o processo vive
+        cargs, cparams = self.engine.dialect.create_connect_args(self.url)
+        conn = self.engine.dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CANAL}")
+        return conn
+
+    def _sincronizar_cache(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT tabela, versao FROM versao_cache")
+                versoes = dict(cursor.fetchall())
+        except Exception:
+            # Sem a tabela (migração pendente): ETags só deste processo
+            log.exception("Falha ao ler versao_cache")
+            versoes = None
+        cache.reiniciar(versoes)
+
+    def run(self):
+        espera = 1
+        primeira = True
+        while not self.parar.is_set():
+            try:
+                conn = self._conectar()
+            except Exception:
+                log.exception("Falha ao conectar o ouvinte de invalidação")
+                self.parar.wait(espera)
+                espera = min(espera * 2, ESPERA_MAXIMA)
+                continue
+
+            # Versões lidas depois do LISTEN: nenhum aviso fica entre a
+            # leitura e o primeiro recebido
+            self._sincronizar_cache(conn)
+            if not primeira:
+                # Avisos enviados enquanto estava desconectado se perderam
+                for funcao in list(_ao_reconectar.values()):
+                    try:
+                        funcao()
+                    except Exception:
+                        log.exception("Falha ao ressincronizar após reconexão")
+            primeira = False
+            espera = 1
+            self.pronto.set()
+            try:
+                while not self.parar.is_set():
+                    if select.select([conn], [], [], 1) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        tratar_aviso(conn.notifies.pop(0).payload)
+            except Exception:
+                log.exception("Ouvinte de invalidação desconectado")
+                self.pronto.clear()
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def iniciar(app):
+    # Liga a propagação quando o banco é Postgres. Threads não sobrevivem ao
+    # fork, então um worker criado depois de iniciar() deve chamá-lo de novo
+    # (o gunicorn com preload faz isso no post_fork).
+    global _ouvinte, _origem, _engine
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "postgresql" or not app.config.get("CACHE_NOTIFY", True):
+        return None
+
+    if _ouvinte is not None and _ouvinte.pid == os.getpid() and _ouvinte.is_alive():
+        return _ouvinte
+
+    url = engine.url
+    if app.config.get("DATABASE_LISTEN_URL"):
+        url = make_url(app.config["DATABASE_LISTEN_URL"])
+    elif app.config.get("DB_PGBOUNCER"):
+        # No pool por transação o LISTEN se perderia; sem endereço direto,
+        # cada processo fica só com o TTL do cache
+        log.warning("DB_PGBOUNCER sem DATABASE_LISTEN_URL: invalidação entre processos desligada")
+        return None
+
+    # Processo filho herda a origem do pai; gera outra para não ignorar os
+    # avisos dos irmãos
+    _origem = uuid.uuid4().hex
+    cache.reiniciar()
+    _engine = engine
+    cache.publicar_com(publicar_tabelas)
+    _ouvinte = _Ouvinte(engine, url)
+    _ouvinte.pid = os.getpid()
+    _ouvinte.start()
+    return _ouvinte
+
+
+def parar():
+    global _ouvinte, _engine
+    cache.publicar_com(None)
+    _engine = None
+    if _ouvinte is not None:
+        _ouvinte.parar.set()
+        _ouvinte.join(timeout=10)
+        _ouvinte = None
@@ -1,8 +1,154 @@
-from flask import Response
+import os
+from datetime import date
+from decimal import Decimal
+from functools import wraps
+from flask import Response, make_response, request, stream_with_context
+from app.utils import cache
 import json
 
-def json_unicode(data, status=200):
-    return Response(
-        json.dumps(data, ensure_ascii=False),
-        content_type="application/json"
-    ), status
+# Codificador JSON: orjson quando instalado (bem mais rápido e já devolve
+# bytes), json da biblioteca padrão como alternativa. JSON_CODIFICADOR=json
+# força a biblioteca padrão.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+if os.getenv("JSON_CODIFICADOR") == "json":
+    orjson = None
+
+TAMANHO_PEDACO = 64 * 1024
+
+
+def _padrao(valor):
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_padrao, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_padrao).encode("utf-8")
+
+
+def json_unicode(data, status=200, etag=None):
+    resposta = Response(dumps(data), content_type="application/json")
+    if etag:
+        _marcar_etag(resposta, etag)
+    return resposta, status
+
+
+def json_fluxo(itens, status=200):
+    # Lista JSON codificada item a item e enviada em pedaços, sem montar a
+    # lista nem o texto inteiro em memória. Um erro no meio da iteração
+    # interrompe a resposta (o status 200 já foi enviado).
+    def gerar():
+        partes = [b"["]
+        tamanho = 1
+        separador = b""
+        for item in itens:
+            parte = separador + dumps(item)
+            separador = b","
+            partes.append(parte)
+            tamanho += len(parte)
+            if tamanho >= TAMANHO_PEDACO:
+                yield b"".join(partes)
+                partes.clear()
+                tamanho = 0
+        partes.append(b"]")
+        yield b"".join(partes)
+
+    return Response(stream_with_context(gerar()), content_type="application/json"), status
+
+
+def fluxo_sse(eventos, retry_ms=3000):
+    # Server-Sent Events: cada evento ({"id", "tipo", "dados"}) vira um bloco
+    # id/event/data; None vira um comentário (heartbeat), que também revela
+    # ao servidor uma conexão já fechada pelo cliente. Sem stream_with_context
+    # de propósito: o fluxo dura horas e não deve prender o contexto nem a
+    # sessão do banco.
+    def gerar():
+        try:
+            yield f"retry: {retry_ms}\n\n".encode()
+            for evento in eventos:
+                if evento is None:
+                    yield b": ping\n\n"
+                    continue
+                partes = [f"id: {evento['id']}\n".encode()] if evento.get("id") else []
+                partes.append(f"event: {evento['tipo']}\n".encode())
+                partes.append(b"data: " + dumps(evento["dados"]) + b"\n\n")
+                yield b"".join(partes)
+        finally:
+            # Cliente desconectou: libera a vaga do assinante na hora
+            if hasattr(eventos, "close"):
+                eventos.close()
+
+    resposta = Response(gerar(), content_type="text/event-stream")
+    resposta.headers["Cache-Control"] = "no-cache"
+    # nginx/proxies não devem segurar os eventos em buffer
+    resposta.headers["X-Accel-Buffering"] = "no"
+    return resposta
+
+
+def _marcar_etag(resposta, etag):
+    resposta.set_etag(etag)
+    # O cliente pode guardar, mas deve revalidar a cada uso
+    resposta.headers["Cache-Control"] = "no-cache"
+
+
+def nao_modificado(etag):
+    # 304 se o If-None-Match do cliente já tem essa versão; senão None
+    if request.if_none_match.contains_weak(etag):
+        resposta = Response(status=304)
+        _marcar_etag(resposta, etag)
+        return resposta
+    return None
+
+
+def resposta_em_cache(*tabelas, extra=None):
+    # Para GETs de listagem que dependem só de tabelas e da query string:
+    # responde 304 pelo ETag e guarda o JSON já serializado por URL, até uma
+    # escrita em alguma das tabelas. extra() entra no ETag e na chave (ex.: a
+    # data, para respostas que mudam com o dia).
+    def decorador(view):
+        @wraps(view)
+        def envoltorio(*args, **kwargs):
+            complemento = extra() if extra else None
+            etag = cache.etag(*tabelas, extra=complemento)
+            resposta = nao_modificado(etag)
+            if resposta:
+                return resposta
+
+            chave = ("resposta", request.path, tuple(sorted(request.args.items(multi=True))), complemento)
+            corpo, versao = cache.buscar(chave, tabelas)
+            if versao is None:
+                resposta = Response(corpo, content_type="application/json")
+                _marcar_etag(resposta, etag)
+                return resposta
+
+            resposta = make_response(view(*args, **kwargs))
+            # Erros não são guardados nem recebem ETag
+            if resposta.status_code == 200 and resposta.is_json:
+                if resposta.is_streamed:
+                    resposta.response = _guardar_ao_final(resposta.response, chave, tabelas, versao)
+                else:
+                    cache.guardar(chave, tabelas, versao, resposta.get_data())
+                _marcar_etag(resposta, etag)
+            return resposta
+        return envoltorio
+    return decorador
+
+
+def _guardar_ao_final(pedacos, chave, tabelas, versao):
+    # Repassa os pedaços ao cliente e guarda o corpo só se o fluxo terminou
+    corpo = []
+    try:
+        for pedaco in pedacos:
+            corpo.append(pedaco)
+            yield pedaco
+        cache.guardar(chave, tabelas, versao, b"".join(corpo))
+    finally:
+        if hasattr(pedacos, "close"):
+            pedacos.close()
@@ -0,0 +1,42 @@
+import json
+import threading
+from werkzeug.wsgi import ClosingIterator
+
+# Com gthread o worker tem um único conjunto de threads: as threads a mais
+# para os fluxos de /eventos (gunicorn.conf.py) também pegariam requisições
+# comuns, que disputariam o pool do banco e falhariam com 500 por
+# pool_timeout. Este middleware deixa no máximo `limite` requisições comuns
+# rodando ao mesmo tempo; as outras esperam vaga até `espera` segundos e
+# depois recebem 503. A vaga só é devolvida quando a resposta termina de ser
+# enviada, incluindo as exportações em streaming.
+
+
+class LimiteRequisicoes:
+    def __init__(self, app, limite, espera=30, livres=("/eventos",)):
+        self.app = app
+        self.limite = limite
+        self.espera = espera
+        self.livres = set(livres)
+        self.vagas = threading.BoundedSemaphore(limite)
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") in self.livres:
+            return self.app(environ, start_response)
+        if not self.vagas.acquire(timeout=self.espera):
+            return _ocupado(start_response)
+        try:
+            resposta = self.app(environ, start_response)
+        except BaseException:
+            self.vagas.release()
+            raise
+        return ClosingIterator(resposta, self.vagas.release)
+
+
+def _ocupado(start_response):
+    corpo = json.dumps({"erro": "Servidor ocupado, tente novamente"}, ensure_ascii=False).encode()
+    start_response("503 SERVICE UNAVAILABLE", [
+        ("Content-Type", "application/json; charset=utf-8"),
+        ("Content-Length", str(len(corpo))),
+        ("Retry-After", "5"),
+    ])
+    return [corpo]
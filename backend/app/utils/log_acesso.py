@@ -0,0 +1,31 @@
+from urllib.parse import parse_qsl, urlencode
+from gunicorn.glogging import Logger
+
+# Log de acesso do gunicorn sem o token de sessão. O EventSource do navegador
+# não envia cabeçalhos, então /eventos recebe o token em ?token= e o formato
+# padrão (%(r)s) gravaria a linha da requisição com ele. Nas requisições a
+# /eventos a query string sai com o token mascarado em todos os átomos que a
+# carregam; o cabeçalho Authorization também nunca é gravado.
+
+MASCARA = "***"
+
+
+def mascarar_query(query):
+    pares = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(chave, MASCARA if chave == "token" else valor) for chave, valor in pares], safe="*")
+
+
+class LogAcesso(Logger):
+    def atoms(self, resp, req, environ, request_time):
+        atomos = super().atoms(resp, req, environ, request_time)
+        atomos.pop("{authorization}i", None)
+        query = environ.get("QUERY_STRING")
+        if environ.get("PATH_INFO") == "/eventos" and query:
+            query = mascarar_query(query)
+            uri = f"/eventos?{query}"
+            atomos["q"] = query
+            atomos["r"] = f"{environ['REQUEST_METHOD']} {uri} {environ['SERVER_PROTOCOL']}"
+            for chave, valor in (("query_string", query), ("raw_uri", uri), ("request_uri", uri)):
+                if f"{{{chave}}}e" in atomos:
+                    atomos[f"{{{chave}}}e"] = valor
+        return atomos
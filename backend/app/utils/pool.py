@@ -0,0 +1,115 @@
+import functools
+import logging
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Pool de conexões instrumentado: mede quanto cada checkout esperou (na fila
+# por uma conexão livre ou abrindo uma nova), o que mostra quando o pool está
+# pequeno ou o banco lento antes de virar timeout. Só usa API pública: um
+# invólucro em engine.connect cronometra a espera e os eventos do pool
+# (connect, checkout, checkin) contam conexões abertas e emprestadas. As
+# medidas são deste processo.
+
+log = logging.getLogger(__name__)
+
+ESPERA_ALERTA = 0.1
+
+_lock = threading.Lock()
+_medidas = {"checkouts": 0, "conexoes_abertas": 0, "esperas": 0, "espera_total": 0.0,
+            "espera_maxima": 0.0, "esperas_longas": 0, "falhas": 0}
+_ganchos = []
+_engine = None
+
+
+def ao_esperar(funcao):
+    # funcao(segundos) é chamada a cada checkout com o tempo de espera
+    _ganchos.append(funcao)
+
+
+def _contar(chave):
+    with _lock:
+        _medidas[chave] += 1
+
+
+def _registrar(espera, falhou=False):
+    with _lock:
+        if falhou:
+            _medidas["falhas"] += 1
+        else:
+            _medidas["esperas"] += 1
+            _medidas["espera_total"] += espera
+            _medidas["espera_maxima"] = max(_medidas["espera_maxima"], espera)
+        if espera >= ESPERA_ALERTA:
+            _medidas["esperas_longas"] += 1
+    if espera >= ESPERA_ALERTA:
+        log.warning("Checkout do pool esperou %.0f ms%s", espera * 1000, " (falhou)" if falhou else "")
+    for funcao in _ganchos:
+        funcao(espera)
+
+
+def instrumentar(engine):
+    # Os eventos ficam no engine e sobrevivem ao dispose() do post_fork, que
+    # troca o pool por um novo
+    global _engine
+    conectar = engine.connect
+
+    @functools.wraps(conectar)
+    def connect():
+        inicio = time.perf_counter()
+        try:
+            conexao = conectar()
+        except Exception:
+            _registrar(time.perf_counter() - inicio, falhou=True)
+            raise
+        _registrar(time.perf_counter() - inicio)
+        return conexao
+
+    engine.connect = connect
+    event.listen(engine, "connect", lambda *args: _contar("conexoes_abertas"))
+    event.listen(engine, "checkout", lambda *args: _contar("checkouts"))
+    _engine = engine
+    return engine
+
+
+def estatisticas():
+    with _lock:
+        medidas = dict(_medidas)
+    esperas = medidas["esperas"]
+    resultado = {
+        "checkouts": medidas["checkouts"],
+        "conexoes_abertas": medidas["conexoes_abertas"],
+        "falhas": medidas["falhas"],
+        "esperas_longas": medidas["esperas_longas"],
+        "espera_media_ms": round(medidas["espera_total"] / esperas * 1000, 3) if esperas else None,
+        "espera_maxima_ms": round(medidas["espera_maxima"] * 1000, 3),
+    }
+    pool = _engine.pool if _engine is not None else None
+    if isinstance(pool, QueuePool):
+        resultado.update({
+            "tamanho": pool.size(),
+            "em_uso": pool.checkedout(),
+            "livres": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+    return resultado
+
+
+def limpar():
+    with _lock:
+        for chave in _medidas:
+            _medidas[chave] = 0
+
+
+def statement_timeout_local(engine, milissegundos):
+    # Modo PgBouncer (pool por transação): parâmetros de sessão vazariam para
+    # outros clientes da mesma conexão do servidor, então o limite é aplicado
+    # em cada transação com SET LOCAL, direto no cursor do driver
+    @event.listens_for(engine, "begin")
+    def _limitar(conn):
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SET LOCAL statement_timeout = {int(milissegundos)}")
+        finally:
+            cursor.close()
@@ -0,0 +1,106 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from multiprocessing import get_context
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Hash de senha fora da thread do request. scrypt/pbkdf2 são lentos de
+# propósito; num pico de logins (troca de turno) rodar inline prende todos os
+# workers do gunicorn. Aqui o cálculo vai para um pool de processos limitado,
+# com fila máxima: quando ela enche, a chamada falha na hora (503) em vez de
+# acumular requests esperando.
+#
+# Configuração (app.config ou variáveis de ambiente):
+# - SENHA_METODO: método do werkzeug com o custo, ex. "scrypt:32768:8:1" ou
+#   "pbkdf2:sha256:600000". Hashes com outro método são refeitos no login.
+# - SENHA_WORKERS: processos do pool; 0 (padrão) calcula na própria thread.
+#   O perfil do gunicorn liga o pool. Scripts avulsos ficam sem ele: o
+#   spawn reimporta o __main__ de quem chamou.
+# - SENHA_FILA: cálculos em andamento + na fila por processo da aplicação.
+# - SENHA_TIMEOUT: segundos de espera por um cálculo.
+
+PADROES = {
+    "SENHA_METODO": "scrypt",
+    "SENHA_WORKERS": 0,
+    "SENHA_FILA": 8,
+    "SENHA_TIMEOUT": 10,
+}
+
+
+class SenhasOcupadas(Exception):
+    pass
+
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_vagas = None
+_prefixos = {}
+
+
+def _config(chave):
+    if has_app_context() and chave in current_app.config:
+        return current_app.config[chave]
+    valor = os.getenv(chave)
+    if valor is None:
+        return PADROES[chave]
+    return valor if chave == "SENHA_METODO" else int(valor)
+
+
+def _executor():
+    # Um pool por processo: depois de um fork o pool herdado não serve
+    global _pool, _pool_pid, _vagas
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: os processos do pool não herdam threads nem conexões
+            _pool = ProcessPoolExecutor(
+                max_workers=_config("SENHA_WORKERS"), mp_context=get_context("spawn"))
+            _pool_pid = os.getpid()
+            _vagas = threading.BoundedSemaphore(_config("SENHA_FILA"))
+        return _pool, _vagas
+
+
+def _executar(funcao, *args):
+    if not _config("SENHA_WORKERS"):
+        return funcao(*args)
+
+    pool, vagas = _executor()
+    if not vagas.acquire(blocking=False):
+        raise SenhasOcupadas()
+    try:
+        futuro = pool.submit(funcao, *args)
+    except Exception:
+        vagas.release()
+        raise
+    futuro.add_done_callback(lambda _: vagas.release())
+    try:
+        return futuro.result(timeout=_config("SENHA_TIMEOUT"))
+    except TimeoutError:
+        raise SenhasOcupadas()
+
+
+def gerar_hash(senha):
+    return _executar(generate_password_hash, senha, _config("SENHA_METODO"))
+
+
+def verificar(senha_hash, senha):
+    return _executar(check_password_hash, senha_hash, senha)
+
+
+def precisa_rehash(senha_hash):
+    # Compara o método/custo gravado no hash ("metodo$sal$hash") com o atual
+    metodo = _config("SENHA_METODO")
+    if metodo not in _prefixos:
+        # "scrypt" vira "scrypt:32768:8:1" etc.; o jeito seguro de saber é
+        # gerar um hash (uma vez por método)
+        _prefixos[metodo] = generate_password_hash("", metodo).split("$", 1)[0]
+    return senha_hash.split("$", 1)[0] != _prefixos[metodo]
+
+
+def encerrar():
+    global _pool
+    with _lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,122 @@
+from app.utils import cache
+
+
+def setup_function():
+    cache.limpar()
+
+
+def test_obter_carrega_uma_vez():
+    chamadas = []
+
+    def carregar():
+        chamadas.append(1)
+        return {"total": 1}
+
+    assert cache.obter("x", ("peca",), carregar) == {"total": 1}
+    assert cache.obter("x", ("peca",), carregar) == {"total": 1}
+    assert len(chamadas) == 1
+
+
+def test_invalidar_descarta_apenas_dependentes():
+    cache.obter("pecas", ("peca",), lambda: 1)
+    cache.obter("usuarios", ("usuario",), lambda: 2)
+
+    cache.invalidar("peca")
+
+    assert cache.obter("pecas", ("peca",), lambda: 10) == 10
+    assert cache.obter("usuarios", ("usuario",), lambda: 20) == 2
+
+
+def test_escrita_durante_carga_nao_e_guardada():
+    def carregar():
+        cache.invalidar("peca")
+        return "velho"
+
+    assert cache.obter("pecas", ("peca",), carregar) == "velho"
+    assert cache.obter("pecas", ("peca",), lambda: "novo") == "novo"
+
+
+def test_etag_acompanha_versoes():
+    antes = cache.etag("peca", "estoque")
+    assert cache.etag("peca", "estoque") == antes
+    assert cache.etag("peca", "estoque", extra="2025-01-01") != antes
+
+    cache.invalidar("usuario")
+    assert cache.etag("peca", "estoque") == antes
+
+    cache.invalidar("estoque")
+    assert cache.etag("peca", "estoque") != antes
+
+
+def test_etag_com_versoes_compartilhadas_igual_entre_processos():
+    cache.reiniciar({"peca": 3, "estoque": 7})
+    etag = cache.etag("peca", "estoque")
+    assert etag == "v-3-7"
+
+    # Outro processo escreveu em estoque; aviso repetido ou atrasado não volta
+    cache.aplicar_versoes({"estoque": 8})
+    cache.aplicar_versoes({"estoque": 6})
+    assert cache.etag("peca", "estoque") == "v-3-8"
+
+
+def test_versoes_parciais_nao_bastam_para_etag_compartilhado():
+    cache.obter("pecas", ("peca",), lambda: "velho")
+    cache.aplicar_versoes({"peca": 4})
+    assert not cache.etag("peca").startswith("v-")
+    assert cache.obter("pecas", ("peca",), lambda: "novo") == "novo"
+
+
+def test_publicacao_devolve_versoes_do_banco():
+    cache.reiniciar({"peca": 1})
+    cache.publicar_com(lambda tabelas: {"peca": 2, "usuario": 5})
+    try:
+        cache.invalidar("peca")
+    finally:
+        cache.publicar_com(None)
+    assert cache.etag("peca", "usuario") == "v-2-5"
+
+
+def test_falha_ao_publicar_volta_ao_etag_do_processo():
+    cache.reiniciar({"peca": 1})
+    antes = cache.etag("peca")
+    cache.publicar_com(lambda tabelas: None)
+    try:
+        cache.invalidar("peca")
+    finally:
+        cache.publicar_com(None)
+    depois = cache.etag("peca")
+    assert depois != antes and not depois.startswith("v-")
+
+
+def test_descarta_menos_usada_ao_passar_do_limite(monkeypatch):
+    monkeypatch.setattr(cache, "MAX_ENTRADAS", 2)
+    cache.obter("a", ("peca",), lambda: 1)
+    cache.obter("b", ("peca",), lambda: 2)
+    cache.obter("a", ("peca",), lambda: 10)
+    cache.obter("c", ("peca",), lambda: 3)
+
+    assert cache.obter("a", ("peca",), lambda: 10) == 1
+    assert cache.obter("b", ("peca",), lambda: 20) == 20
+    assert cache.estatisticas()["descartes"] == 2
+
+
+def test_entrada_expira_apos_ttl(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: agora[0])
+    cache.obter("x", ("peca",), lambda: "velho")
+
+    agora[0] += cache.TTL_SEGUNDOS - 1
+    assert cache.obter("x", ("peca",), lambda: "novo") == "velho"
+    agora[0] += 2
+    assert cache.obter("x", ("peca",), lambda: "novo") == "novo"
+
+
+def test_estatisticas_contam_acertos_e_falhas():
+    cache.obter("x", ("peca",), lambda: 1)
+    cache.obter("x", ("peca",), lambda: 1)
+    cache.obter("x", ("peca",), lambda: 1)
+
+    estatisticas = cache.estatisticas()
+    assert estatisticas["acertos"] == 2
+    assert estatisticas["falhas"] == 1
+    assert estatisticas["entradas"] == 1
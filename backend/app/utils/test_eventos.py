@@ -0,0 +1,92 @@
+import json
+import threading
+from collections import deque
+import pytest
+from app.utils import eventos, invalidacao
+
+
+def setup_function():
+    eventos.limpar()
+
+
+def _fluxo(monkeypatch, ultimo_id=None, heartbeat=0.05):
+    monkeypatch.setattr(eventos, "HEARTBEAT_SEGUNDOS", heartbeat)
+    fluxo = eventos.assinar(ultimo_id)
+    return fluxo, next(fluxo)
+
+
+def test_assinante_recebe_eventos_emitidos(monkeypatch):
+    fluxo, primeiro = _fluxo(monkeypatch)
+    assert primeiro is None
+    evento = eventos.emitir("ordem_criada", {"id": 7})
+    assert next(fluxo) == evento
+    # Nada novo: heartbeat
+    assert next(fluxo) is None
+    fluxo.close()
+
+
+def test_assinante_acordado_por_outra_thread(monkeypatch):
+    fluxo, _ = _fluxo(monkeypatch, heartbeat=5)
+    threading.Timer(0.05, eventos.emitir, ("ordem_excluida", {"id": 3})).start()
+    assert next(fluxo)["dados"] == {"id": 3}
+    fluxo.close()
+
+
+def test_retoma_depois_do_ultimo_id(monkeypatch):
+    primeiro = eventos.emitir("ordem_criada", {"id": 1})
+    segundo = eventos.emitir("ordem_atualizada", {"id": 1})
+    terceiro = eventos.emitir("ordem_excluida", {"id": 1})
+
+    fluxo, inicio = _fluxo(monkeypatch, ultimo_id=primeiro["id"])
+    assert inicio is None
+    assert [next(fluxo), next(fluxo)] == [segundo, terceiro]
+    fluxo.close()
+
+
+def test_id_desconhecido_pede_reset(monkeypatch):
+    fluxo, inicio = _fluxo(monkeypatch, ultimo_id="saiu-do-historico")
+    assert inicio["tipo"] == "reset"
+    fluxo.close()
+
+
+def test_assinante_atrasado_recebe_reset(monkeypatch):
+    monkeypatch.setattr(eventos, "_historico", deque(maxlen=2))
+    fluxo, _ = _fluxo(monkeypatch)
+    for i in range(3):
+        eventos.emitir("ordem_criada", {"id": i})
+    assert next(fluxo)["tipo"] == "reset"
+    fluxo.close()
+
+
+def test_limite_de_assinantes(monkeypatch):
+    monkeypatch.setattr(eventos, "MAX_ASSINANTES", 1)
+    fluxo, _ = _fluxo(monkeypatch)
+    with pytest.raises(eventos.LimiteAssinantes):
+        next(eventos.assinar())
+    assert eventos.estatisticas()["assinantes"] == 1
+    fluxo.close()
+    assert eventos.estatisticas()["assinantes"] == 0
+
+
+def test_evento_de_outro_processo_chega_aos_assinantes(monkeypatch):
+    fluxo, _ = _fluxo(monkeypatch)
+    evento = {"id": "abc", "tipo": "alerta_estoque", "dados": {"estoques": [1], "alertas": []}}
+    invalidacao.tratar_aviso(json.dumps({"origem": "outro", "evento": evento}))
+    assert next(fluxo) == evento
+    fluxo.close()
+
+
+def test_emitir_publica_para_outros_processos(monkeypatch):
+    publicados = []
+    monkeypatch.setattr(invalidacao, "publicar", lambda **dados: publicados.append(dados))
+    evento = eventos.emitir("ordem_criada", {"id": 9})
+    assert publicados == [{"evento": evento}]
+
+
+def test_evento_grande_demais_vira_reset_nos_outros_processos(monkeypatch):
+    publicados = []
+    monkeypatch.setattr(invalidacao, "publicar", lambda **dados: publicados.append(dados))
+    evento = eventos.emitir("alerta_estoque", {"alertas": ["x" * invalidacao.LIMITE_AVISO]})
+    # Este processo guarda o evento inteiro; os outros recebem reset
+    assert eventos._historico[-1][1] == evento
+    assert publicados == [{"evento": {"id": evento["id"], "tipo": "reset", "dados": {}}}]
@@ -0,0 +1,105 @@
+import json
+import os
+import time
+import pytest
+from app.utils import cache, invalidacao
+
+
+def setup_function():
+    cache.limpar()
+
+
+def test_aviso_de_outro_processo_invalida_local():
+    cache.reiniciar({"peca": 1})
+    cache.obter("pecas", ("peca",), lambda: "velho")
+
+    invalidacao.tratar_aviso(json.dumps({"origem": "outro", "versoes": {"peca": 2}}))
+
+    assert cache.obter("pecas", ("peca",), lambda: "novo") == "novo"
+    assert cache.etag("peca") == "v-2"
+
+
+def test_aviso_do_proprio_processo_e_ignorado():
+    cache.obter("pecas", ("peca",), lambda: "velho")
+    invalidacao.tratar_aviso(json.dumps({"origem": invalidacao._origem, "versoes": {"peca": 2}}))
+    assert cache.obter("pecas", ("peca",), lambda: "novo") == "velho"
+
+
+def test_aviso_invalido_e_ignorado():
+    invalidacao.tratar_aviso("não é json")
+
+
+def test_invalidar_publica_so_quando_propaga():
+    publicadas = []
+    cache.publicar_com(publicadas.append)
+    try:
+        cache.invalidar("peca", "estoque")
+        cache.invalidar("usuario", propagar=False)
+    finally:
+        cache.publicar_com(None)
+    assert publicadas == [("peca", "estoque")]
+
+
+def _esperar(condicao, limite=5):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if condicao():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                    reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+def test_notify_entre_processos(monkeypatch):
+    """Simula outro worker enviando NOTIFY e confere o aviso publicado por este."""
+    import psycopg2
+    from sqlalchemy import create_engine
+    from sqlalchemy.engine import make_url
+    from app import create_app
+    from app.models.models import VersaoCache
+
+    # A tabela precisa existir antes: create_app() já inicia o ouvinte
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    VersaoCache.__table__.drop(engine, checkfirst=True)
+    VersaoCache.__table__.create(engine)
+
+    monkeypatch.setenv("DATABASE_URL", os.environ["TEST_POSTGRES_URL"])
+
+    monkeypatch.setenv("SECRET_KEY", "chave-de-teste")
+    flask_app = create_app()
+    ouvinte = invalidacao.iniciar(flask_app)
+    try:
+        assert ouvinte.pronto.wait(5)
+        # Versões lidas do banco ao conectar: ETag igual ao dos outros workers
+        assert cache.etag("peca") == "v-0"
+
+        url = make_url(os.environ["TEST_POSTGRES_URL"])
+        outro = psycopg2.connect(url.set(drivername="postgresql").render_as_string(hide_password=False))
+        outro.autocommit = True
+        with outro.cursor() as cursor:
+            cursor.execute(f"LISTEN {invalidacao.CANAL}")
+
+            # Outro worker escreveu em peca
+            cache.obter("pecas", ("peca",), lambda: "velho")
+            cursor.execute("SELECT pg_notify(%s, %s)", (
+                invalidacao.CANAL, json.dumps({"origem": "outro", "versoes": {"peca": 1}})))
+            assert _esperar(lambda: cache.obter("pecas", ("peca",), lambda: "novo") == "novo")
+            assert cache.etag("peca") == "v-1"
+
+            # Escrita local incrementa a versão no banco e chega aos outros workers
+            with flask_app.app_context():
+                cache.invalidar("estoque")
+            assert cache.etag("estoque") == "v-1"
+            cursor.execute("SELECT versao FROM versao_cache WHERE tabela = 'estoque'")
+            assert cursor.fetchone() == (1,)
+
+            def recebido():
+                outro.poll()
+                return any(json.loads(n.payload)["versoes"] == {"estoque": 1} for n in outro.notifies)
+            assert _esperar(recebido)
+        outro.close()
+    finally:
+        invalidacao.parar()
+        VersaoCache.__table__.drop(engine, checkfirst=True)
+        engine.dispose()
@@ -0,0 +1,59 @@
+import json
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Flask
+from app.utils import json_response
+
+
+DADOS = {
+    "nome": "Manutenção ✓",
+    "data": date(2025, 1, 31),
+    "criado_em": datetime(2025, 1, 31, 8, 30),
+    "total": Decimal("12"),
+    "media": Decimal("1.5"),
+    "itens": [1, None, True],
+}
+
+
+@pytest.mark.parametrize("codificador", ["orjson", "json"])
+def test_dumps_mesmo_resultado_nos_dois_codificadores(monkeypatch, codificador):
+    if codificador == "json":
+        monkeypatch.setattr(json_response, "orjson", None)
+    elif json_response.orjson is None:
+        pytest.skip("orjson não instalado")
+
+    assert json.loads(json_response.dumps(DADOS)) == {
+        "nome": "Manutenção ✓",
+        "data": "2025-01-31",
+        "criado_em": "2025-01-31T08:30:00",
+        "total": 12,
+        "media": 1.5,
+        "itens": [1, None, True],
+    }
+
+
+def test_dumps_tipo_desconhecido():
+    with pytest.raises(TypeError):
+        json_response.dumps({"x": object()})
+
+
+def test_json_fluxo_envia_em_pedacos(monkeypatch):
+    monkeypatch.setattr(json_response, "TAMANHO_PEDACO", 100)
+    itens = [{"id": i, "nome": f"Peça {i}"} for i in range(50)]
+
+    app = Flask(__name__)
+    with app.test_request_context():
+        resposta, status = json_response.json_fluxo(iter(itens))
+        pedacos = list(resposta.response)
+
+    assert status == 200
+    assert len(pedacos) > 1
+    assert json.loads(b"".join(pedacos)) == itens
+
+
+def test_json_fluxo_lista_vazia():
+    app = Flask(__name__)
+    with app.test_request_context():
+        resposta, _ = json_response.json_fluxo([])
+        assert b"".join(resposta.response) == b"[]"
@@ -0,0 +1,60 @@
+import threading
+import pytest
+from werkzeug.test import Client
+from app.utils.limite import LimiteRequisicoes
+
+
+def _app(environ, start_response):
+    if environ["PATH_INFO"] == "/falha":
+        raise RuntimeError("falhou")
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return iter([b"um", b"dois"])
+
+
+def test_vaga_presa_ate_o_fim_da_resposta():
+    limitado = LimiteRequisicoes(_app, 1, espera=0.05)
+    resposta = Client(limitado).get("/lista", buffered=False)
+    # Resposta em streaming ainda aberta: a vaga continua ocupada
+    assert Client(limitado).get("/outra").status_code == 503
+    resposta.close()
+    assert Client(limitado).get("/outra").status_code == 200
+
+
+def test_ocupado_responde_503_com_retry_after():
+    limitado = LimiteRequisicoes(_app, 1, espera=0.05)
+    aberta = Client(limitado).get("/lista", buffered=False)
+    resposta = Client(limitado).get("/lista")
+    aberta.close()
+    assert resposta.status_code == 503
+    assert resposta.headers["Retry-After"] == "5"
+    assert resposta.get_json() == {"erro": "Servidor ocupado, tente novamente"}
+
+
+def test_espera_vaga_liberada():
+    limitado = LimiteRequisicoes(_app, 1, espera=5)
+    aberta = Client(limitado).get("/lista", buffered=False)
+    threading.Timer(0.1, aberta.close).start()
+    assert Client(limitado).get("/lista").status_code == 200
+
+
+def test_eventos_nao_ocupam_vaga():
+    limitado = LimiteRequisicoes(_app, 1, espera=0.05)
+    fluxo = Client(limitado).get("/eventos", buffered=False)
+    assert Client(limitado).get("/lista").status_code == 200
+    fluxo.close()
+
+
+def test_excecao_devolve_vaga():
+    limitado = LimiteRequisicoes(_app, 1, espera=0.05)
+    with pytest.raises(RuntimeError):
+        Client(limitado).get("/falha")
+    assert Client(limitado).get("/lista").status_code == 200
+
+
+def test_create_app_aplica_limite(monkeypatch):
+    from app import create_app
+
+    monkeypatch.setenv("REQUISICOES_SIMULTANEAS", "3")
+    app = create_app("testing")
+    assert isinstance(app.wsgi_app, LimiteRequisicoes)
+    assert app.wsgi_app.limite == 3
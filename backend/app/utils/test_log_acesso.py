@@ -0,0 +1,36 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from gunicorn.config import Config
+from app.utils.log_acesso import LogAcesso, mascarar_query
+
+
+def _atomos(caminho, query, cabecalhos=()):
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": caminho, "QUERY_STRING": query,
+        "RAW_URI": f"{caminho}?{query}" if query else caminho, "SERVER_PROTOCOL": "HTTP/1.1",
+    }
+    req = SimpleNamespace(headers=list(cabecalhos))
+    resp = SimpleNamespace(status="200 OK", headers=[], sent=10)
+    return LogAcesso(Config()).atoms(resp, req, environ, timedelta(milliseconds=3))
+
+
+def test_mascarar_query():
+    assert mascarar_query("token=abc.def&ultimo_id=7") == "token=***&ultimo_id=7"
+    assert mascarar_query("ultimo_id=7") == "ultimo_id=7"
+
+
+def test_eventos_sem_token_no_log():
+    atomos = _atomos("/eventos", "token=segredo&ultimo_id=3")
+    assert atomos["r"] == "GET /eventos?token=***&ultimo_id=3 HTTP/1.1"
+    assert atomos["q"] == "token=***&ultimo_id=3"
+    assert "segredo" not in repr(atomos)
+
+
+def test_outras_rotas_inalteradas():
+    atomos = _atomos("/ordemservico", "status=Pendente")
+    assert atomos["r"] == "GET /ordemservico?status=Pendente HTTP/1.1"
+
+
+def test_cabecalho_authorization_fora_do_log():
+    atomos = _atomos("/ordemservico", "", [("AUTHORIZATION", "Bearer segredo")])
+    assert "segredo" not in repr(atomos)
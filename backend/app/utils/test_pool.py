@@ -0,0 +1,116 @@
+import os
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError, TimeoutError
+from sqlalchemy.pool import QueuePool
+from app.config import opcoes_engine
+from app.utils import pool
+
+URI_PG = "postgresql+psycopg2://u@localhost/db"
+
+
+def setup_function():
+    pool.limpar()
+
+
+def test_opcoes_sqlite_ficam_no_padrao():
+    assert opcoes_engine("sqlite:///:memory:", {"DB_POOL_SIZE": "20"}) == {}
+    assert opcoes_engine(None) == {}
+
+
+def test_opcoes_postgres_lidas_do_ambiente():
+    opcoes = opcoes_engine(URI_PG, {
+        "DB_POOL_SIZE": "8", "DB_MAX_OVERFLOW": "2", "DB_POOL_TIMEOUT": "3",
+        "DB_POOL_PRE_PING": "0", "DB_STATEMENT_TIMEOUT_MS": "1500",
+    })
+    assert (opcoes["pool_size"], opcoes["max_overflow"], opcoes["pool_timeout"]) == (8, 2, 3.0)
+    assert opcoes["pool_pre_ping"] is False
+    assert opcoes["connect_args"]["options"] == "-c statement_timeout=1500"
+
+
+def test_opcoes_pgbouncer_sem_parametro_de_sessao():
+    opcoes = opcoes_engine(URI_PG, {"DB_PGBOUNCER": "1"})
+    assert "options" not in opcoes["connect_args"]
+
+
+def test_pool_mede_checkouts_e_falhas():
+    engine = pool.instrumentar(create_engine("sqlite://", poolclass=QueuePool, pool_size=1,
+                                             max_overflow=0, pool_timeout=0.2))
+    esperas = []
+    pool.ao_esperar(esperas.append)
+    try:
+        conexao = engine.connect()
+        with pytest.raises(TimeoutError):
+            engine.connect()
+        conexao.close()
+        with engine.connect() as outra:
+            outra.execute(text("SELECT 1"))
+    finally:
+        pool._ganchos.remove(esperas.append)
+        engine.dispose()
+
+    estatisticas = pool.estatisticas()
+    assert estatisticas["checkouts"] == 2
+    assert estatisticas["conexoes_abertas"] == 1
+    assert estatisticas["falhas"] == 1
+    assert estatisticas["esperas_longas"] == 1
+    assert estatisticas["espera_maxima_ms"] < 200
+    assert estatisticas["tamanho"] == 1
+    assert len(esperas) == 3
+
+
+def test_pool_segue_medido_depois_do_dispose():
+    # O post_fork do gunicorn troca o pool com dispose(); os eventos ficam
+    engine = pool.instrumentar(create_engine("sqlite://", poolclass=QueuePool, pool_size=2))
+    try:
+        with engine.connect() as conexao:
+            conexao.execute(text("SELECT 1"))
+        engine.dispose(close=False)
+        with engine.connect() as conexao:
+            conexao.execute(text("SELECT 1"))
+            assert pool.estatisticas()["em_uso"] == 1
+    finally:
+        engine.dispose()
+    estatisticas = pool.estatisticas()
+    assert (estatisticas["checkouts"], estatisticas["conexoes_abertas"]) == (2, 2)
+    assert estatisticas["em_uso"] == 0
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                    reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+def test_sessao_da_aplicacao_medida(monkeypatch):
+    from app import create_app, db
+    from app.utils import invalidacao
+
+    monkeypatch.setenv("DATABASE_URL", os.environ["TEST_POSTGRES_URL"])
+    monkeypatch.setenv("SECRET_KEY", "chave-de-teste")
+    flask_app = create_app()
+    invalidacao.parar()
+    pool.limpar()
+    with flask_app.app_context():
+        db.session.execute(text("SELECT 1"))
+        db.session.remove()
+        estatisticas = pool.estatisticas()
+    assert estatisticas["checkouts"] == 1
+    assert estatisticas["espera_media_ms"] is not None
+    assert estatisticas["em_uso"] == 0
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                    reason="defina TEST_POSTGRES_URL para rodar contra um Postgres local")
+@pytest.mark.parametrize("pgbouncer", ["0", "1"])
+def test_statement_timeout_cancela_consulta(pgbouncer):
+    ambiente = {"DB_STATEMENT_TIMEOUT_MS": "200", "DB_PGBOUNCER": pgbouncer}
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"],
+                           **opcoes_engine(os.environ["TEST_POSTGRES_URL"], ambiente))
+    if pgbouncer == "1":
+        pool.statement_timeout_local(engine, 200)
+    try:
+        with engine.connect() as conexao:
+            with pytest.raises(OperationalError, match="statement timeout"):
+                conexao.execute(text("SELECT pg_sleep(2)"))
+            conexao.rollback()
+            # Consultas rápidas seguem normais na mesma conexão
+            assert conexao.execute(text("SELECT 1")).scalar() == 1
+    finally:
+        engine.dispose()
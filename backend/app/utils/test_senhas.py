@@ -0,0 +1,55 @@
+import threading
+import time
+import pytest
+from app.utils import senhas
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Pool real com um processo e fila de um cálculo."""
+    monkeypatch.setenv("SENHA_WORKERS", "1")
+    monkeypatch.setenv("SENHA_FILA", "1")
+    monkeypatch.setenv("SENHA_METODO", "pbkdf2:sha256:1000")
+    senhas.encerrar()
+    yield
+    senhas.encerrar()
+
+
+def test_hash_na_propria_thread(monkeypatch):
+    monkeypatch.setenv("SENHA_WORKERS", "0")
+    monkeypatch.setenv("SENHA_METODO", "pbkdf2:sha256:1000")
+    senha_hash = senhas.gerar_hash("segredo")
+    assert senha_hash.startswith("pbkdf2:sha256:1000$")
+    assert senhas.verificar(senha_hash, "segredo")
+    assert not senhas.verificar(senha_hash, "outra")
+
+
+def test_hash_no_pool(pool):
+    senha_hash = senhas.gerar_hash("segredo")
+    assert senhas.verificar(senha_hash, "segredo")
+    assert not senhas.verificar(senha_hash, "outra")
+
+
+def test_fila_cheia_recusa_na_hora(pool, monkeypatch):
+    senhas.gerar_hash("aquecimento")
+    monkeypatch.setenv("SENHA_METODO", "pbkdf2:sha256:2000000")
+    lenta = threading.Thread(target=senhas.gerar_hash, args=("lenta",))
+    lenta.start()
+    while senhas._vagas._value:
+        time.sleep(0.001)
+
+    inicio = time.monotonic()
+    with pytest.raises(senhas.SenhasOcupadas):
+        senhas.verificar("pbkdf2:sha256:1000$x$y", "rapida")
+    assert time.monotonic() - inicio < 0.1
+    lenta.join()
+
+
+def test_precisa_rehash_quando_custo_muda(monkeypatch):
+    monkeypatch.setenv("SENHA_WORKERS", "0")
+    monkeypatch.setenv("SENHA_METODO", "pbkdf2:sha256:1000")
+    senha_hash = senhas.gerar_hash("segredo")
+    assert not senhas.precisa_rehash(senha_hash)
+
+    monkeypatch.setenv("SENHA_METODO", "pbkdf2:sha256:2000")
+    assert senhas.precisa_rehash(senha_hash)
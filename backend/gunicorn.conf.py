@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+
+# Perfil de produção: gunicorn -c gunicorn.conf.py wsgi:app
+# Todos os valores podem ser ajustados por variável de ambiente.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '6000')}"
+
+# gthread atende várias requisições por worker enquanto elas esperam o banco.
+# "gevent" também funciona se o pacote estiver instalado (pip install gevent).
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# Cada cliente de /eventos ocupa uma thread enquanto está conectado. O
+# gthread tem um só conjunto de threads por worker, então o worker ganha uma
+# thread por fluxo permitido e a aplicação (app/utils/limite.py) deixa só
+# GUNICORN_THREADS requisições comuns rodarem ao mesmo tempo: as demais
+# esperam vaga em vez de disputar o pool do banco, que é dimensionado para
+# elas (mais uma conexão para o gerador de recorrências e os avisos). Uma
+# thread parada esperando evento ocupa algumas dezenas de KB, sem conexão com
+# o banco. Teto de clientes conectados: workers × EVENTOS_MAX_ASSINANTES (150
+# com 1 CPU). Com gevent o fluxo é barato e não há limite de requisições.
+threads_requisicoes = int(os.getenv("GUNICORN_THREADS", "4"))
+eventos_max_assinantes = int(os.getenv(
+    "EVENTOS_MAX_ASSINANTES", "50" if worker_class == "gthread" else "1000"))
+os.environ["EVENTOS_MAX_ASSINANTES"] = str(eventos_max_assinantes)
+threads = threads_requisicoes
+if worker_class == "gthread":
+    threads += eventos_max_assinantes
+    os.environ["REQUISICOES_SIMULTANEAS"] = str(threads_requisicoes)
+os.environ.setdefault("DB_POOL_SIZE", str(threads_requisicoes + 1))
+
+# Requisição presa por mais de timeout segundos derruba o worker; no
+# desligamento/deploy cada worker tem graceful_timeout para terminar as atuais
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Reciclar workers a cada N requisições (0 desliga) derruba as conexões
+# keep-alive abertas com ele; só vale a pena se houver vazamento de memória
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+# Desenvolvimento: GUNICORN_RELOAD=1 recarrega ao salvar arquivos
+reload = os.getenv("GUNICORN_RELOAD", "0") == "1"
+
+# Carrega a aplicação uma vez no master e faz fork dos workers: sobe mais
+# rápido e compartilha memória. Não combina com reload.
+preload_app = not reload
+
+# Hash de senha em processos separados (app/utils/senhas.py)
+os.environ.setdefault("SENHA_WORKERS", "2")
+
+# Log de acesso custa ~10% de vazão num processador só; GUNICORN_ACCESSLOG=
+# (vazio) desliga
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None
+errorlog = "-"
+# Sem o token de sessão que /eventos recebe na query string
+logger_class = "app.utils.log_acesso.LogAcesso"
+
+
+def when_ready(server):
+    # Com preload o create_app() rodou no master, que não atende requisições:
+    # a thread do LISTEN/NOTIFY iniciada lá não é necessária
+    from app.utils import invalidacao
+    invalidacao.parar()
+
+
+def post_fork(server, worker):
+    # Conexões abertas no master não podem ser compartilhadas com os filhos,
+    # e threads não sobrevivem ao fork: cada worker abre as suas
+    from app import db
+    from app.services import recorrencia
+    from app.utils import invalidacao
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    invalidacao.iniciar(app)
+    recorrencia.iniciar_agendador(app)
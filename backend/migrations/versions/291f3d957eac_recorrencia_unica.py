@@ -0,0 +1,49 @@
+"""recorrencia unica
+
+Variações de "sem recorrência" gravadas antes da validação ("única",
+"Unica", "Nenhuma"...) passam a "Única", o valor que o índice
+ix_ordem_servico_modelos e o gerador de ocorrências tratam como ordem
+comum. Não há volta: o texto original não é guardado.
+
+Revision ID: 291f3d957eac
+Revises: 3e1b7c9a52d4
+Create Date: 2026-10-18 16:41:25.093117
+
+"""
+import unicodedata
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '291f3d957eac'
+down_revision = '3e1b7c9a52d4'
+branch_labels = None
+depends_on = None
+
+# Mesmos textos de app/services/recorrencia.py (UNICAS), copiados para a
+# migração não mudar junto com o código
+UNICAS = {"", "unica", "nenhuma", "sem recorrencia", "nao se repete"}
+
+
+def _normalizar(texto):
+    sem_acento = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode()
+    return " ".join(sem_acento.lower().split())
+
+
+def upgrade():
+    bind = op.get_bind()
+    textos = bind.execute(sa.text(
+        "SELECT DISTINCT recorrencia FROM ordem_servico WHERE recorrencia != 'Única'"
+    )).scalars().all()
+    unicas = [texto for texto in textos if _normalizar(texto) in UNICAS]
+    if unicas:
+        bind.execute(
+            sa.text("UPDATE ordem_servico SET recorrencia = 'Única' WHERE recorrencia IN :textos")
+            .bindparams(sa.bindparam("textos", expanding=True)),
+            {"textos": unicas},
+        )
+
+
+def downgrade():
+    pass
@@ -0,0 +1,32 @@
+"""versao do cache
+
+Tabela versao_cache: versão de cada tabela do cache, incrementada junto com
+o NOTIFY de invalidação, para que os ETags sejam os mesmos em todos os
+workers e instâncias.
+
+Revision ID: 3e1b7c9a52d4
+Revises: 65f9ce205eb1
+Create Date: 2026-10-18 14:12:07.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e1b7c9a52d4'
+down_revision = '65f9ce205eb1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('versao_cache',
+        sa.Column('tabela', sa.String(length=50), nullable=False),
+        sa.Column('versao', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('tabela')
+    )
+
+
+def downgrade():
+    op.drop_table('versao_cache')
@@ -0,0 +1,62 @@
+"""ordens recorrentes
+
+Ocorrências geradas de ordens recorrentes: origem_id liga a ocorrência ao
+modelo, com uma ocorrência por (origem_id, data), e recorrencia_proxima
+marca no modelo a próxima ocorrência ainda não gerada.
+
+Revision ID: 65f9ce205eb1
+Revises: d88ecdd57675
+Create Date: 2026-10-18 09:53:41.484601
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '65f9ce205eb1'
+down_revision = 'd88ecdd57675'
+branch_labels = None
+depends_on = None
+
+MODELO = sa.text("origem_id IS NULL AND recorrencia != 'Única'")
+
+
+def _triggers_sqlite(bind):
+    # No SQLite a FK só muda recriando a tabela (batch), e os triggers da
+    # busca (FTS5) iriam junto: são guardados e refeitos depois
+    if bind.dialect.name != 'sqlite':
+        return []
+    return bind.execute(sa.text(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'ordem_servico'"
+    )).scalars().all()
+
+
+def upgrade():
+    bind = op.get_bind()
+    triggers = _triggers_sqlite(bind)
+    with op.batch_alter_table('ordem_servico', schema=None, recreate='always' if triggers else 'auto') as batch_op:
+        batch_op.add_column(sa.Column('origem_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('recorrencia_proxima', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key('fk_ordem_servico_origem_id', 'ordem_servico',
+                                    ['origem_id'], ['id'], ondelete='SET NULL')
+    for comando in triggers:
+        op.execute(comando)
+
+    op.create_index('ix_ordem_servico_origem_data', 'ordem_servico', ['origem_id', 'data'], unique=True)
+    op.create_index('ix_ordem_servico_modelos', 'ordem_servico', ['id'], unique=False,
+                    postgresql_where=MODELO, sqlite_where=MODELO)
+
+
+def downgrade():
+    op.drop_index('ix_ordem_servico_modelos', table_name='ordem_servico')
+    op.drop_index('ix_ordem_servico_origem_data', table_name='ordem_servico')
+
+    bind = op.get_bind()
+    triggers = _triggers_sqlite(bind)
+    with op.batch_alter_table('ordem_servico', schema=None, recreate='always' if triggers else 'auto') as batch_op:
+        batch_op.drop_constraint('fk_ordem_servico_origem_id', type_='foreignkey')
+        batch_op.drop_column('recorrencia_proxima')
+        batch_op.drop_column('origem_id')
+    for comando in triggers:
+        op.execute(comando)
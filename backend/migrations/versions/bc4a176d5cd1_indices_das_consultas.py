@@ -0,0 +1,70 @@
+"""indices das consultas
+
+Índices para os padrões de consulta reais: estoque por peça, peça por
+(nome, categoria), filtros e paginação das ordens e o estoque abaixo do
+mínimo. As duas restrições únicas falham se houver duplicatas: a migração
+confere antes e diz quais são.
+
+Revision ID: bc4a176d5cd1
+Revises: c80e2cc7b5ca
+Create Date: 2026-10-18 09:23:13.126413
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bc4a176d5cd1'
+down_revision = 'c80e2cc7b5ca'
+branch_labels = None
+depends_on = None
+
+
+def _exigir_sem_duplicatas(tabela, colunas):
+    duplicadas = op.get_bind().execute(sa.text(
+        f"SELECT {colunas}, count(*) FROM {tabela} GROUP BY {colunas} HAVING count(*) > 1 LIMIT 5"
+    )).all()
+    if duplicadas:
+        raise RuntimeError(
+            f"{tabela} tem linhas repetidas em ({colunas}); corrija antes de migrar: {duplicadas}")
+
+
+def upgrade():
+    _exigir_sem_duplicatas('estoque', 'peca_id')
+    _exigir_sem_duplicatas('peca', 'nome, categoria')
+
+    with op.batch_alter_table('estoque', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_estoque_peca_id', ['peca_id'])
+
+    # Índice de expressão fora do batch: no SQLite o batch recria a tabela e
+    # não sabe copiar expressões
+    op.create_index(
+        'ix_estoque_abaixo_minimo', 'estoque', [sa.text('(qtd - qtd_min)'), 'qtd'], unique=False,
+        postgresql_where=sa.text('qtd <= qtd_min'), sqlite_where=sa.text('qtd <= qtd_min'))
+
+    with op.batch_alter_table('ordem_servico', schema=None) as batch_op:
+        batch_op.create_index('ix_ordem_servico_data_id', ['data', 'id'], unique=False)
+        batch_op.create_index('ix_ordem_servico_setor_data', ['setor', 'data'], unique=False)
+        batch_op.create_index('ix_ordem_servico_solicitante_id', ['solicitante_id'], unique=False)
+        batch_op.create_index('ix_ordem_servico_status_data', ['status', 'data'], unique=False)
+
+    with op.batch_alter_table('peca', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_peca_nome_categoria', ['nome', 'categoria'])
+
+
+
+def downgrade():
+    with op.batch_alter_table('peca', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_peca_nome_categoria', type_='unique')
+
+    with op.batch_alter_table('ordem_servico', schema=None) as batch_op:
+        batch_op.drop_index('ix_ordem_servico_status_data')
+        batch_op.drop_index('ix_ordem_servico_solicitante_id')
+        batch_op.drop_index('ix_ordem_servico_setor_data')
+        batch_op.drop_index('ix_ordem_servico_data_id')
+
+    op.drop_index('ix_estoque_abaixo_minimo', table_name='estoque')
+    with op.batch_alter_table('estoque', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_estoque_peca_id', type_='unique')
+
@@ -0,0 +1,94 @@
+"""busca textual
+
+Índices da rota /busca. Postgres: extensões pg_trgm e unaccent, trigramas
+em nome e categoria das peças e full-text (configuração busca_portugues,
+sem acentos) nos detalhes das ordens. SQLite: tabelas FTS5 com triggers
+(ver TABELAS_FTS em app/models/models.py).
+
+Revision ID: c24d1988c217
+Revises: bc4a176d5cd1
+Create Date: 2026-10-18 09:27:14.116312
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+
+# revision identifiers, used by Alembic.
+revision = 'c24d1988c217'
+down_revision = 'bc4a176d5cd1'
+branch_labels = None
+depends_on = None
+
+
+# Cópia congelada de TABELAS_FTS/ddl_fts/DDL_BUSCA_POSTGRES
+# (app/models/models.py): a migração não pode mudar junto com o código
+DDL_BUSCA_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """DO $$ BEGIN
+        CREATE TEXT SEARCH CONFIGURATION busca_portugues (COPY = portuguese);
+        ALTER TEXT SEARCH CONFIGURATION busca_portugues
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+    EXCEPTION WHEN unique_violation THEN NULL;
+    END $$""",
+]
+
+TABELAS_FTS = {
+    'busca_peca': ('peca', ('nome', 'categoria')),
+    'busca_ordem': ('ordem_servico', ('detalhes',)),
+}
+
+
+def ddl_fts(tabela_fts):
+    origem, colunas = TABELAS_FTS[tabela_fts]
+    lista = ", ".join(colunas)
+    novos = ", ".join(f"new.{c}" for c in colunas)
+    antigos = ", ".join(f"old.{c}" for c in colunas)
+    remover = f"INSERT INTO {tabela_fts}({tabela_fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos});"
+    inserir = f"INSERT INTO {tabela_fts}(rowid, {lista}) VALUES (new.id, {novos});"
+    return [
+        f"CREATE VIRTUAL TABLE {tabela_fts} USING fts5({lista}, content='{origem}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {tabela_fts}_ai AFTER INSERT ON {origem} BEGIN {inserir} END",
+        f"CREATE TRIGGER {tabela_fts}_ad AFTER DELETE ON {origem} BEGIN {remover} END",
+        f"CREATE TRIGGER {tabela_fts}_au AFTER UPDATE ON {origem} BEGIN {remover} {inserir} END",
+        f"INSERT INTO {tabela_fts}({tabela_fts}) VALUES ('rebuild')",
+    ]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for tabela_fts in TABELAS_FTS:
+            for comando in ddl_fts(tabela_fts):
+                op.execute(comando)
+        return
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for comando in DDL_BUSCA_POSTGRES:
+        op.execute(comando)
+    op.create_index('ix_peca_nome_trgm', 'peca', ['nome'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'nome': 'gin_trgm_ops'})
+    op.create_index('ix_peca_categoria_trgm', 'peca', ['categoria'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'categoria': 'gin_trgm_ops'})
+    op.create_index('ix_ordem_servico_detalhes_fts', 'ordem_servico',
+                    [sa.text("to_tsvector('busca_portugues'::regconfig, coalesce(detalhes, ''))")],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for tabela_fts, (origem, _) in TABELAS_FTS.items():
+            for sufixo in ('ai', 'ad', 'au'):
+                op.execute(f"DROP TRIGGER IF EXISTS {tabela_fts}_{sufixo}")
+            op.execute(f"DROP TABLE IF EXISTS {tabela_fts}")
+        return
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_ordem_servico_detalhes_fts', table_name='ordem_servico')
+    op.drop_index('ix_peca_categoria_trgm', table_name='peca')
+    op.drop_index('ix_peca_nome_trgm', table_name='peca')
+    op.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS busca_portugues")
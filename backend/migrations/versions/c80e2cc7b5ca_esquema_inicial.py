@@ -0,0 +1,126 @@
+"""esquema inicial
+
+Bancos criados antes das migrações (pelo antigo db.create_all() no boot) já
+têm parte das tabelas: só as que faltam são criadas, e o banco passa a ser
+controlado pelo Alembic a partir daqui.
+
+Revision ID: c80e2cc7b5ca
+Revises:
+Create Date: 2026-10-18 09:17:21.026566
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c80e2cc7b5ca'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _existe(tabela):
+    return sa.inspect(op.get_bind()).has_table(tabela)
+
+
+def upgrade():
+    if not _existe('peca'):
+        op.create_table('peca',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('nome', sa.String(length=100), nullable=False),
+            sa.Column('categoria', sa.String(length=100), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not _existe('sessao_revogada'):
+        op.create_table('sessao_revogada',
+            sa.Column('jti', sa.String(length=32), nullable=False),
+            sa.Column('expira_em', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('jti')
+        )
+
+    if not _existe('usuario'):
+        op.create_table('usuario',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('nome', sa.String(length=100), nullable=False),
+            sa.Column('email', sa.String(length=100), nullable=False),
+            sa.Column('funcao', sa.String(length=100), nullable=False),
+            sa.Column('setor', sa.String(length=100), nullable=False),
+            sa.Column('senha_hash', sa.String(length=512), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email')
+        )
+
+    if not _existe('estoque'):
+        op.create_table('estoque',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('qtd', sa.Integer(), nullable=False),
+            sa.Column('qtd_min', sa.Integer(), nullable=False),
+            sa.Column('peca_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['peca_id'], ['peca.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not _existe('movimentacao_estoque'):
+        op.create_table('movimentacao_estoque',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('peca_id', sa.Integer(), nullable=False),
+            sa.Column('tipo', sa.String(length=20), nullable=False),
+            sa.Column('quantidade', sa.Integer(), nullable=False),
+            sa.Column('os_id', sa.Integer(), nullable=True),
+            sa.Column('data', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['peca_id'], ['peca.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_movimentacao_estoque_peca_data', 'movimentacao_estoque', ['peca_id', 'data'])
+
+    if not _existe('saldo_estoque'):
+        op.create_table('saldo_estoque',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('peca_id', sa.Integer(), nullable=False),
+            sa.Column('data', sa.DateTime(), nullable=False),
+            sa.Column('qtd', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['peca_id'], ['peca.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_saldo_estoque_peca_data', 'saldo_estoque', ['peca_id', 'data'])
+
+    if not _existe('ordem_servico'):
+        op.create_table('ordem_servico',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('tipo', sa.String(length=100), nullable=False),
+            sa.Column('setor', sa.String(length=100), nullable=False),
+            sa.Column('data', sa.DateTime(), nullable=False),
+            sa.Column('recorrencia', sa.String(length=50), nullable=False),
+            sa.Column('detalhes', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=50), nullable=False),
+            sa.Column('equipamento_id', sa.Integer(), nullable=True),
+            sa.Column('solicitante_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['equipamento_id'], ['estoque.id'], ),
+            sa.ForeignKeyConstraint(['solicitante_id'], ['usuario.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not _existe('pecas_ordems_servico'):
+        op.create_table('pecas_ordems_servico',
+            sa.Column('os_id', sa.Integer(), nullable=False),
+            sa.Column('peca_id', sa.Integer(), nullable=False),
+            sa.Column('quantidade', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['os_id'], ['ordem_servico.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['peca_id'], ['peca.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('os_id', 'peca_id')
+        )
+
+
+def downgrade():
+    op.drop_table('pecas_ordems_servico')
+    op.drop_table('ordem_servico')
+    op.drop_index('ix_saldo_estoque_peca_data', table_name='saldo_estoque')
+    op.drop_table('saldo_estoque')
+    op.drop_index('ix_movimentacao_estoque_peca_data', table_name='movimentacao_estoque')
+    op.drop_table('movimentacao_estoque')
+    op.drop_table('estoque')
+    op.drop_table('usuario')
+    op.drop_table('sessao_revogada')
+    op.drop_table('peca')
@@ -0,0 +1,45 @@
+"""alerta de estoque
+
+Coluna gerada estoque.em_alerta (qtd <= qtd_min), a regra única dos alertas
+de reposição, e o índice parcial das peças em alerta passa a usá-la.
+
+Revision ID: d88ecdd57675
+Revises: c24d1988c217
+Create Date: 2026-10-18 09:39:45.981868
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd88ecdd57675'
+down_revision = 'c24d1988c217'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_estoque_abaixo_minimo', table_name='estoque')
+
+    # O SQLite não aceita ADD COLUMN de coluna gerada STORED: lá a tabela é
+    # recriada; no Postgres é um ALTER TABLE comum
+    recriar = 'always' if op.get_bind().dialect.name == 'sqlite' else 'auto'
+    with op.batch_alter_table('estoque', schema=None, recreate=recriar) as batch_op:
+        batch_op.add_column(sa.Column(
+            'em_alerta', sa.Boolean(), sa.Computed('qtd <= qtd_min', persisted=True), nullable=True))
+
+    op.create_index(
+        'ix_estoque_em_alerta', 'estoque', [sa.text('(qtd - qtd_min)'), 'qtd'], unique=False,
+        postgresql_where=sa.text('em_alerta'), sqlite_where=sa.text('em_alerta'))
+
+
+def downgrade():
+    op.drop_index('ix_estoque_em_alerta', table_name='estoque')
+
+    with op.batch_alter_table('estoque', schema=None) as batch_op:
+        batch_op.drop_column('em_alerta')
+
+    op.create_index(
+        'ix_estoque_abaixo_minimo', 'estoque', [sa.text('(qtd - qtd_min)'), 'qtd'], unique=False,
+        postgresql_where=sa.text('qtd <= qtd_min'), sqlite_where=sa.text('qtd <= qtd_min'))
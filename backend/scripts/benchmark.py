@@ -0,0 +1,91 @@
+"""Carga HTTP simples para comparar perfis de execução da API.
+
+Abre N conexões keep-alive, cada uma numa thread fazendo requisições em
+sequência (laço fechado) durante alguns segundos, e mostra requisições por
+segundo e latências por rota.
+
+    python scripts/benchmark.py http://localhost:6000 --rotas /health /peca --conexoes 16 --duracao 20
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def _trabalhador(destino, rotas, cabecalhos, fim, resultados, erros):
+    conn = None
+    i = 0
+    while time.monotonic() < fim:
+        rota = rotas[i % len(rotas)]
+        i += 1
+        inicio = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=30)
+            conn.request("GET", rota, headers=cabecalhos)
+            resposta = conn.getresponse()
+            resposta.read()
+            if resposta.status >= 400:
+                erros[rota] = erros.get(rota, 0) + 1
+                continue
+        except (OSError, http.client.HTTPException):
+            erros[rota] = erros.get(rota, 0) + 1
+            conn = None
+            continue
+        resultados.setdefault(rota, []).append(time.perf_counter() - inicio)
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", help="ex.: http://localhost:6000")
+    parser.add_argument("--rotas", nargs="+", default=["/health"])
+    parser.add_argument("--conexoes", type=int, default=16)
+    parser.add_argument("--duracao", type=float, default=20)
+    parser.add_argument("--aquecimento", type=float, default=2)
+    parser.add_argument("--token", help="enviado como Authorization: Bearer")
+    args = parser.parse_args()
+
+    destino = urlsplit(args.url)
+    cabecalhos = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+
+    # Aquecimento: cache, pool de conexões, workers
+    _trabalhador(destino, args.rotas, cabecalhos, time.monotonic() + args.aquecimento, {}, {})
+
+    resultados = [{} for _ in range(args.conexoes)]
+    erros = [{} for _ in range(args.conexoes)]
+    fim = time.monotonic() + args.duracao
+    threads = [
+        threading.Thread(target=_trabalhador, args=(destino, args.rotas, cabecalhos, fim, r, e))
+        for r, e in zip(resultados, erros)
+    ]
+    inicio = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    print(f"{args.url}  conexões={args.conexoes}  duração={decorrido:.1f}s")
+    print(f"{'rota':<30}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'erros':>8}")
+    for rota in args.rotas:
+        tempos = sorted(t for r in resultados for t in r.get(rota, ()))
+        falhas = sum(e.get(rota, 0) for e in erros)
+        if not tempos:
+            print(f"{rota:<30}{0:>10}{'-':>10}{'-':>10}{'-':>10}{falhas:>8}")
+            continue
+        print(f"{rota:<30}{len(tempos) / decorrido:>10.1f}"
+              f"{statistics.median(tempos) * 1000:>10.1f}"
+              f"{_percentil(tempos, 0.95) * 1000:>10.1f}"
+              f"{_percentil(tempos, 0.99) * 1000:>10.1f}{falhas:>8}")
+    total = sum(len(t) for r in resultados for t in r.values())
+    print(f"{'total':<30}{total / decorrido:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import { useNavigate } from "react-router-dom";
 import { useState, useEffect } from "react";
 import { Menu, Package, Wrench, LogOut, Bell, CheckCircle, AlertTriangle } from "lucide-react";
 import { useAuth } from "../contexts/AuthContext";
-import { buscarNotificacoesEstoque } from "../services/EstoqueNotificacoesApi";
+import { buscarNotificacoesEstoque, assinarAlertasEstoque } from "../services/EstoqueNotificacoesApi";
 
 
 
@@ -35,9 +35,7 @@ const DashboardLayout = ({ children }) => {
 
   atualizarNotificacoes();
 
-  const interval = setInterval(atualizarNotificacoes, 5000);
-
-  return () => clearInterval(interval);
+  return assinarAlertasEstoque(atualizarNotificacoes);
 }, []);
 
 useEffect(() => {
@@ -11,3 +11,26 @@ export const buscarNotificacoesEstoque = async () => {
     return [];
   }
 };
+
+// Avisa quando o estoque em alerta muda, pelo fluxo /eventos (Server-Sent
+// Events). Se o servidor recusar a conexão (muitos clientes), volta a
+// consultar a cada minuto. Devolve a função que encerra a assinatura.
+export const assinarAlertasEstoque = (aoMudar) => {
+  const fonte = new EventSource(`${API_URL}/eventos`);
+  let intervalo = null;
+
+  // "open" também cobre a reconexão: o que mudou enquanto caído é recarregado
+  fonte.addEventListener("open", aoMudar);
+  fonte.addEventListener("alerta_estoque", aoMudar);
+  fonte.addEventListener("reset", aoMudar);
+  fonte.onerror = () => {
+    if (fonte.readyState === EventSource.CLOSED && !intervalo) {
+      intervalo = setInterval(aoMudar, 60000);
+    }
+  };
+
+  return () => {
+    fonte.close();
+    clearInterval(intervalo);
+  };
+};